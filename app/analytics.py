@@ -0,0 +1,132 @@
+# app/analytics.py
+
+import math
+import operator
+import os
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from . import cache as caches
+from . import columnar
+from .models import DATA_ENTRY_INT_FIELDS
+from .schemas import DataEntryAnalyticsResponse
+
+try:
+    import numpy as np
+except ImportError:  # NumPy opsional, fallback ke modul array
+    np = None
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+# Cache hasil per (pengguna, kuantil) berversi data_version pengguna; ukuran
+# entri diperkirakan dari panjang JSON hasilnya
+CACHE_MAX_BYTES = int(os.getenv("ANALYTICS_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+_cache = caches.create(
+    "analytics", CACHE_MAX_BYTES, policy=caches.LRU,
+    sizeof=lambda result: len(result.model_dump_json()),
+)
+
+
+def _finite(value) -> Optional[float]:
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _compute_numpy(n: int, columns: Dict[str, array], quantiles: Sequence[float]):
+    matrix = np.vstack([np.frombuffer(columns[f], dtype=np.int64) for f in DATA_ENTRY_INT_FIELDS]).astype(np.float64)
+    mean = matrix.mean(axis=1)
+    if n > 1:
+        covariance = np.cov(matrix)
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.outer(std, std)
+        covariance = [[_finite(v) for v in row] for row in covariance]
+        correlation = [[_finite(v) for v in row] for row in correlation]
+    else:
+        covariance = correlation = None
+    values = np.quantile(matrix, list(quantiles), axis=1)  # bentuk (kuantil, field)
+    per_field = {
+        field: {str(q): float(values[qi, fi]) for qi, q in enumerate(quantiles)}
+        for fi, field in enumerate(DATA_ENTRY_INT_FIELDS)
+    }
+    return [float(m) for m in mean], covariance, correlation, per_field
+
+
+def _quantile(sorted_values, q: float) -> float:
+    # Interpolasi linear, sama dengan metode default numpy.quantile
+    position = (len(sorted_values) - 1) * q
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _compute_array(n: int, columns: Dict[str, array], quantiles: Sequence[float]):
+    """
+    Fallback tanpa NumPy. Semua reduksi berjalan di level C (sum/map/sorted)
+    dan memakai aritmetika integer eksak, bukan loop Python per baris.
+    """
+    fields = DATA_ENTRY_INT_FIELDS
+    sums = [sum(columns[f]) for f in fields]
+    mean = [s / n for s in sums]
+    if n > 1:
+        # cov_ij = (n * sum(x_i * x_j) - sum(x_i) * sum(x_j)) / (n * (n - 1))
+        cross = [[0] * len(fields) for _ in fields]
+        for i, fi in enumerate(fields):
+            for j in range(i, len(fields)):
+                value = sum(map(operator.mul, columns[fi], columns[fields[j]]))
+                cross[i][j] = cross[j][i] = n * value - sums[i] * sums[j]
+        denominator = n * (n - 1)
+        covariance = [[c / denominator for c in row] for row in cross]
+        correlation = [
+            [
+                cross[i][j] / math.sqrt(cross[i][i] * cross[j][j]) if cross[i][i] and cross[j][j] else None
+                for j in range(len(fields))
+            ]
+            for i in range(len(fields))
+        ]
+    else:
+        covariance = correlation = None
+    per_field = {}
+    for field in fields:
+        ordered = sorted(columns[field])
+        per_field[field] = {str(q): float(_quantile(ordered, q)) for q in quantiles}
+    return mean, covariance, correlation, per_field
+
+
+def compute(n: int, columns: Dict[str, array], quantiles: Sequence[float]) -> DataEntryAnalyticsResponse:
+    if n == 0:
+        return DataEntryAnalyticsResponse(
+            count=0, fields=list(DATA_ENTRY_INT_FIELDS), mean=[None] * len(DATA_ENTRY_INT_FIELDS),
+            covariance=None, correlation=None, quantiles={},
+        )
+    engine = _compute_numpy if np is not None else _compute_array
+    mean, covariance, correlation, per_field = engine(n, columns, quantiles)
+    return DataEntryAnalyticsResponse(
+        count=n,
+        fields=list(DATA_ENTRY_INT_FIELDS),
+        mean=mean,
+        covariance=covariance,
+        correlation=correlation,
+        quantiles=per_field,
+    )
+
+
+def get_analytics(
+    db: Session,
+    owner_id: int,
+    data_version: int,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+) -> DataEntryAnalyticsResponse:
+    def load() -> DataEntryAnalyticsResponse:
+        # Kolom dimuat sekaligus dari cursor ke array kontigu, tanpa objek ORM
+        n, columns, _ = columnar.load_columns(db, owner_id, int_fields=DATA_ENTRY_INT_FIELDS)
+        return compute(n, columns, quantiles)
+
+    return _cache.get_or_put((owner_id, tuple(quantiles)), load, version=data_version, tag=owner_id)
+
+
+@caches.on_invalidate(caches.DATA_ENTRY)
+def _invalidate(owner_id: int, entry_id: Optional[int]) -> None:
+    _cache.invalidate_tag(owner_id)
@@ -7,10 +7,12 @@ from jose import JWTError, jwt
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta
-from .schemas import Token
+from .schemas import ADMIN_ROLE, Token, normalize_identifier
 from .models import User
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from .dependencies import get_db
+from . import shm_cache, singleflight
 from passlib.context import CryptContext
 import re  # Tambahkan ini
 
@@ -28,6 +30,10 @@ security = HTTPBearer()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Lookup pengguna yang identik dan bersamaan (mis. lonjakan permintaan dengan
+# token yang sama) berbagi satu query
+USER_FLIGHT = singleflight.create("current_user")
+
 def verify_static_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if credentials.credentials != STATIC_BEARER_TOKEN:
         raise HTTPException(
@@ -36,16 +42,22 @@ def verify_static_token(credentials: HTTPAuthorizationCredentials = Depends(secu
         )
     return credentials.credentials
 
-def authenticate_user(db: Session, identifier: str, password: str) -> Optional[User]:
+def get_user_by_identifier(db: Session, identifier: str) -> Optional[User]:
     """
-    Mengautentikasi pengguna berdasarkan identifier yang dapat berupa username atau email.
+    Mencari pengguna berdasarkan username atau email tanpa memedulikan huruf
+    besar/kecil; satu probe pada indeks lower(email) atau lower(username).
     """
+    identifier = normalize_identifier(identifier)
     # Deteksi apakah identifier adalah email
     if re.match(r'[^@]+@[^@]+\.[^@]+', identifier):
-        user = db.query(User).filter(User.email == identifier).first()
-    else:
-        user = db.query(User).filter(User.username == identifier).first()
-    
+        return db.query(User).filter(func.lower(User.email) == identifier).first()
+    return db.query(User).filter(func.lower(User.username) == identifier).first()
+
+def authenticate_user(db: Session, identifier: str, password: str) -> Optional[User]:
+    """
+    Mengautentikasi pengguna berdasarkan identifier yang dapat berupa username atau email.
+    """
+    user = get_user_by_identifier(db, identifier)
     if not user:
         return None
     if not pwd_context.verify(password, user.hashed_password):
@@ -75,11 +87,26 @@ def get_current_user(token: HTTPAuthorizationCredentials = Depends(security), db
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    # Deteksi apakah identifier adalah email
-    if re.match(r'[^@]+@[^@]+\.[^@]+', identifier):
-        user = db.query(User).filter(User.email == identifier).first()
-    else:
-        user = db.query(User).filter(User.username == identifier).first()
+
+    def load():
+        # Cache bersama antar worker (jika SHM_CACHE_PATH diset), fallback ke database
+        user = shm_cache.get_user(identifier, lambda: get_user_by_identifier(db, identifier))
+        # Nilai kolom dibaca di sini, sebelum sesi pemanggil pertama di-commit
+        return user, user and {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+    (user, values), shared = USER_FLIGHT.do(normalize_identifier(identifier), load)
     if user is None:
         raise credentials_exception
+    if shared:
+        # Instance milik sesi pemanggil pertama tidak dipakai di thread lain;
+        # penunggu menerima objek transient yang hanya untuk dibaca
+        user = User(**values)
     return user
+
+def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != ADMIN_ROLE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Hanya admin yang diizinkan",
+        )
+    return current_user
@@ -0,0 +1,224 @@
+# app/bench.py
+
+"""
+Benchmark mikro jalur serialisasi respons. Tanpa jaringan; benchmark yang
+butuh database memakai SQLite di memori tersendiri (DATABASE_URL tetap harus
+diset karena app.database membuat engine saat diimpor).
+
+Jalankan dengan: python -m app.bench [nama ...] [--repeat N]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import timeit
+import tracemalloc
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from . import cache, entry_service, envelopes, msgpack_codec, schemas, shm_cache
+from .models import Base, DataEntry, User, DATA_ENTRY_INT_FIELDS, DATA_ENTRY_STRING_FIELDS
+
+Case = Tuple[str, Callable[[], object]]
+
+
+def sample_entries(count: int) -> List[SimpleNamespace]:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        SimpleNamespace(
+            id=i,
+            owner_id=1,
+            version=1,
+            created_at=now,
+            updated_at=now,
+            **{field: f"nilai {field} {i}" for field in DATA_ENTRY_STRING_FIELDS},
+            **{field: i * (n + 1) for n, field in enumerate(DATA_ENTRY_INT_FIELDS)},
+        )
+        for i in range(count)
+    ]
+
+
+def envelope_cases(count: int = 100) -> List[Case]:
+    """Sebelum: amplop data: Any lewat response_model FastAPI. Sesudah: serializer bertipe."""
+    entries = [schemas.DataEntryResponse.from_orm(entry) for entry in sample_entries(count)]
+    field = create_model_field(name="Response", type_=schemas.ResponseModel)
+    loop = asyncio.new_event_loop()
+
+    def fastapi_any():
+        content = loop.run_until_complete(serialize_response(
+            field=field, response_content=schemas.ResponseModel(success=True, data=entries),
+        ))
+        return JSONResponse(content).body
+
+    def typed_envelope():
+        return envelopes.DATA_ENTRY_LIST.encode(True, entries)
+
+    return [
+        (f"envelope_any_{count}", fastapi_any),
+        (f"envelope_typed_{count}", typed_envelope),
+    ]
+
+
+def _seeded_session(count: int) -> Session:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.execute(insert(User.__table__).values(id=1, name="bench", username="bench", email="bench@example.com",
+                                             hashed_password="-", role="user"))
+    rows = [
+        {key: value for key, value in vars(entry).items() if key != "id"}
+        for entry in sample_entries(count)
+    ]
+    db.execute(insert(DataEntry.__table__), rows)
+    db.commit()
+    return db
+
+
+def list_read_cases(counts=(1_000, 10_000)) -> List[Case]:
+    """Sebelum: instance ORM + from_orm + amplop bertipe. Sesudah: SELECT Core + rowcodec."""
+    cases = []
+    for count in counts:
+        db = _seeded_session(count)
+
+        def orm_models(db=db, count=count):
+            entries = db.query(DataEntry).filter(DataEntry.owner_id == 1).order_by(DataEntry.id).limit(count).all()
+            body = envelopes.DATA_ENTRY_LIST.encode(True, [schemas.DataEntryResponse.from_orm(e) for e in entries])
+            db.expunge_all()
+            return body
+
+        def core_rows(db=db, count=count):
+            rows = entry_service.list_entries(db, 1, 0, count)
+            encoder = entry_service.LIST_PROJECTION.encoder(entry_service.RESPONSE_FIELDS)
+            return envelopes.ok_json(encoder.encode_rows(rows)).body
+
+        cases += [(f"list_orm_{count}", orm_models), (f"list_core_rows_{count}", core_rows)]
+    return cases
+
+
+def compression_cases(count: int = 1_000, levels=(1, 4, 6, 9)) -> List[Case]:
+    """CPU gzip per level untuk halaman daftar; label memuat rasio ukuran hasil."""
+    entries = [schemas.DataEntryResponse.from_orm(entry) for entry in sample_entries(count)]
+    body = envelopes.DATA_ENTRY_LIST.encode(True, entries)
+    cases = []
+    for level in levels:
+        def compress(level=level):
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            return compressor.compress(body) + compressor.flush()
+        ratio = len(compress()) / len(body)
+        cases.append((f"gzip_l{level}_{count} ({len(body) // 1024} KiB -> {ratio:.0%})", compress))
+    return cases
+
+
+def wire_format_cases(count: int = 1_000) -> List[Case]:
+    """Encode baris tuple: JSON (rowcodec) versus MessagePack; label memuat ukuran hasil."""
+    columns = entry_service.LIST_PROJECTION.get(entry_service.RESPONSE_FIELDS)[0].selected_columns
+    rows = [tuple(getattr(entry, column.key) for column in columns) for entry in sample_entries(count)]
+    fields = entry_service.RESPONSE_FIELDS
+
+    def json_rows():
+        return envelopes.ok_json(entry_service.LIST_PROJECTION.encoder(fields).encode_rows(rows)).body
+
+    def msgpack_rows():
+        return msgpack_codec.envelope(True, entry_service.LIST_PROJECTION.msgpack_encoder(fields).encode_rows(rows))
+
+    return [
+        (f"rows_json_{count} ({len(json_rows()) // 1024} KiB)", json_rows),
+        (f"rows_msgpack_{count} ({len(msgpack_rows()) // 1024} KiB)", msgpack_rows),
+    ]
+
+
+def cache_lookup_cases(keys: int = 1_000, lookups: int = 1_000) -> List[Case]:
+    """Overhead per lookup: dict biasa versus app/cache.py per kebijakan (hit dan miss)."""
+    plain = {key: key for key in range(keys)}
+    caches = {
+        policy: cache.Cache(f"bench_{policy}", 1 << 30, policy=policy, ttl=3600 if policy == cache.TTL else None)
+        for policy in (cache.LRU, cache.LFU, cache.TTL)
+    }
+    for instance in caches.values():
+        for key in range(keys):
+            instance.put(key, key, size=8)
+    hit_keys = [i % keys for i in range(lookups)]
+    miss_keys = [keys + i for i in range(lookups)]
+
+    def dict_get():
+        get = plain.get
+        return [get(key) for key in hit_keys]
+
+    cases = [(f"dict_get_x{lookups}", dict_get)]
+    for policy, instance in caches.items():
+        def hit(get=instance.get):
+            return [get(key) for key in hit_keys]
+
+        def miss(get=instance.get):
+            return [get(key) for key in miss_keys]
+
+        cases += [(f"cache_{policy}_hit_x{lookups}", hit), (f"cache_{policy}_miss_x{lookups}", miss)]
+
+    # Tabel mmap bersama (app/shm_cache.py) pada berkas sementara
+    path = os.path.join(tempfile.mkdtemp(), "shm_cache.bin")
+    shared = shm_cache.SharedCache(path)
+    shm_keys = [b"k%d" % key for key in hit_keys]
+    for key in set(shm_keys):
+        shared.put(key, b"x" * 200)
+
+    def shm_hit():
+        get = shared.get
+        return [get(key) for key in shm_keys]
+
+    return cases + [(f"shm_hit_x{lookups}", shm_hit)]
+
+
+def measure_memory(func: Callable[[], object]) -> Tuple[float, int]:
+    """Puncak alokasi (KiB) dan jumlah koleksi GC generasi 0 selama satu panggilan."""
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024, gc.get_stats()[0]["collections"] - collections
+
+
+BENCHMARKS: Dict[str, Callable[[], List[Case]]] = {
+    "envelope": envelope_cases,
+    "list_read": list_read_cases,
+    "compression": compression_cases,
+    "wire_format": wire_format_cases,
+    "cache_lookup": cache_lookup_cases,
+}
+
+
+def run(names: List[str], repeat: int) -> None:
+    for name in names:
+        for label, func in BENCHMARKS[name]():
+            func()  # pemanasan
+            number, _ = timeit.Timer(func).autorange()
+            best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+            peak_kib, collections = measure_memory(func)
+            print(f"{label:<36} {best * 1e6:>12.1f} us/op {peak_kib:>10.0f} KiB puncak {collections:>4} gc0")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("names", nargs="*", help=f"Pilihan: {', '.join(BENCHMARKS)} (bawaan: semua)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Benchmark tidak dikenal: {', '.join(sorted(unknown))}")
+    run(args.names or list(BENCHMARKS), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
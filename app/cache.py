@@ -0,0 +1,316 @@
+# app/cache.py
+
+"""
+Subsistem cache di dalam proses: cache bernama dengan batas memori, kebijakan
+eviction, statistik dan hook invalidasi.
+
+- Setiap cache dibuat lewat create() dan terdaftar berdasarkan nama;
+  all_stats() dipakai endpoint /admin/metrics.
+- Kebijakan: LRU (paling lama tidak dipakai), LFU (paling jarang dipakai,
+  seri -> paling lama) dan TTL (kedaluwarsa setelah `ttl` detik, lalu yang
+  paling lama disimpan).
+- Ukuran entri adalah perkiraan byte dari pemanggil (atau `sizeof` cache);
+  eviction berjalan sampai total di bawah max_bytes.
+- Entri boleh berversi: get(key, version=v) hanya hit jika versinya sama
+  (entri lama dibuang), put() tidak menimpa versi yang lebih baru.
+- Entri boleh diberi tag (mis. id pengguna) agar bisa dihapus sekelompok
+  dengan invalidate_tag().
+- Endpoint tulis memanggil invalidate(entitas, user_id, entity_id) lewat bus
+  app/invalidation.py; modul pemilik cache mendaftarkan handler-nya dengan
+  on_invalidate(entitas). Event boleh membawa `details` (dict kecil yang bisa
+  di-JSON-kan) untuk handler yang memintanya dengan with_details=True.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+LRU = "lru"
+LFU = "lfu"
+TTL = "ttl"
+
+# Entitas untuk invalidate()/on_invalidate()
+USER = "user"
+DATA_ENTRY = "data_entry"
+
+# Perkiraan overhead kunci dan slot dict per entri
+ENTRY_OVERHEAD = 128
+
+_MISSING = object()
+
+
+class _Entry:
+    __slots__ = ("value", "size", "version", "tag", "expires_at")
+
+    def __init__(self, value, size: int, version, tag, expires_at):
+        self.value = value
+        self.size = size
+        self.version = version
+        self.tag = tag
+        self.expires_at = expires_at
+
+
+class _InsertionOrder:
+    """Urutan eviction LRU (touch memindahkan ke belakang) atau FIFO untuk TTL."""
+
+    def __init__(self, move_on_touch: bool):
+        self.order: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.move_on_touch = move_on_touch
+
+    def add(self, key) -> None:
+        self.order[key] = None
+
+    def touch(self, key) -> None:
+        if self.move_on_touch:
+            self.order.move_to_end(key)
+
+    def remove(self, key) -> None:
+        del self.order[key]
+
+    def victim(self):
+        return next(iter(self.order))
+
+
+class _FrequencyOrder:
+    """LFU O(1): bucket per frekuensi, masing-masing berurutan sesuai waktu masuk."""
+
+    def __init__(self):
+        self.counts: Dict[Hashable, int] = {}
+        self.buckets: Dict[int, "OrderedDict[Hashable, None]"] = {}
+        self.min_count = 0
+
+    def add(self, key) -> None:
+        self.counts[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_count = 1
+
+    def touch(self, key) -> None:
+        count = self._unlink(key)
+        self.counts[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+        if self.min_count == count and count not in self.buckets:
+            self.min_count = count + 1
+
+    def remove(self, key) -> None:
+        count = self._unlink(key)
+        del self.counts[key]
+        if self.min_count == count and count not in self.buckets:
+            self.min_count = min(self.buckets, default=0)
+
+    def _unlink(self, key) -> int:
+        count = self.counts[key]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+        return count
+
+    def victim(self):
+        return next(iter(self.buckets[self.min_count]))
+
+
+class Cache:
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int,
+        policy: str = LRU,
+        ttl: Optional[float] = None,
+        max_entry_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        if policy not in (LRU, LFU, TTL):
+            raise ValueError(f"Kebijakan cache tidak dikenal: {policy}")
+        if policy == TTL and not ttl:
+            raise ValueError("Kebijakan TTL membutuhkan ttl")
+        self.name = name
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.ttl = ttl
+        self.max_entry_bytes = max_bytes if max_entry_bytes is None else max_entry_bytes
+        self._sizeof = sizeof
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._order = _FrequencyOrder() if policy == LFU else _InsertionOrder(move_on_touch=policy == LRU)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None, version: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if version is not None and entry.version != version:
+                # Versi lama tidak akan terpakai lagi
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._order.touch(key)
+            self.hits += 1
+            return entry.value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Seperti get() tanpa memengaruhi statistik, urutan eviction maupun versi."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return default if entry is None else entry.value
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None, version: Any = None, tag: Hashable = None) -> bool:
+        """False jika tidak disimpan (terlalu besar atau sudah ada versi lebih baru)."""
+        if size is None:
+            size = self._sizeof(value) if self._sizeof else 0
+        size += ENTRY_OVERHEAD
+        if self.max_bytes <= 0 or size > self.max_entry_bytes:
+            return False
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None:
+                if version is not None and current.version is not None and current.version > version:
+                    return False
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, version, tag, expires_at)
+            self._order.add(key)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._evict()
+        return True
+
+    def get_or_put(self, key: Hashable, compute: Callable[[], Any], version: Any = None, tag: Hashable = None) -> Any:
+        """Nilai dari cache, atau hasil compute() yang lalu disimpan (tanpa lock selama compute)."""
+        value = self.get(key, _MISSING, version)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value, version=version, tag=tag)
+        return value
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _evict(self) -> None:
+        victim = self._order.victim()
+        entry = self._entries[victim]
+        expired = entry.expires_at is not None and entry.expires_at <= time.monotonic()
+        self._remove(victim)
+        if expired:
+            self.expirations += 1
+        else:
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._order.remove(key)
+        self.bytes -= entry.size
+        if entry.tag is not None:
+            keys = self._tags[entry.tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry.tag]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+
+_caches: Dict[str, Any] = {}
+_hooks: Dict[str, List[Tuple[Callable[..., None], bool, bool]]] = {}
+_registry_lock = threading.Lock()
+
+
+def register(cache) -> None:
+    """Mendaftarkan cache (apa pun yang punya `name` dan `stats()`) untuk all_stats()."""
+    with _registry_lock:
+        if cache.name in _caches:
+            raise ValueError(f"Cache {cache.name} sudah terdaftar")
+        _caches[cache.name] = cache
+
+
+def create(name: str, max_bytes: int, **options) -> Cache:
+    """Membuat dan mendaftarkan cache; nama harus unik per proses."""
+    cache = Cache(name, max_bytes, **options)
+    register(cache)
+    return cache
+
+
+def all_stats() -> List[dict]:
+    with _registry_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in caches]
+
+
+def on_invalidate(entity: str, remote_only: bool = False, with_details: bool = False):
+    """
+    Dekorator: handler(user_id, entity_id) dipanggil oleh invalidate(entity, ...),
+    atau handler(user_id, entity_id, details) jika with_details.
+    remote_only untuk cache yang sudah diperbarui langsung oleh penulisan di
+    worker ini dan hanya perlu dibuang untuk penulisan dari worker lain.
+    """
+    def register(handler: Callable[..., None]):
+        with _registry_lock:
+            _hooks.setdefault(entity, []).append((handler, remote_only, with_details))
+        return handler
+    return register
+
+
+def invalidate(
+    entity: str,
+    user_id: int,
+    entity_id: Optional[int] = None,
+    remote: bool = False,
+    details: Optional[dict] = None,
+) -> None:
+    """
+    Menjalankan hook invalidasi di worker ini. Endpoint tulis memanggilnya
+    lewat app/invalidation.py (setelah commit), yang juga menyiarkannya ke
+    worker lain; di sana dipanggil dengan remote=True.
+    """
+    for handler, remote_only, with_details in _hooks.get(entity, ()):
+        if remote or not remote_only:
+            if with_details:
+                handler(user_id, entity_id, details)
+            else:
+                handler(user_id, entity_id)
@@ -0,0 +1,225 @@
+# app/columnar.py
+
+"""
+Format ekspor kolumnar untuk DataEntry.
+
+Tata letak (semua little-endian):
+
+    header      : magic b"DECF", versi u16, jumlah kolom u16, jumlah baris u64
+    direktori   : satu entri 56 byte per kolom
+                  nama (16 byte, ASCII, diisi NUL), jenis u8, 3 byte cadangan,
+                  ukuran kamus u32, offset data u64, panjang data u64,
+                  offset kamus u64, panjang kamus u64
+    data        : setiap bagian diratakan ke kelipatan 8 byte
+
+Jenis kolom:
+    1 = int32, 2 = int64 -> buffer kontigu berisi `jumlah baris` nilai
+    3 = string berkamus  -> kode int32 per baris; kamus berisi offset u32
+                            (ukuran kamus + 1 nilai) diikuti blob UTF-8
+
+Karena setiap buffer kontigu dan rata, klien dapat memakai
+`numpy.frombuffer(buf, "<i4", count=n, offset=data_offset)` atau mmap
+tanpa parsing.
+"""
+
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import DataEntry, DATA_ENTRY_INT_FIELDS, DATA_ENTRY_STRING_FIELDS
+
+MAGIC = b"DECF"
+FORMAT_VERSION = 1
+MEDIA_TYPE = "application/vnd.data-entry.columnar"
+
+KIND_INT32 = 1
+KIND_INT64 = 2
+KIND_DICT_STRING = 3
+
+_HEADER = struct.Struct("<4sHHQ")
+_COLUMN = struct.Struct("<16sB3xIQQQQ")
+
+_INT32_MIN = -(2 ** 31)
+_INT32_MAX = 2 ** 31 - 1
+
+# Ukuran batch saat membaca cursor
+FETCH_BATCH_SIZE = 5000
+
+# array('i') dipakai sebagai int32 dan array('q') sebagai int64
+assert array("i").itemsize == 4 and array("q").itemsize == 8
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _little_endian(arr: array) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _stream_rows(db: Session, owner_id: int, columns: Sequence[str]):
+    """
+    Menjalankan SELECT hanya untuk kolom yang diminta dan mengembalikan
+    partisi baris (list of tuple) langsung dari cursor, tanpa objek ORM.
+    """
+    stmt = (
+        select(*[getattr(DataEntry, name) for name in columns])
+        .where(DataEntry.owner_id == owner_id)
+        .order_by(DataEntry.id)
+        .execution_options(yield_per=FETCH_BATCH_SIZE)
+    )
+    return db.execute(stmt).partitions()
+
+
+def count_entries(db: Session, owner_id: int) -> int:
+    return db.execute(
+        select(func.count(DataEntry.id)).where(DataEntry.owner_id == owner_id)
+    ).scalar_one()
+
+
+def load_columns(
+    db: Session,
+    owner_id: int,
+    int_fields: Sequence[str] = ("id",) + DATA_ENTRY_INT_FIELDS,
+    string_fields: Sequence[str] = (),
+) -> Tuple[int, Dict[str, array], Dict[str, List[str]]]:
+    """
+    Memuat kolom DataEntry milik `owner_id` ke array int64 yang dialokasikan
+    di awal (berdasarkan COUNT) dan ke list string.
+
+    Mengembalikan (jumlah baris, {kolom int: array('q')}, {kolom string: list}).
+    """
+    expected = count_entries(db, owner_id)
+    ints = {name: array("q", bytes(8 * expected)) for name in int_fields}
+    strings: Dict[str, List[str]] = {name: [] for name in string_fields}
+    columns = list(int_fields) + list(string_fields)
+
+    n = 0
+    if columns:
+        for part in _stream_rows(db, owner_id, columns):
+            size = len(part)
+            transposed = list(zip(*part))
+            for name, values in zip(int_fields, transposed):
+                target = ints[name]
+                if n + size <= len(target):
+                    target[n:n + size] = array("q", values)
+                else:
+                    # Baris bertambah sejak COUNT dijalankan
+                    del target[n:]
+                    target.extend(values)
+            for name, values in zip(string_fields, transposed[len(int_fields):]):
+                strings[name].extend(values)
+            n += size
+
+    # Baris berkurang sejak COUNT dijalankan
+    for target in ints.values():
+        del target[n:]
+    return n, ints, strings
+
+
+def _int_section(values: array) -> Tuple[int, bytes]:
+    if len(values) and (min(values) < _INT32_MIN or max(values) > _INT32_MAX):
+        return KIND_INT64, _little_endian(values)
+    return KIND_INT32, _little_endian(array("i", values))
+
+
+def _dict_section(values: Iterable[str]) -> Tuple[int, bytes, bytes]:
+    index: Dict[str, int] = {}
+    codes = array("i", [index.setdefault(v, len(index)) for v in values])
+
+    encoded = [v.encode("utf-8") for v in index]
+    offsets = array("I", [0])
+    total = 0
+    for item in encoded:
+        total += len(item)
+        offsets.append(total)
+    dictionary = _little_endian(offsets) + b"".join(encoded)
+    return len(index), _little_endian(codes), dictionary
+
+
+def encode_columnar(n: int, ints: Dict[str, array], strings: Dict[str, List[str]]) -> bytes:
+    sections = []
+    for name, values in ints.items():
+        kind, data = _int_section(values)
+        sections.append((name, kind, 0, data, b""))
+    for name, values in strings.items():
+        dict_size, data, dictionary = _dict_section(values)
+        sections.append((name, KIND_DICT_STRING, dict_size, data, dictionary))
+
+    offset = _align(_HEADER.size + _COLUMN.size * len(sections))
+    directory = []
+    body = []
+    for name, kind, dict_size, data, dictionary in sections:
+        data_offset = offset
+        offset = _align(offset + len(data))
+        dict_offset = offset if dictionary else 0
+        if dictionary:
+            offset = _align(offset + len(dictionary))
+        directory.append(_COLUMN.pack(
+            name.encode("ascii"), kind, dict_size,
+            data_offset, len(data), dict_offset, len(dictionary),
+        ))
+        body.append((data_offset, data))
+        if dictionary:
+            body.append((dict_offset, dictionary))
+
+    out = bytearray(offset)
+    out[:_HEADER.size] = _HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), n)
+    pos = _HEADER.size
+    for entry in directory:
+        out[pos:pos + _COLUMN.size] = entry
+        pos += _COLUMN.size
+    for start, chunk in body:
+        out[start:start + len(chunk)] = chunk
+    return bytes(out)
+
+
+def export_data_entries(db: Session, owner_id: int) -> Tuple[int, bytes]:
+    n, ints, strings = load_columns(
+        db, owner_id,
+        int_fields=("id",) + DATA_ENTRY_INT_FIELDS,
+        string_fields=DATA_ENTRY_STRING_FIELDS,
+    )
+    return n, encode_columnar(n, ints, strings)
+
+
+def decode_columnar(buf: bytes) -> Dict[str, list]:
+    """
+    Pembaca referensi (untuk klien Python tanpa NumPy dan untuk pengujian).
+    """
+    magic, version, column_count, n = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Format kolumnar tidak dikenali")
+
+    view = memoryview(buf)
+    result: Dict[str, list] = {}
+    for i in range(column_count):
+        raw_name, kind, dict_size, data_offset, data_length, dict_offset, dict_length = \
+            _COLUMN.unpack_from(buf, _HEADER.size + i * _COLUMN.size)
+        name = raw_name.rstrip(b"\0").decode("ascii")
+        typecode = "q" if kind == KIND_INT64 else "i"
+        values = array(typecode)
+        values.frombytes(view[data_offset:data_offset + data_length])
+        if sys.byteorder == "big":
+            values.byteswap()
+        if kind == KIND_DICT_STRING:
+            offsets = array("I")
+            offsets.frombytes(view[dict_offset:dict_offset + 4 * (dict_size + 1)])
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            blob_start = dict_offset + 4 * (dict_size + 1)
+            words = [
+                bytes(view[blob_start + offsets[j]:blob_start + offsets[j + 1]]).decode("utf-8")
+                for j in range(dict_size)
+            ]
+            result[name] = [words[code] for code in values]
+        else:
+            result[name] = values.tolist()
+    return result
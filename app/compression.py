@@ -0,0 +1,207 @@
+# app/compression.py
+
+"""
+Middleware ASGI untuk kompresi respons (gzip) dengan negosiasi Accept-Encoding.
+
+- Respons non-streaming di bawah ambang ukuran dikirim apa adanya.
+- Respons streaming dikompresi per potongan (Z_SYNC_FLUSH) sehingga klien
+  tetap menerima data segera; Content-Length dihapus.
+- Level kompresi bisa diatur per route (prefix path terpanjang menang);
+  level 0 mematikan kompresi untuk route tersebut.
+- ETag kuat diberi akhiran "-gzip" karena representasinya berbeda; akhiran
+  itu dibuang lagi dari If-None-Match/If-Match yang masuk sehingga handler
+  tetap membandingkan ETag aslinya. Respons 304 untuk ETag gzip yang dikirim
+  klien kembali membawa akhiran itu (respons kecil yang dikirim tanpa gzip
+  tetap memakai ETag aslinya).
+
+Konfigurasi lewat env: COMPRESSION_MINIMUM_SIZE (byte, bawaan 1024) dan
+COMPRESSION_LEVEL (1..9, bawaan 4).
+"""
+
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+DEFAULT_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 4))
+
+SUPPORTED_ENCODINGS = ("gzip",)
+ETAG_SUFFIX = "-gzip"
+# Sudah terkompresi atau harus mengalir tanpa buffer zlib
+SKIPPED_CONTENT_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/gzip", "application/zip")
+
+
+def choose_encoding(accept_encoding: Optional[str], supported=SUPPORTED_ENCODINGS) -> Optional[str]:
+    """
+    Memilih encoding dengan q-value tertinggi dari Accept-Encoding (RFC 9110),
+    termasuk "*" dan q=0 sebagai penolakan. None berarti identity.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _strip_etag_suffix(value: str) -> str:
+    tags = []
+    for tag in value.split(","):
+        tag = tag.strip()
+        if tag.endswith(ETAG_SUFFIX + '"'):
+            tag = tag[:-len(ETAG_SUFFIX) - 1] + '"'
+        tags.append(tag)
+    return ", ".join(tags)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = MINIMUM_SIZE,
+        level: int = DEFAULT_LEVEL,
+        route_levels: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        # Prefix terpanjang dicek lebih dulu
+        self.route_levels = sorted((route_levels or {}).items(), key=lambda item: -len(item[0]))
+
+    def level_for(self, path: str) -> int:
+        for prefix, level in self.route_levels:
+            if path.startswith(prefix):
+                return level
+        return self.level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = scope["headers"]
+        level = self.level_for(scope["path"])
+        encoding = choose_encoding(
+            (_header(request_headers, b"accept-encoding") or b"").decode("latin-1")
+        ) if level > 0 else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # ETag gzip yang dimiliki klien, untuk menjawab 304 dengan ETag yang sama
+        if_none_match = (_header(request_headers, b"if-none-match") or b"").decode("latin-1")
+        gzip_etags = {
+            tag[2:] if tag.startswith("W/") else tag
+            for tag in (part.strip() for part in if_none_match.split(","))
+            if tag.endswith(ETAG_SUFFIX + '"')
+        }
+
+        # ETag representasi gzip -> ETag asli untuk handler
+        scope = dict(scope, headers=[
+            (key, _strip_etag_suffix(value.decode("latin-1")).encode("latin-1"))
+            if key.lower() in (b"if-none-match", b"if-match") else (key, value)
+            for key, value in request_headers
+        ])
+        await self.app(scope, receive, _CompressingSender(send, level, self.minimum_size, gzip_etags))
+
+
+def _with_vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    # Cache bersama harus membedakan varian berdasarkan Accept-Encoding
+    vary = _header(headers, b"vary")
+    headers = [(key, value) for key, value in headers if key.lower() != b"vary"]
+    headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+    return headers
+
+
+class _CompressingSender:
+    def __init__(self, send, level: int, minimum_size: int, gzip_etags=frozenset()):
+        self.send = send
+        self.level = level
+        self.minimum_size = minimum_size
+        self.gzip_etags = gzip_etags
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = message.get("headers", [])
+            content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+            self.passthrough = (
+                message["status"] < 200
+                or message["status"] in (204, 304)
+                or _header(headers, b"content-encoding") is not None
+                or content_type.startswith(SKIPPED_CONTENT_TYPES)
+            )
+            if message["status"] == 304:
+                message = self._not_modified(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                # Respons kecil: overhead header gzip tidak sepadan
+                await self.send(self._start(compressed=False))
+                await self.send(message)
+                return
+            self.compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            await self.send(self._start(compressed=True))
+
+        data = self.compressor.compress(body)
+        data += self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _not_modified(self, message):
+        headers = []
+        for key, value in message.get("headers", []):
+            if key.lower() == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+                tagged = value[:-1] + ETAG_SUFFIX.encode() + b'"'
+                if tagged.decode("latin-1") in self.gzip_etags:
+                    value = tagged
+            headers.append((key, value))
+        return dict(message, headers=_with_vary(headers))
+
+    def _start(self, compressed: bool):
+        headers = []
+        for key, value in self.start_message.get("headers", []):
+            name = key.lower()
+            if compressed:
+                if name == b"content-length":
+                    continue
+                if name == b"etag" and value.endswith(b'"') and not value.startswith(b"W/"):
+                    value = value[:-1] + ETAG_SUFFIX.encode() + b'"'
+            headers.append((key, value))
+        if compressed:
+            headers.append((b"content-encoding", b"gzip"))
+        return dict(self.start_message, headers=_with_vary(headers))
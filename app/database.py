@@ -17,3 +17,17 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+def dialect_insert(bind, table):
+    """
+    INSERT khusus dialect yang mendukung ON CONFLICT (PostgreSQL dan SQLite).
+    """
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT tidak didukung untuk dialect {dialect}")
+    return insert(table)
@@ -0,0 +1,106 @@
+# app/directory.py
+
+"""
+Direktori pengguna untuk admin: daftar keyset per id, pencarian prefix pada
+nama/username/email (indeks lower(...) text_pattern_ops), dan jumlah pengguna
+per role/disease.
+
+Jumlah per grup tidak dihitung dengan GROUP BY atas seluruh tabel users,
+melainkan dibaca dari tabel user_group_counts yang diperbarui di transaksi
+yang sama dengan registrasi, provisioning massal, dan perubahan profil.
+"""
+
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .models import User, UserGroupCount
+from .schemas import GroupCount, UserAggregatesResponse, UserDirectoryResponse, UserResponse
+
+GROUP_DIMENSIONS = ("role", "disease")
+# NULL tidak bisa menjadi bagian primary key; disimpan sebagai string kosong
+NULL_VALUE = ""
+
+_users = User.__table__
+_group_counts = UserGroupCount.__table__
+_returned_columns = [_users.c[name] for name in UserResponse.model_fields]
+
+
+def _group_keys(user: Mapping[str, Any]) -> List[Tuple[str, str]]:
+    return [(dimension, user[dimension] or NULL_VALUE) for dimension in GROUP_DIMENSIONS]
+
+
+def _apply(db: Session, deltas: Counter) -> None:
+    """Satu upsert multi-baris; delta sudah dijumlahkan per kunci (syarat ON CONFLICT)."""
+    rows = [
+        {"dimension": dimension, "value": value, "count": delta}
+        for (dimension, value), delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+    stmt = dialect_insert(db.get_bind(), _group_counts).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[_group_counts.c.dimension, _group_counts.c.value],
+        set_={"count": _group_counts.c.count + stmt.excluded.count},
+    ))
+
+
+def record_users_created(db: Session, users: Iterable[Mapping[str, Any]]) -> None:
+    """Dipanggil sebelum commit, dengan baris hasil INSERT ... RETURNING."""
+    deltas = Counter()
+    for user in users:
+        deltas.update(_group_keys(user))
+    _apply(db, deltas)
+
+
+def record_user_updated(db: Session, old: Mapping[str, Any], new: Mapping[str, Any]) -> None:
+    deltas = Counter()
+    for key in _group_keys(old):
+        deltas[key] -= 1
+    for key in _group_keys(new):
+        deltas[key] += 1
+    _apply(db, deltas)
+
+
+def get_group_counts(db: Session) -> UserAggregatesResponse:
+    groups: Dict[str, List[GroupCount]] = {dimension: [] for dimension in GROUP_DIMENSIONS}
+    rows = db.execute(
+        select(_group_counts.c.dimension, _group_counts.c.value, _group_counts.c.count)
+        .where(_group_counts.c.count > 0)
+        .order_by(_group_counts.c.dimension, _group_counts.c.count.desc(), _group_counts.c.value)
+    )
+    for dimension, value, count in rows:
+        if dimension in groups:
+            groups[dimension].append(GroupCount(value=value or None, count=count))
+    return UserAggregatesResponse(**groups)
+
+
+def list_users(
+    db: Session,
+    after_id: Optional[int] = None,
+    limit: int = 50,
+    q: Optional[str] = None,
+) -> UserDirectoryResponse:
+    """Halaman berikutnya setelah after_id, urut id; q = prefix nama/username/email."""
+    stmt = select(*_returned_columns).order_by(_users.c.id).limit(limit + 1)
+    if after_id is not None:
+        stmt = stmt.where(_users.c.id > after_id)
+    if q:
+        prefix = q.strip().lower()
+        stmt = stmt.where(or_(*[
+            func.lower(_users.c[column]).startswith(prefix, autoescape=True)
+            for column in ("name", "username", "email")
+        ]))
+    rows = db.execute(stmt).all()
+    next_after_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after_id = rows[-1].id
+    return UserDirectoryResponse(
+        users=[UserResponse.from_orm(row) for row in rows],
+        next_after_id=next_after_id,
+    )
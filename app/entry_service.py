@@ -0,0 +1,149 @@
+# app/entry_service.py
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from . import query_filters
+from .models import DataEntry, DataEntryTombstone, DATA_ENTRY_INT_FIELDS
+from .rowcodec import Projection
+from .schemas import DataEntryResponse
+
+_entries = DataEntry.__table__
+_tombstones = DataEntryTombstone.__table__
+
+# Field DataEntryResponse dalam urutan skema; SELECT dan encoder disusun sekali per kombinasi fields=
+RESPONSE_FIELDS = tuple(DataEntryResponse.model_fields)
+LIST_PROJECTION = Projection(
+    _entries, RESPONSE_FIELDS,
+    lambda columns: select(*columns).where(_entries.c.owner_id == bindparam("owner_id")),
+)
+# Kolom version selalu ikut di akhir untuk ETag; encoder berhenti di kolom terakhir yang diminta
+ITEM_PROJECTION = Projection(
+    _entries, RESPONSE_FIELDS,
+    lambda columns: select(*columns, _entries.c.version).where(
+        _entries.c.id == bindparam("entry_id"), _entries.c.owner_id == bindparam("owner_id")
+    ),
+)
+
+UpdateResult = Optional[Tuple[Row, Dict[str, int]]]
+
+
+def _conditions(table, owner_id: int, entry_id: int, expected_versions: Optional[Sequence[int]]):
+    conditions = [table.c.id == entry_id, table.c.owner_id == owner_id]
+    if expected_versions is not None:
+        conditions.append(table.c.version.in_(expected_versions))
+    return conditions
+
+
+def create_entry(db: Session, owner_id: int, values: Dict[str, Any], change_seq: int) -> Row:
+    """INSERT ... RETURNING: baris baru tanpa SELECT/refresh setelah commit."""
+    return db.execute(
+        insert(_entries)
+        .values(**values, owner_id=owner_id, change_seq=change_seq)
+        .returning(*_entries.columns)
+    ).one()
+
+
+def delete_entry(db: Session, owner_id: int, entry_id: int, change_seq: int) -> Optional[Row]:
+    """
+    DELETE ... RETURNING nilai int_field (untuk statistik), lalu INSERT
+    tombstone. Mengembalikan None jika entry tidak ditemukan.
+    """
+    row = db.execute(
+        delete(_entries)
+        .where(_entries.c.id == entry_id, _entries.c.owner_id == owner_id)
+        .returning(_entries.c.id, _entries.c.owner_id, *[_entries.c[field] for field in DATA_ENTRY_INT_FIELDS])
+    ).first()
+    if row is None:
+        return None
+    db.execute(insert(_tombstones).values(entry_id=entry_id, owner_id=owner_id, change_seq=change_seq))
+    return row
+
+
+def update_entry(
+    db: Session,
+    owner_id: int,
+    entry_id: int,
+    changes: Dict[str, Any],
+    change_seq: int,
+    expected_versions: Optional[Sequence[int]] = None,
+) -> UpdateResult:
+    """
+    Memperbarui data entry dalam satu pernyataan
+    `UPDATE ... WHERE id AND owner_id [AND version IN (...)] RETURNING ...`.
+
+    Mengembalikan (baris baru, nilai int_field lama) atau None jika tidak ada
+    baris yang cocok (tidak ditemukan atau versi berbeda). Pemanggil harus sudah
+    memanggil versioning.bump_data_version, yang mengunci baris users sehingga
+    penulisan entry milik pengguna yang sama berjalan berurutan.
+    """
+    values = dict(changes)
+    values.update(change_seq=change_seq, version=_entries.c.version + 1)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Nilai lama dibaca dari snapshot awal pernyataan lewat UPDATE ... FROM
+        old = (
+            select(_entries.c.id, *[_entries.c[field] for field in DATA_ENTRY_INT_FIELDS])
+            .where(*_conditions(_entries, owner_id, entry_id, expected_versions))
+            .subquery("old")
+        )
+        stmt = (
+            update(_entries)
+            .where(_entries.c.id == old.c.id, *_conditions(_entries, owner_id, entry_id, expected_versions))
+            .values(**values)
+            .returning(*_entries.columns, *[old.c[field].label(f"old_{field}") for field in DATA_ENTRY_INT_FIELDS])
+        )
+        row = db.execute(stmt).first()
+        if row is None:
+            return None
+        return row, {field: row._mapping[f"old_{field}"] for field in DATA_ENTRY_INT_FIELDS}
+
+    # SQLite tidak mengizinkan tabel FROM di RETURNING: baca nilai lama terlebih dahulu
+    old_row = db.execute(
+        select(*[_entries.c[field] for field in DATA_ENTRY_INT_FIELDS])
+        .where(*_conditions(_entries, owner_id, entry_id, expected_versions))
+    ).first()
+    if old_row is None:
+        return None
+    row = db.execute(
+        update(_entries)
+        .where(*_conditions(_entries, owner_id, entry_id, expected_versions))
+        .values(**values)
+        .returning(*_entries.columns)
+    ).first()
+    if row is None:
+        return None
+    return row, dict(old_row._mapping)
+
+
+def current_version(db: Session, owner_id: int, entry_id: int) -> Optional[int]:
+    return db.execute(
+        select(_entries.c.version).where(_entries.c.id == entry_id, _entries.c.owner_id == owner_id)
+    ).scalar()
+
+
+def list_entries(
+    db: Session,
+    owner_id: int,
+    skip: int,
+    limit: int,
+    filters: Sequence[str] = (),
+    sort: Optional[str] = None,
+    fields: Tuple[str, ...] = RESPONSE_FIELDS,
+) -> List[Row]:
+    """
+    Baris tuple (urutan `fields`) tanpa instance ORM; di-encode langsung
+    dengan LIST_PROJECTION.encoder(fields). ValueError jika filter/sort tidak valid.
+    """
+    base, _ = LIST_PROJECTION.get(fields)
+    stmt = query_filters.apply_filters(base, list(filters), sort)
+    return db.execute(stmt.offset(skip).limit(limit), {"owner_id": owner_id}).all()
+
+
+def get_entry(db: Session, owner_id: int, entry_id: int, fields: Tuple[str, ...] = RESPONSE_FIELDS) -> Optional[Row]:
+    """Baris (urutan `fields`, lalu version) atau None; encode dengan ITEM_PROJECTION.encoder(fields)."""
+    stmt, _ = ITEM_PROJECTION.get(fields)
+    return db.execute(stmt, {"entry_id": entry_id, "owner_id": owner_id}).first()
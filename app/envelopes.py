@@ -0,0 +1,92 @@
+# app/envelopes.py
+
+"""
+Serializer JSON untuk amplop ResponseModel[T] yang dibangun sekali saat impor.
+
+Handler mengembalikan Response berisi bytes hasil serializer ini, sehingga
+FastAPI tidak lagi memvalidasi ulang dan meng-encode ulang amplop terhadap
+response_model (response_model tetap dipakai untuk dokumentasi OpenAPI).
+Objek data harus sudah berupa model/nilai yang valid untuk T.
+
+Jika klien meminta MessagePack (lihat app/negotiation.py), amplop yang sama
+di-encode sebagai MessagePack; baris tuple di-encode langsung oleh encoder
+Projection tanpa dict perantara.
+"""
+
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from . import msgpack_codec, negotiation, schemas
+from .rowcodec import Projection
+
+T = TypeVar("T")
+
+MEDIA_TYPE = "application/json"
+
+
+class Envelope(Generic[T]):
+    def __init__(self, data_type: Any):
+        self.model = schemas.ResponseModel[data_type]
+        self._adapter = TypeAdapter(self.model)
+
+    def encode(self, success: bool, data: Optional[T] = None, error: Optional[str] = None) -> bytes:
+        # model_construct: tanpa validasi, data sudah tervalidasi oleh pemanggil
+        return self._adapter.dump_json(self.model.model_construct(success=success, data=data, error=error))
+
+    def encode_msgpack(self, success: bool, data: Optional[T] = None, error: Optional[str] = None) -> bytes:
+        envelope = self.model.model_construct(success=success, data=data, error=error)
+        return msgpack_codec.packb(self._adapter.dump_python(envelope, mode="json"))
+
+    def ok(self, data: Optional[T] = None, headers: Optional[Dict[str, str]] = None, status_code: int = 200) -> Response:
+        if negotiation.wants_msgpack():
+            return Response(self.encode_msgpack(True, data), status_code=status_code,
+                            media_type=msgpack_codec.MEDIA_TYPE, headers=headers)
+        return Response(self.encode(True, data), status_code=status_code, media_type=MEDIA_TYPE, headers=headers)
+
+
+ANY = Envelope(Any)
+EMPTY = Envelope(None)
+USER = Envelope(schemas.UserResponse)
+AVAILABILITY = Envelope(schemas.AvailabilityResponse)
+BULK_PROVISION = Envelope(schemas.BulkProvisionResponse)
+USER_DIRECTORY = Envelope(schemas.UserDirectoryResponse)
+USER_AGGREGATES = Envelope(schemas.UserAggregatesResponse)
+METRICS = Envelope(schemas.MetricsResponse)
+DATA_ENTRY = Envelope(schemas.DataEntryResponse)
+DATA_ENTRY_LIST = Envelope(List[schemas.DataEntryResponse])
+DATA_ENTRY_STATS = Envelope(schemas.DataEntryStatsResponse)
+DATA_ENTRY_ANALYTICS = Envelope(schemas.DataEntryAnalyticsResponse)
+DATA_ENTRY_SEARCH = Envelope(schemas.DataEntrySearchResponse)
+DATA_ENTRY_CHANGES = Envelope(schemas.DataEntryChangesResponse)
+ACTIVITY_LOG = Envelope(schemas.ActivityLogResponse)
+
+
+def ok_json(data_json: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Amplop sukses JSON untuk data yang sudah di-encode (mis. oleh app/rowcodec.py)."""
+    body = '{"success":true,"data":' + data_json + ',"error":null}'
+    return Response(body.encode("utf-8"), media_type=MEDIA_TYPE, headers=headers)
+
+
+def ok_rows(projection: Projection, fields: Tuple[str, ...], rows: Sequence, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Daftar baris tuple (urutan `fields`) dalam format yang dinegosiasikan."""
+    if negotiation.wants_msgpack():
+        body = msgpack_codec.envelope(True, projection.msgpack_encoder(fields).encode_rows(rows))
+        return Response(body, media_type=msgpack_codec.MEDIA_TYPE, headers=headers)
+    return ok_json(projection.encoder(fields).encode_rows(rows), headers)
+
+
+def ok_row(projection: Projection, fields: Tuple[str, ...], row: Sequence, headers: Optional[Dict[str, str]] = None) -> Response:
+    if negotiation.wants_msgpack():
+        body = msgpack_codec.envelope(True, projection.msgpack_encoder(fields).encode_row(row))
+        return Response(body, media_type=msgpack_codec.MEDIA_TYPE, headers=headers)
+    return ok_json(projection.encoder(fields).encode_row(row), headers)
+
+
+def fail(error: str, status_code: int = 200) -> Response:
+    """Respons error domain (success=False) untuk endpoint bertipe apa pun."""
+    if negotiation.wants_msgpack():
+        return Response(msgpack_codec.envelope(False, error=error), status_code=status_code,
+                        media_type=msgpack_codec.MEDIA_TYPE)
+    return Response(ANY.encode(False, error=error), status_code=status_code, media_type=MEDIA_TYPE)
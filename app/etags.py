@@ -0,0 +1,68 @@
+# app/etags.py
+
+import hashlib
+from typing import List, Optional, Sequence
+
+from fastapi import Request, Response, status
+
+
+def _fields_suffix(fields: Optional[Sequence[str]]) -> str:
+    # Representasi parsial (fields=) harus punya ETag kuat yang berbeda
+    if not fields:
+        return ""
+    return "-f" + hashlib.blake2b(",".join(fields).encode(), digest_size=4).hexdigest()
+
+
+def entry_etag(entry_id: int, version: int, fields: Optional[Sequence[str]] = None) -> str:
+    return f'"de-{entry_id}-v{version}{_fields_suffix(fields)}"'
+
+
+def user_etag(user_id: int, version: int, fields: Optional[Sequence[str]] = None) -> str:
+    return f'"u-{user_id}-v{version}{_fields_suffix(fields)}"'
+
+
+def list_etag(kind: str, user_id: int, data_version: int, *params) -> str:
+    """
+    ETag untuk daftar. users.data_version adalah change_seq tertinggi milik
+    pengguna (termasuk tombstone), jadi setiap create/update/delete mengubahnya;
+    parameter query ikut di-hash karena menentukan isi halaman.
+    """
+    digest = hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+    return f'"{kind}-{user_id}-d{data_version}-{digest}"'
+
+
+def _tags(header: Optional[str]):
+    if not header:
+        return []
+    # Perbandingan lemah untuk If-None-Match (RFC 9110), abaikan awalan W/
+    tags = [tag.strip() for tag in header.split(",")]
+    return [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def matches_if_none_match(request: Request, etag: str) -> bool:
+    tags = _tags(request.headers.get("if-none-match"))
+    return "*" in tags or etag in tags
+
+
+def parse_if_match(header: str, entry_id: int) -> Optional[List[int]]:
+    """
+    Mengembalikan daftar versi yang diterima dari header If-Match untuk entry
+    ini (perbandingan kuat, tag lemah diabaikan), atau None untuk "*".
+    """
+    tags = [tag.strip() for tag in header.split(",")]
+    if "*" in tags:
+        return None
+    prefix = f'"de-{entry_id}-v'
+    versions = []
+    for tag in tags:
+        if tag.startswith(prefix) and tag.endswith('"'):
+            try:
+                # ETag representasi parsial tetap mengacu ke versi yang sama
+                versions.append(int(tag[len(prefix):-1].split("-", 1)[0]))
+            except ValueError:
+                continue
+    return versions
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,378 @@
+# app/events.py
+
+"""
+Distribusi event perubahan data entry ke klien (Server-Sent Events).
+
+Setiap worker memiliki satu EventHub. Hub memegang satu langganan backend
+per pengguna (dibuka saat koneksi pertama pengguna itu masuk dan ditutup saat
+koneksi terakhir keluar) lalu menyebarkan pesan ke semua antrean koneksi
+pengguna tersebut. Pesan hanya berisi {type, id, change_seq}; klien mengambil
+datanya lewat GET /data_entries/{id} atau /data_entries/changes, sehingga
+ukuran payload tidak bergantung isi entry (batas NOTIFY 8000 byte). Event
+"resync" berarti event mungkin terlewat (koneksi backend tersambung ulang) dan
+klien perlu menarik /data_entries/changes. Backend menyampaikan pesan antar
+worker:
+
+- PostgresNotifyBackend : LISTEN/NOTIFY, satu kanal per pengguna
+- UnixSocketBackend     : datagram Unix antar worker dalam satu host, tanpa
+                          database (pengganti LISTEN/NOTIFY untuk SQLite)
+- InMemoryBackend       : hanya di dalam proses, untuk pengujian/SQLite
+
+Backend yang sama dipakai bus invalidasi cache (app/invalidation.py).
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+
+from .database import engine
+
+CHANNEL_PREFIX = "data_entries_"
+QUEUE_SIZE = 100
+
+MessageHandler = Callable[[str, str], None]
+ReconnectHandler = Callable[[], None]
+
+RESYNC_PAYLOAD = json.dumps({"type": "resync"})
+
+logger = logging.getLogger(__name__)
+
+
+def channel_for(user_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+class InMemoryBackend:
+    def __init__(self):
+        self._handlers = []
+        self._channels: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def start(self, on_message: MessageHandler, on_reconnect: Optional[ReconnectHandler] = None) -> None:
+        self._handlers.append(on_message)
+
+    def stop(self) -> None:
+        self._handlers.clear()
+
+    def subscribe(self, channel: str) -> None:
+        with self._lock:
+            self._channels.add(channel)
+
+    def unsubscribe(self, channel: str) -> None:
+        with self._lock:
+            self._channels.discard(channel)
+
+    def publish(self, channel: str, payload: str) -> None:
+        with self._lock:
+            if channel not in self._channels:
+                return
+        for handler in list(self._handlers):
+            handler(channel, payload)
+
+
+class PostgresNotifyBackend:
+    """
+    Satu koneksi LISTEN per worker yang hanya dipakai thread latar.
+    subscribe()/unsubscribe() mengantrekan LISTEN/UNLISTEN dan membangunkan
+    thread itu lewat pipe, jadi event loop tidak pernah menunggu database.
+    Jika koneksi terputus, thread menyambung ulang dengan backoff eksponensial,
+    mengulang LISTEN untuk semua kanal lalu memanggil on_reconnect (notifikasi
+    selama terputus hilang). publish memakai pg_notify lewat koneksi pool biasa.
+
+    Koneksi LISTEN (AUTOCOMMIT) dipegang thread latar selama hidupnya dan
+    memakai satu slot pool; saat ditutup koneksi itu dibuang (invalidate),
+    bukan dikembalikan, agar sesi permintaan tidak pernah mendapat koneksi
+    autocommit yang masih LISTEN.
+    """
+
+    POLL_SECONDS = 1.0
+    RECONNECT_MIN_SECONDS = 0.5
+    RECONNECT_MAX_SECONDS = 30.0
+
+    def __init__(self, bind=engine):
+        self._engine = bind
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._channels: Set[str] = set()
+        self._pending: List[str] = []  # LISTEN/UNLISTEN yang belum dijalankan thread latar
+        self._wakeup_read = self._wakeup_write = -1
+        self._on_message: Optional[MessageHandler] = None
+        self._on_reconnect: Optional[ReconnectHandler] = None
+
+    def start(self, on_message: MessageHandler, on_reconnect: Optional[ReconnectHandler] = None) -> None:
+        self._on_message = on_message
+        self._on_reconnect = on_reconnect
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        os.set_blocking(self._wakeup_write, False)
+        self._thread = threading.Thread(target=self._run, name="pg-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._wakeup()
+            self._thread.join(timeout=self.POLL_SECONDS * 2)
+            os.close(self._wakeup_read)
+            os.close(self._wakeup_write)
+            self._thread = None
+
+    def _wakeup(self) -> None:
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except BlockingIOError:
+            pass  # Pipe penuh: thread latar sudah pasti akan bangun
+
+    def subscribe(self, channel: str) -> None:
+        # Nama kanal dibentuk dari user_id (integer), aman untuk dikutip langsung
+        with self._lock:
+            self._channels.add(channel)
+            self._pending.append(f'LISTEN "{channel}"')
+        self._wakeup()
+
+    def unsubscribe(self, channel: str) -> None:
+        with self._lock:
+            self._channels.discard(channel)
+            self._pending.append(f'UNLISTEN "{channel}"')
+        self._wakeup()
+
+    def publish(self, channel: str, payload: str) -> None:
+        with self._engine.connect() as conn:
+            conn.exec_driver_sql("SELECT pg_notify(%s, %s)", (channel, payload))
+            conn.commit()
+
+    def _connect(self):
+        conn = self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            # Koneksi baru mendengarkan semua kanal saat ini; antrean lama tidak lagi relevan
+            with self._lock:
+                channels = list(self._channels)
+                self._pending.clear()
+            for channel in channels:
+                conn.exec_driver_sql(f'LISTEN "{channel}"')
+        except Exception:
+            self._close(conn)
+            raise
+        return conn
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.invalidate()
+            conn.close()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        delay = self.RECONNECT_MIN_SECONDS
+        connected_before = False
+        while not self._stopping.is_set():
+            try:
+                conn = self._connect()
+            except Exception:
+                logger.exception("Gagal membuka koneksi LISTEN, mencoba lagi dalam %.1f detik", delay)
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+                continue
+            delay = self.RECONNECT_MIN_SECONDS
+            if connected_before and self._on_reconnect is not None:
+                self._on_reconnect()
+            connected_before = True
+            try:
+                self._listen(conn)
+            except Exception:
+                logger.exception("Koneksi LISTEN terputus, menyambung ulang")
+            finally:
+                self._close(conn)
+
+    def _listen(self, conn) -> None:
+        driver = conn.connection.driver_connection
+        while not self._stopping.is_set():
+            with self._lock:
+                statements, self._pending = self._pending, []
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            readable, _, _ = select.select([driver, self._wakeup_read], [], [], self.POLL_SECONDS)
+            if self._wakeup_read in readable:
+                try:
+                    while os.read(self._wakeup_read, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            if driver in readable:
+                driver.poll()
+                notifications, driver.notifies[:] = list(driver.notifies), []
+                for notification in notifications:
+                    self._on_message(notification.channel, notification.payload)
+
+
+class UnixSocketBackend:
+    """
+    Setiap worker mengikat satu socket datagram di `directory`; publish
+    mengirim ke semua socket di direktori itu (termasuk miliknya sendiri,
+    seperti NOTIFY). Socket milik worker yang sudah mati dihapus saat
+    pengiriman gagal. Datagram berisi "kanal\npayload".
+    """
+
+    SUFFIX = ".sock"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}{self.SUFFIX}")
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._channels: Set[str] = set()
+        self._lock = threading.Lock()
+        self._on_message: Optional[MessageHandler] = None
+
+    def start(self, on_message: MessageHandler, on_reconnect: Optional[ReconnectHandler] = None) -> None:
+        self._on_message = on_message
+        os.makedirs(self.directory, exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._thread = threading.Thread(target=self._run, name="unix-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._socket is not None:
+            # shutdown membangunkan recv di thread pembaca
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def subscribe(self, channel: str) -> None:
+        with self._lock:
+            self._channels.add(channel)
+
+    def unsubscribe(self, channel: str) -> None:
+        with self._lock:
+            self._channels.discard(channel)
+
+    def publish(self, channel: str, payload: str) -> None:
+        message = f"{channel}\n{payload}".encode("utf-8")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+            # Antrean penerima yang penuh tidak boleh menahan handler pengirim
+            sender.setblocking(False)
+            for path in glob.glob(os.path.join(glob.escape(self.directory), "*" + self.SUFFIX)):
+                try:
+                    sender.sendto(message, path)
+                except BlockingIOError:
+                    continue
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Worker sudah berhenti tanpa membersihkan socket-nya
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+
+    def _run(self) -> None:
+        sock = self._socket
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            channel, _, payload = data.decode("utf-8").partition("\n")
+            with self._lock:
+                subscribed = channel in self._channels
+            if subscribed:
+                self._on_message(channel, payload)
+
+
+class EventHub:
+    def __init__(self, backend):
+        self.backend = backend
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: Dict[int, Set[asyncio.Queue]] = {}
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self.backend.start(self._on_message, self._on_reconnect)
+
+    def stop(self) -> None:
+        self.backend.stop()
+        self._loop = None
+        self._queues.clear()
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Dipanggil dari event loop."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        queues = self._queues.setdefault(user_id, set())
+        if not queues:
+            self.backend.subscribe(channel_for(user_id))
+        queues.add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._queues.get(user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._queues[user_id]
+            self.backend.unsubscribe(channel_for(user_id))
+
+    def publish(self, user_id: int, event_type: str, change_seq: int, entry_id: int) -> None:
+        """
+        Dipanggil dari handler (threadpool) setelah commit. Penulisan sudah
+        tersimpan, jadi kegagalan pengiriman hanya dicatat: respons error akan
+        membuat klien mengulang penulisan dan menggandakan data.
+        """
+        payload = json.dumps({"type": event_type, "id": entry_id, "change_seq": change_seq})
+        try:
+            self.backend.publish(channel_for(user_id), payload)
+        except Exception:
+            logger.exception("Gagal mengirim event %s untuk pengguna %s", event_type, user_id)
+
+    def _on_message(self, channel: str, payload: str) -> None:
+        # Bisa dipanggil dari thread mana pun
+        loop = self._loop
+        if loop is not None and channel.startswith(CHANNEL_PREFIX):
+            loop.call_soon_threadsafe(self._dispatch, int(channel[len(CHANNEL_PREFIX):]), payload)
+
+    def _on_reconnect(self) -> None:
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._dispatch_all, RESYNC_PAYLOAD)
+
+    def _dispatch_all(self, payload: str) -> None:
+        for user_id in list(self._queues):
+            self._dispatch(user_id, payload)
+
+    def _dispatch(self, user_id: int, payload: str) -> None:
+        for queue in self._queues.get(user_id, ()):
+            if queue.full():
+                # Klien lambat: buang event tertua daripada menahan pengirim
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+
+def _default_backend():
+    name = os.getenv("EVENT_BACKEND") or ("postgres" if engine.dialect.name == "postgresql" else "memory")
+    if name == "postgres":
+        return PostgresNotifyBackend()
+    if name == "unix":
+        return UnixSocketBackend(os.getenv("EVENT_SOCKET_DIR", "/tmp/app-events"))
+    return InMemoryBackend()
+
+
+hub = EventHub(_default_backend())
@@ -0,0 +1,179 @@
+# app/identifiers.py
+
+"""
+Indeks probabilistik (Bloom filter) atas username dan email yang sudah
+terpakai, satu per worker. Jawaban "pasti belum terpakai" diberikan tanpa
+menyentuh database; hanya kemungkinan-terpakai yang diteruskan ke probe
+berindeks.
+
+Filter dimuat saat startup dan ditambah saat registrasi dan perubahan profil.
+Identifier dari registrasi dan perubahan email di worker lain datang lewat
+event USER di bus invalidasi (app/invalidation.py, details berisi
+username/email). Penyegaran berkala (id > id terakhir yang dimuat) tetap
+berjalan untuk pengguna yang tidak diumumkan lewat bus (provisioning massal,
+event yang gagal terkirim).
+"""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from . import cache as caches
+from .models import User
+from .schemas import normalize_identifier
+
+FALSE_POSITIVE_RATE = 0.01
+MIN_CAPACITY = 100_000
+REFRESH_SECONDS = 30
+LOAD_BATCH_SIZE = 10_000
+
+
+normalize = normalize_identifier
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, false_positive_rate: float = FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class IdentifierFilter:
+    """
+    Bloom filter yang bisa membesar: jika filter aktif penuh, filter baru
+    dengan kapasitas dua kali lipat ditambahkan (scalable Bloom filter).
+    """
+
+    def __init__(self):
+        self._filters: List[BloomFilter] = []
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.last_user_id = 0
+        self.last_refresh = 0.0
+
+    def _add(self, key: str) -> None:
+        current = self._filters[-1] if self._filters else None
+        if current is None or current.count >= current.capacity:
+            capacity = current.capacity * 2 if current else MIN_CAPACITY
+            current = BloomFilter(capacity)
+            self._filters.append(current)
+        current.add(key)
+
+    def add_many(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._add(key)
+
+    def __contains__(self, key: str) -> bool:
+        if not self.loaded:
+            # Belum dimuat: jangan pernah menjawab "pasti belum terpakai"
+            return True
+        return any(key in bloom for bloom in self._filters)
+
+    def load(self, db: Session, since_id: int = 0) -> None:
+        rows = db.execute(
+            select(User.id, User.username, User.email)
+            .where(User.id > since_id)
+            .order_by(User.id)
+            .execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+        last_id = since_id
+        for part in rows.partitions():
+            self.add_many(
+                key
+                for _, username, email in part
+                for key in (f"u:{normalize(username)}", f"e:{normalize(email)}")
+            )
+            last_id = part[-1][0]
+        with self._lock:
+            self.last_user_id = max(self.last_user_id, last_id)
+            self.last_refresh = time.monotonic()
+            self.loaded = True
+
+    def refresh_if_due(self, db: Session) -> None:
+        if self.loaded and time.monotonic() - self.last_refresh >= REFRESH_SECONDS:
+            self.load(db, since_id=self.last_user_id)
+
+
+identifier_filter = IdentifierFilter()
+
+
+def load(db: Session) -> None:
+    identifier_filter.load(db)
+
+
+def remember_taken(username: Optional[str] = None, email: Optional[str] = None) -> None:
+    keys = []
+    if username:
+        keys.append(f"u:{normalize(username)}")
+    if email:
+        keys.append(f"e:{normalize(email)}")
+    identifier_filter.add_many(keys)
+
+
+@caches.on_invalidate(caches.USER, remote_only=True, with_details=True)
+def _remember_remote(user_id: int, entity_id: Optional[int], details: Optional[dict]) -> None:
+    if details:
+        remember_taken(details.get("username"), details.get("email"))
+
+
+def username_maybe_taken(username: str) -> bool:
+    return f"u:{normalize(username)}" in identifier_filter
+
+
+def email_maybe_taken(email: str) -> bool:
+    return f"e:{normalize(email)}" in identifier_filter
+
+
+def maybe_taken(username: str, email: str) -> bool:
+    return username_maybe_taken(username) or email_maybe_taken(email)
+
+
+def username_exists(db: Session, username: str) -> bool:
+    return db.execute(
+        select(User.id).where(func.lower(User.username) == normalize(username)).limit(1)
+    ).first() is not None
+
+
+def email_exists(db: Session, email: str) -> bool:
+    return db.execute(
+        select(User.id).where(func.lower(User.email) == normalize(email)).limit(1)
+    ).first() is not None
+
+
+def find_conflict(db: Session, username: str, email: str) -> Optional[str]:
+    """
+    Probe pada indeks unik lower(username) / lower(email) untuk menentukan
+    field mana yang sudah dipakai. Mengembalikan "username", "email", atau None.
+    """
+    username, email = normalize(username), normalize(email)
+    rows = db.execute(
+        select(User.username, User.email)
+        .where(or_(func.lower(User.username) == username, func.lower(User.email) == email))
+        .limit(2)
+    ).all()
+    for row in rows:
+        if normalize(row.username) == username:
+            return "username"
+    return "email" if rows else None
@@ -0,0 +1,159 @@
+# app/invalidation.py
+
+"""
+Bus invalidasi cache antar worker.
+
+Endpoint tulis memanggil publish(entitas, user_id, entity_id, version,
+details) setelah commit. Hook cache di worker ini langsung dijalankan (lihat
+app/cache.py), lalu event {entity, user_id, id, version, details, sent_at,
+origin} dikirim lewat transport ke semua worker. Penerima menjalankan hook yang sama
+dengan remote=True dan mengabaikan event dari dirinya sendiri.
+
+Transport memakai backend app/events.py pada kanal tersendiri, dipilih lewat
+INVALIDATION_BACKEND:
+
+- postgres : LISTEN/NOTIFY, juga lintas host (bawaan untuk PostgreSQL)
+- unix     : datagram Unix di INVALIDATION_SOCKET_DIR, antar worker satu host
+- memory   : di dalam proses, untuk pengujian (bawaan selain PostgreSQL)
+
+Pengiriman berjalan di thread latar agar handler tidak menunggu transport;
+sebelum start() (mis. CLI) hanya hook lokal yang berjalan. Delay propagasi
+(waktu terima - sent_at, jam dinding) dicatat per worker.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from . import cache as caches
+from . import events
+from .database import engine
+
+CHANNEL = "cache_invalidation"
+# Jumlah delay terakhir untuk persentil
+RECENT_DELAYS = 1024
+
+
+class InvalidationBus:
+    def __init__(self, backend):
+        self.backend = backend
+        self.origin = uuid.uuid4().hex
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._sender: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+        self._delays = deque(maxlen=RECENT_DELAYS)
+        self._delay_max = 0.0
+
+    def start(self) -> None:
+        self.backend.start(self._on_message)
+        self.backend.subscribe(CHANNEL)
+        self._sender = threading.Thread(target=self._send_loop, name="invalidation-send", daemon=True)
+        self._sender.start()
+
+    def stop(self) -> None:
+        if self._sender is not None:
+            self._queue.put(None)
+            self._sender.join(timeout=2.0)
+            self._sender = None
+        self.backend.stop()
+
+    def publish(
+        self,
+        entity: str,
+        user_id: int,
+        entity_id: Optional[int] = None,
+        version: Optional[int] = None,
+        details: Optional[dict] = None,
+    ) -> None:
+        caches.invalidate(entity, user_id, entity_id, details=details)
+        with self._lock:
+            self.published += 1
+        if self._sender is None:
+            return
+        self._queue.put(json.dumps({
+            "entity": entity,
+            "user_id": user_id,
+            "id": entity_id,
+            "version": version,
+            "details": details,
+            "sent_at": time.time(),
+            "origin": self.origin,
+        }))
+
+    def _send_loop(self) -> None:
+        while True:
+            payload = self._queue.get()
+            if payload is None:
+                return
+            try:
+                self.backend.publish(CHANNEL, payload)
+            except Exception:
+                # Cache worker lain tetap dibatasi versi/TTL; jangan hentikan thread pengirim
+                with self._lock:
+                    self.errors += 1
+
+    def _on_message(self, channel: str, payload: str) -> None:
+        if channel != CHANNEL:
+            return
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        if event.get("origin") == self.origin:
+            return
+        delay = max(time.time() - event["sent_at"], 0.0)
+        with self._lock:
+            self.received += 1
+            self._delays.append(delay)
+            self._delay_max = max(self._delay_max, delay)
+        caches.invalidate(event["entity"], event["user_id"], event["id"], remote=True, details=event.get("details"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            delays = sorted(self._delays)
+            published, received, errors, delay_max = self.published, self.received, self.errors, self._delay_max
+
+        def percentile(q: float) -> Optional[float]:
+            if not delays:
+                return None
+            return delays[min(int(q * len(delays)), len(delays) - 1)] * 1000
+
+        return {
+            "backend": type(self.backend).__name__,
+            "published": published,
+            "received": received,
+            "errors": errors,
+            "delay_p50_ms": percentile(0.5),
+            "delay_p99_ms": percentile(0.99),
+            "delay_max_ms": delay_max * 1000 if delays else None,
+        }
+
+
+def _default_backend():
+    name = os.getenv("INVALIDATION_BACKEND") or ("postgres" if engine.dialect.name == "postgresql" else "memory")
+    if name == "postgres":
+        return events.PostgresNotifyBackend(engine)
+    if name == "unix":
+        return events.UnixSocketBackend(os.getenv("INVALIDATION_SOCKET_DIR", "/tmp/app-invalidation"))
+    return events.InMemoryBackend()
+
+
+bus = InvalidationBus(_default_backend())
+
+
+def publish(
+    entity: str,
+    user_id: int,
+    entity_id: Optional[int] = None,
+    version: Optional[int] = None,
+    details: Optional[dict] = None,
+) -> None:
+    bus.publish(entity, user_id, entity_id, version, details)
@@ -1,20 +1,49 @@
 # app/logging_service.py
 
+from typing import List, Tuple
+
 from .schemas import ActivityLogCreate, ActivityLogResponse
 from .models import ActivityLog
+from .rowcodec import Projection
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 
-def log_activity(db: Session, log: ActivityLogCreate, user_id: int) -> ActivityLogResponse:
-    activity_log = ActivityLog(
-        action=log.action,
-        user_id=user_id
-    )
-    db.add(activity_log)
-    db.commit()
-    db.refresh(activity_log)
+_logs = ActivityLog.__table__
+
+# Field ActivityLogResponse dalam urutan skema; SELECT dan encoder disusun sekali per kombinasi fields=
+RESPONSE_FIELDS = tuple(ActivityLogResponse.model_fields)
+PROJECTION = Projection(
+    _logs, RESPONSE_FIELDS,
+    lambda columns: (
+        select(*columns)
+        .where(_logs.c.user_id == bindparam("user_id"))
+        .order_by(_logs.c.timestamp.desc())
+        .offset(bindparam("skip"))
+        .limit(bindparam("limit"))
+    ),
+)
+
+def log_activity(db: Session, log: ActivityLogCreate, user_id: int, commit: bool = True) -> ActivityLogResponse:
+    """
+    Menyimpan log aktivitas dengan satu INSERT ... RETURNING. Gunakan
+    commit=False agar log ikut dalam transaksi penulisan milik pemanggil.
+    """
+    row = db.execute(
+        insert(_logs)
+        .values(action=log.action, user_id=user_id)
+        .returning(_logs.c.id, _logs.c.user_id, _logs.c.action, _logs.c.timestamp)
+    ).one()
+    if commit:
+        db.commit()
     return ActivityLogResponse(
-        id=activity_log.id,
-        user_id=activity_log.user_id,
-        action=activity_log.action,
-        timestamp=activity_log.timestamp
+        id=row.id,
+        user_id=row.user_id,
+        action=row.action,
+        timestamp=row.timestamp
     )
+
+def list_logs(db: Session, user_id: int, skip: int, limit: int, fields: Tuple[str, ...] = RESPONSE_FIELDS) -> List[Row]:
+    """Baris tuple (urutan `fields`), terbaru lebih dulu; encode dengan PROJECTION.encoder(fields)."""
+    stmt, _ = PROJECTION.get(fields)
+    return db.execute(stmt, {"user_id": user_id, "skip": skip, "limit": limit}).all()
@@ -1,57 +1,209 @@
 # app/main.py
 
 from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, status
-from . import models, schemas, auth
-from .database import engine
+from fastapi import FastAPI, Depends, HTTPException, status, Response, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from . import models, schemas, auth, columnar, stats_service, analytics, versioning, query_filters, search, sync_service, events, etags, entry_service, identifiers, provisioning, directory, envelopes, rowcodec, compression, negotiation, response_cache, singleflight, cache, shm_cache, invalidation
+from .database import engine, dialect_insert, SessionLocal
 from sqlalchemy.orm import Session
 from .dependencies import get_db
+from . import logging_service
 from .logging_service import log_activity
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 from datetime import timedelta
 import re  # Pastikan ini diimpor
+import asyncio
+import json
 
 # Membuat semua tabel (gunakan Alembic di produksi)
 models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="User Management API dengan Static Bearer Token dan JWT")
+# JSON atau MessagePack sesuai Accept/Content-Type (lihat app/negotiation.py)
+app.router.route_class = negotiation.NegotiatingRoute
+
+# Kompresi respons; ekspor kolumnar besar memakai level rendah (hemat CPU),
+# stream SSE tidak dikompresi
+app.add_middleware(
+    compression.CompressionMiddleware,
+    route_levels={
+        "/data_entries/export/columnar": 1,
+        "/data_entries/events": 0,
+    },
+)
+
+# Interval komentar heartbeat pada stream SSE (detik)
+EVENT_STREAM_HEARTBEAT_SECONDS = 15
+
+@app.on_event("startup")
+async def start_event_hub():
+    events.hub.start(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+async def stop_event_hub():
+    events.hub.stop()
+
+@app.on_event("startup")
+def start_invalidation_bus():
+    invalidation.bus.start()
+
+@app.on_event("shutdown")
+def stop_invalidation_bus():
+    invalidation.bus.stop()
+
+@app.on_event("startup")
+def load_identifier_filter():
+    db = SessionLocal()
+    try:
+        identifiers.load(db)
+    finally:
+        db.close()
+
+REGISTER_CONFLICT_ERRORS = {
+    "username": "Username sudah digunakan",
+    "email": "Email sudah digunakan",
+}
+
+# Proyeksi field UserResponse untuk parameter fields= pada /users/me/
+USER_PROJECTION = rowcodec.Projection(models.User.__table__, schemas.UserResponse.model_fields)
+
+# Bacaan identik yang berjalan bersamaan berbagi satu query dan hasil encode-nya
+READ_FLIGHT = singleflight.create("read_data_entries")
+ANALYTICS_FLIGHT = singleflight.create_async("read_data_entry_analytics")
 
 # Endpoint untuk registrasi pengguna baru
-@app.post("/register", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@app.post("/register", response_model=schemas.ResponseModel[schemas.UserResponse], dependencies=[Depends(auth.verify_static_token)])
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    # Cek apakah username atau email sudah ada
-    existing_user = db.query(models.User).filter(
-        (models.User.username == user.username) | (models.User.email == user.email)
-    ).first()
-    if existing_user:
-        return schemas.ResponseModel(success=False, error="Username atau email sudah digunakan")
-    
+    # Permintaan yang jelas duplikat ditolak sebelum hashing bcrypt yang mahal;
+    # probe database hanya dilakukan jika identifier baru saja terlihat terpakai
+    if identifiers.maybe_taken(user.username, user.email):
+        conflict = identifiers.find_conflict(db, user.username, user.email)
+        if conflict:
+            return envelopes.fail(REGISTER_CONFLICT_ERRORS[conflict])
+
     hashed_password = auth.pwd_context.hash(user.password)
-    db_user = models.User(
-        name=user.name,
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password,
-        role=user.role,
-        disease=user.disease,
-        date_of_birth=user.date_of_birth,
-        place_of_birth=user.place_of_birth
-    )
-    try:
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
-    except IntegrityError as e:
+
+    # Satu INSERT ... ON CONFLICT DO NOTHING RETURNING; keunikan dijaga constraint
+    users = models.User.__table__
+    db_user = db.execute(
+        dialect_insert(db.get_bind(), users)
+        .values(
+            name=user.name,
+            username=user.username,
+            email=user.email,
+            hashed_password=hashed_password,
+            role=user.role,
+            disease=user.disease,
+            date_of_birth=user.date_of_birth,
+            place_of_birth=user.place_of_birth
+        )
+        .on_conflict_do_nothing()
+        .returning(*[users.c[name] for name in schemas.UserResponse.model_fields])
+    ).first()
+    identifiers.remember_taken(user.username, user.email)
+    if db_user is None:
         db.rollback()
-        return schemas.ResponseModel(success=False, error="Username atau email sudah digunakan")
-    
+        conflict = identifiers.find_conflict(db, user.username, user.email) or "username"
+        return envelopes.fail(REGISTER_CONFLICT_ERRORS[conflict])
+
+    directory.record_users_created(db, [db_user._mapping])
+
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"User {db_user.email} telah mendaftar."
     )
-    log_activity(db, activity_log, db_user.id)
+    log_activity(db, activity_log, db_user.id, commit=False)
+    db.commit()
+    # Filter identifier di worker lain langsung tahu identifier baru ini
+    invalidation.publish(cache.USER, db_user.id, db_user.id, details={"username": db_user.username, "email": db_user.email})
+
+    return envelopes.USER.ok(schemas.UserResponse.from_orm(db_user))
+
+# Endpoint untuk mengecek ketersediaan username/email (dipakai form pendaftaran)
+@app.get("/users/availability", response_model=schemas.ResponseModel[schemas.AvailabilityResponse], dependencies=[Depends(auth.verify_static_token)])
+def check_identifier_availability(
+    username: Optional[str] = None,
+    email: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    if not username and not email:
+        return envelopes.fail("Username atau email harus diisi")
+    identifiers.identifier_filter.refresh_if_due(db)
+
+    # Bloom filter menjawab "pasti tersedia" tanpa database; hanya kemungkinan
+    # terpakai yang dicek dengan probe berindeks
+    result = schemas.AvailabilityResponse()
+    if username:
+        result.username_available = not (
+            identifiers.username_maybe_taken(username) and identifiers.username_exists(db, username)
+        )
+    if email:
+        result.email_available = not (
+            identifiers.email_maybe_taken(email) and identifiers.email_exists(db, email)
+        )
+    return envelopes.AVAILABILITY.ok(result)
+
+# Endpoint provisioning pengguna massal (admin) - JSON (daftar UserCreate) atau CSV
+@app.post("/admin/users/bulk", response_model=schemas.ResponseModel[schemas.BulkProvisionResponse])
+async def bulk_provision_users(
+    request: Request,
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(auth.get_current_admin)
+):
+    try:
+        records = provisioning.parse_records(await request.body(), request.headers.get("content-type", "application/json"))
+    except (ValueError, UnicodeDecodeError) as exc:
+        return envelopes.fail(f"Berkas tidak dapat dibaca: {exc}")
+    if not records:
+        return envelopes.fail("Daftar pengguna kosong")
+
+    # Hashing dan INSERT berjalan di threadpool agar event loop tidak terblokir
+    result = await run_in_threadpool(provisioning.provision_users, db, records, admin)
+    return envelopes.BULK_PROVISION.ok(result)
 
-    return schemas.ResponseModel(success=True, data=schemas.UserResponse.from_orm(db_user))
+# Endpoint direktori pengguna (admin) - keyset per id, prefix nama/username/email
+@app.get("/admin/users", response_model=schemas.ResponseModel[schemas.UserDirectoryResponse])
+def list_users(
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    q: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(auth.get_current_admin)
+):
+    result = directory.list_users(db, after_id=after_id, limit=limit, q=q)
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action=f"Admin {admin.email} melihat direktori pengguna."
+    )
+    log_activity(db, activity_log, admin.id)
+
+    return envelopes.USER_DIRECTORY.ok(result)
+
+# Endpoint jumlah pengguna per role dan disease (dari penghitung inkremental)
+@app.get("/admin/users/aggregates", response_model=schemas.ResponseModel[schemas.UserAggregatesResponse])
+def read_user_aggregates(
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(auth.get_current_admin)
+):
+    result = directory.get_group_counts(db)
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action=f"Admin {admin.email} melihat agregat pengguna."
+    )
+    log_activity(db, activity_log, admin.id)
+
+    return envelopes.USER_AGGREGATES.ok(result)
+
+# Endpoint metrik cache di dalam proses dan bus invalidasi per worker (admin)
+@app.get("/admin/metrics", response_model=schemas.ResponseModel[schemas.MetricsResponse])
+def read_metrics(admin: models.User = Depends(auth.get_current_admin)):
+    return envelopes.METRICS.ok(schemas.MetricsResponse(
+        caches=cache.all_stats(), invalidation=invalidation.bus.stats(), single_flight=singleflight.all_stats(),
+    ))
 
 # Endpoint untuk login - Mengembalikan JWT token dan profil pengguna
 @app.post("/login", response_model=schemas.TokenResponse, dependencies=[Depends(auth.verify_static_token)])
@@ -90,76 +242,301 @@ def login_for_access_token(form_data: schemas.LoginRequest, db: Session = Depend
     return schemas.TokenResponse(success=True, data=response_data)
 
 # Endpoint yang dilindungi menggunakan JWT
-@app.get("/users/me/", response_model=schemas.ResponseModel)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
-    user_data = schemas.UserResponse.from_orm(current_user)
-    return schemas.ResponseModel(success=True, data=user_data)
+@app.get("/users/me/", response_model=schemas.ResponseModel[schemas.UserResponse])
+def read_users_me(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Daftar field yang dikembalikan, dipisah koma, misalnya id,role"),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    try:
+        selected = USER_PROJECTION.parse(fields)
+    except ValueError as e:
+        return envelopes.fail(str(e))
+    etag_fields = selected if fields else None
+    etag = etags.user_etag(current_user.id, current_user.version, etag_fields)
+    if etags.matches_if_none_match(request, etag):
+        return etags.not_modified(etag)
+
+    # Bytes respons di-cache per versi profil
+    group = (current_user.id, response_cache.USER, current_user.id)
+    variant = response_cache.variant(etag_fields)
+    cached = response_cache.get(group, variant, current_user.version)
+    if cached is None:
+        # Worker lain mungkin sudah meng-encode versi profil yang sama
+        cached = shm_cache.get_response(current_user.id, variant, current_user.version)
+        if cached is None:
+            user_data = [getattr(current_user, name) for name in selected]
+            response = envelopes.ok_row(USER_PROJECTION, selected, user_data)
+            cached = response_cache.CachedResponse(current_user.version, etag, response.body, response.media_type)
+            shm_cache.put_response(current_user.id, variant, cached)
+        response_cache.put(group, variant, cached)
+    return response_cache.as_response(cached)
 
 # Endpoint untuk membuat data entry baru
-@app.post("/data_entries/", response_model=schemas.ResponseModel)
+@app.post("/data_entries/", response_model=schemas.ResponseModel[schemas.DataEntryResponse])
 def create_data_entry(
     data_entry: schemas.DataEntryCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    new_data_entry = models.DataEntry(
-        string_field1=data_entry.string_field1,
-        string_field2=data_entry.string_field2,
-        string_field3=data_entry.string_field3,
-        int_field1=data_entry.int_field1,
-        int_field2=data_entry.int_field2,
-        int_field3=data_entry.int_field3,
-        int_field4=data_entry.int_field4,
-        int_field5=data_entry.int_field5,
-        int_field6=data_entry.int_field6,
-        int_field7=data_entry.int_field7,
-        int_field8=data_entry.int_field8,
-        owner_id=current_user.id
-    )
-    db.add(new_data_entry)
-    db.commit()
-    db.refresh(new_data_entry)
+    change_seq = versioning.bump_data_version(db, current_user.id)
+    new_data_entry = entry_service.create_entry(db, current_user.id, data_entry.dict(), change_seq)
+    stats_service.record_insert(db, current_user.id, data_entry.dict())
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"Created data entry with ID {new_data_entry.id}"
     )
-    log_activity(db, activity_log, current_user.id)
+    log_activity(db, activity_log, current_user.id, commit=False)
+    db.commit()
+
+    invalidation.publish(cache.DATA_ENTRY, new_data_entry.owner_id, new_data_entry.id, new_data_entry.version)
+
+    entry_response = schemas.DataEntryResponse.from_orm(new_data_entry)
+    search.on_entry_saved(db, new_data_entry)
+    events.hub.publish(new_data_entry.owner_id, "created", change_seq, new_data_entry.id)
 
-    return schemas.ResponseModel(success=True, data=schemas.DataEntryResponse.from_orm(new_data_entry))
+    return envelopes.DATA_ENTRY.ok(entry_response)
 
 # Endpoint untuk mendapatkan semua data entry pengguna saat ini
-@app.get("/data_entries/", response_model=schemas.ResponseModel)
+@app.get("/data_entries/", response_model=schemas.ResponseModel[List[schemas.DataEntryResponse]])
 def read_data_entries(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    filters: List[str] = Query([], alias="filter", description="Filter field:op:nilai, misalnya int_field1:gte:10"),
+    sort: Optional[str] = Query(None, description="Kolom pengurutan, awali dengan - untuk menurun"),
+    fields: Optional[str] = Query(None, description="Daftar field yang dikembalikan, dipisah koma, misalnya id,int_field1"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    try:
+        selected = entry_service.LIST_PROJECTION.parse(fields)
+    except ValueError as e:
+        return envelopes.fail(str(e))
+
+    # Jika data pengguna tidak berubah, jawab 304 tanpa menyentuh tabel data_entries
+    etag = etags.list_etag("del", current_user.id, current_user.data_version, skip, limit, filters, sort, selected)
+    if etags.matches_if_none_match(request, etag):
+        return etags.not_modified(etag)
+
+    def render():
+        data_entries = entry_service.list_entries(db, current_user.id, skip, limit, filters, sort, selected)
+        # Baris tuple di-encode langsung tanpa instance ORM maupun model pydantic
+        response = envelopes.ok_rows(entry_service.LIST_PROJECTION, selected, data_entries)
+        return len(data_entries), response.body, response.media_type
+
+    # Permintaan identik yang bersamaan (versi data sama) berbagi query dan body
+    key = singleflight.make_key(
+        current_user.id, "read_data_entries",
+        data_version=current_user.data_version, skip=skip, limit=limit, filters=filters,
+        sort=sort, fields=selected, format=negotiation.response_format.get(),
+    )
+    try:
+        (count, body, media_type), _ = READ_FLIGHT.do(key, render)
+    except ValueError as e:
+        # Filter/pengurutan di luar whitelist atau tidak bisa dilayani indeks
+        return envelopes.fail(str(e))
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action=f"Retrieved {count} data entries."
+    )
+    log_activity(db, activity_log, current_user.id)
+
+    return Response(body, media_type=media_type, headers={"ETag": etag})
+
+# Endpoint untuk ekspor kolumnar (biner) data entry pengguna saat ini
+@app.get("/data_entries/export/columnar", response_class=Response)
+def export_data_entries_columnar(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    row_count, payload = columnar.export_data_entries(db, current_user.id)
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action=f"Exported {row_count} data entries (columnar)."
+    )
+    log_activity(db, activity_log, current_user.id)
+
+    return Response(
+        content=payload,
+        media_type=columnar.MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="data_entries.decf"'}
+    )
+
+# Endpoint untuk statistik agregat data entry pengguna saat ini
+@app.get("/data_entries/stats", response_model=schemas.ResponseModel[schemas.DataEntryStatsResponse])
+def read_data_entry_stats(
+    top_field: str = "int_field1",
+    top_k: int = 10,
+    descending: bool = True,
+    recompute: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if top_field not in models.DATA_ENTRY_INT_FIELDS:
+        return envelopes.fail(f"Field {top_field} tidak valid untuk top-K")
+    if top_k < 0 or top_k > 1000:
+        return envelopes.fail("top_k harus antara 0 dan 1000")
+
+    stats = stats_service.get_stats(
+        db, current_user.id,
+        top_field=top_field,
+        top_k=top_k,
+        descending=descending,
+        force_recompute=recompute
+    )
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action="Retrieved data entry statistics."
+    )
+    log_activity(db, activity_log, current_user.id)
+
+    return envelopes.DATA_ENTRY_STATS.ok(stats)
+
+# Endpoint untuk analitik lintas field (kovarians, korelasi, kuantil)
+@app.get("/data_entries/analytics", response_model=schemas.ResponseModel[schemas.DataEntryAnalyticsResponse])
+async def read_data_entry_analytics(
+    quantiles: List[float] = Query(list(analytics.DEFAULT_QUANTILES)),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if not quantiles or any(q < 0 or q > 1 for q in quantiles):
+        return envelopes.fail("Kuantil harus berada di antara 0 dan 1")
+
+    # Permintaan identik yang bersamaan berbagi satu agregasi; query berjalan di
+    # threadpool dan penunggu tidak memblokir event loop
+    key = singleflight.make_key(
+        current_user.id, "read_data_entry_analytics",
+        data_version=current_user.data_version, quantiles=tuple(quantiles),
+    )
+    result, _ = await ANALYTICS_FLIGHT.do(key, lambda: run_in_threadpool(
+        analytics.get_analytics, db, current_user.id, current_user.data_version, quantiles
+    ))
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action="Retrieved data entry analytics."
+    )
+    await run_in_threadpool(log_activity, db, activity_log, current_user.id)
+
+    return envelopes.DATA_ENTRY_ANALYTICS.ok(result)
+
+# Endpoint untuk pencarian teks pada string_field1..3
+@app.get("/data_entries/search", response_model=schemas.ResponseModel[schemas.DataEntrySearchResponse])
+def search_data_entries(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    data_entries = db.query(models.DataEntry).filter(models.DataEntry.owner_id == current_user.id).offset(skip).limit(limit).all()
+    try:
+        hits, next_cursor = search.search_entries(db, current_user.id, q, limit=limit, cursor=cursor)
+    except ValueError as e:
+        return envelopes.fail(str(e))
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
-        action=f"Retrieved {len(data_entries)} data entries."
+        action=f"Searched data entries, {len(hits)} results."
     )
     log_activity(db, activity_log, current_user.id)
 
-    data_response = [schemas.DataEntryResponse.from_orm(entry) for entry in data_entries]
-    return schemas.ResponseModel(success=True, data=data_response)
+    items = [
+        schemas.SearchHit(score=rank / 1000, entry=schemas.DataEntryResponse.from_orm(entry))
+        for rank, entry in hits
+    ]
+    return envelopes.DATA_ENTRY_SEARCH.ok(schemas.DataEntrySearchResponse(items=items, next_cursor=next_cursor))
+
+# Endpoint untuk sinkronisasi delta: hanya perubahan setelah kursor
+@app.get("/data_entries/changes", response_model=schemas.ResponseModel[schemas.DataEntryChangesResponse])
+def read_data_entry_changes(
+    cursor: str = Query("0", description="next_cursor dari respons sebelumnya, 0 untuk sinkronisasi penuh"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    try:
+        changes = sync_service.get_changes(db, current_user.id, cursor, limit)
+    except ValueError as e:
+        return envelopes.fail(str(e))
+
+    # Log aktivitas
+    activity_log = schemas.ActivityLogCreate(
+        action=f"Synced {len(changes.upserts)} changed and {len(changes.deletes)} deleted data entries."
+    )
+    log_activity(db, activity_log, current_user.id)
+
+    return envelopes.DATA_ENTRY_CHANGES.ok(changes)
+
+# Endpoint stream (Server-Sent Events) untuk perubahan data entry pengguna saat ini
+@app.get("/data_entries/events")
+async def stream_data_entry_events(
+    request: Request,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    user_id = current_user.id
+
+    async def event_stream():
+        queue = events.hub.subscribe(user_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                event_type = json.loads(payload)["type"]
+                yield f"event: {event_type}\ndata: {payload}\n\n"
+        finally:
+            events.hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Endpoint untuk mendapatkan data entry spesifik
-@app.get("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel)
+@app.get("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel[schemas.DataEntryResponse])
 def read_data_entry(
     data_entry_id: int,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Daftar field yang dikembalikan, dipisah koma, misalnya id,int_field1"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    data_entry = db.query(models.DataEntry).filter(
-        models.DataEntry.id == data_entry_id,
-        models.DataEntry.owner_id == current_user.id
-    ).first()
-    if data_entry is None:
-        return schemas.ResponseModel(success=False, error="Data entry tidak ditemukan")
+    try:
+        selected = entry_service.ITEM_PROJECTION.parse(fields)
+    except ValueError as e:
+        return envelopes.fail(str(e))
+
+    etag_fields = selected if fields else None
+
+    # Hit valid selama users.data_version (dimuat saat autentikasi, dibaca
+    # sebelum commit log aktivitas) sama: tanpa SELECT entry dan serializer
+    group = (current_user.id, response_cache.DATA_ENTRY, data_entry_id)
+    variant = response_cache.variant(etag_fields)
+    data_version = current_user.data_version
+    cached = response_cache.get(group, variant, data_version)
+    if cached is not None:
+        etag = cached.etag
+        response = response_cache.as_response(cached)
+    else:
+        # Satu SELECT kolom yang diminta + version; 304 diputuskan dari version
+        data_entry = entry_service.get_entry(db, current_user.id, data_entry_id, selected)
+        if data_entry is None:
+            return envelopes.fail("Data entry tidak ditemukan")
+        etag = etags.entry_etag(data_entry_id, data_entry[-1], etag_fields)
+        response = None
+    if etags.matches_if_none_match(request, etag):
+        return etags.not_modified(etag)
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -167,84 +544,120 @@ def read_data_entry(
     )
     log_activity(db, activity_log, current_user.id)
 
-    return schemas.ResponseModel(success=True, data=schemas.DataEntryResponse.from_orm(data_entry))
+    if response is None:
+        response = envelopes.ok_row(entry_service.ITEM_PROJECTION, selected, data_entry, headers={"ETag": etag})
+        response_cache.put(group, variant, response_cache.CachedResponse(
+            data_version, etag, response.body, response.media_type
+        ))
+    return response
 
 # Endpoint untuk memperbarui data entry
-@app.put("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel)
+@app.put("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel[schemas.DataEntryResponse])
 def update_data_entry(
     data_entry_id: int,
     data_entry: schemas.DataEntryUpdate,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    db_data_entry = db.query(models.DataEntry).filter(
-        models.DataEntry.id == data_entry_id,
-        models.DataEntry.owner_id == current_user.id
-    ).first()
-    if db_data_entry is None:
-        return schemas.ResponseModel(success=False, error="Data entry tidak ditemukan")
-    
-    # Update field jika diberikan
-    for field, value in data_entry.dict(exclude_unset=True).items():
-        setattr(db_data_entry, field, value)
-    
-    db.commit()
-    db.refresh(db_data_entry)
+    # If-Match berisi ETag dari GET; tanpa header, update tidak bersyarat
+    if_match = request.headers.get("if-match")
+    expected_versions = etags.parse_if_match(if_match, data_entry_id) if if_match else None
+
+    change_seq = versioning.bump_data_version(db, current_user.id)
+    result = entry_service.update_entry(
+        db, current_user.id, data_entry_id,
+        data_entry.dict(exclude_unset=True),
+        change_seq,
+        expected_versions
+    )
+    if result is None:
+        db.rollback()
+        version = entry_service.current_version(db, current_user.id, data_entry_id)
+        if version is None:
+            return envelopes.fail("Data entry tidak ditemukan")
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Data entry telah diubah oleh permintaan lain",
+            headers={"ETag": etags.entry_etag(data_entry_id, version)},
+        )
+    updated_entry, old_values = result
+
+    new_values = {field: getattr(updated_entry, field) for field in models.DATA_ENTRY_INT_FIELDS}
+    stats_service.record_update(db, current_user.id, old_values, new_values)
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"Updated data entry with ID {data_entry_id}"
     )
-    log_activity(db, activity_log, current_user.id)
+    log_activity(db, activity_log, current_user.id, commit=False)
+    db.commit()
 
-    return schemas.ResponseModel(success=True, data=schemas.DataEntryResponse.from_orm(db_data_entry))
+    invalidation.publish(cache.DATA_ENTRY, updated_entry.owner_id, data_entry_id, updated_entry.version)
+
+    entry_response = schemas.DataEntryResponse.from_orm(updated_entry)
+    search.on_entry_saved(db, updated_entry)
+    events.hub.publish(updated_entry.owner_id, "updated", change_seq, data_entry_id)
+
+    return envelopes.DATA_ENTRY.ok(
+        entry_response,
+        headers={"ETag": etags.entry_etag(updated_entry.id, updated_entry.version)}
+    )
 
 # Endpoint untuk menghapus data entry
-@app.delete("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel, status_code=status.HTTP_200_OK)
+@app.delete("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel[None], status_code=status.HTTP_200_OK)
 def delete_data_entry(
     data_entry_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    db_data_entry = db.query(models.DataEntry).filter(
-        models.DataEntry.id == data_entry_id,
-        models.DataEntry.owner_id == current_user.id
-    ).first()
-    if db_data_entry is None:
-        return schemas.ResponseModel(success=False, error="Data entry tidak ditemukan")
-    db.delete(db_data_entry)
-    db.commit()
+    change_seq = versioning.bump_data_version(db, current_user.id)
+    deleted_entry = entry_service.delete_entry(db, current_user.id, data_entry_id, change_seq)
+    if deleted_entry is None:
+        db.rollback()
+        return envelopes.fail("Data entry tidak ditemukan")
+    stats_service.record_delete(
+        db, current_user.id,
+        {field: getattr(deleted_entry, field) for field in models.DATA_ENTRY_INT_FIELDS}
+    )
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"Deleted data entry with ID {data_entry_id}"
     )
-    log_activity(db, activity_log, current_user.id)
+    log_activity(db, activity_log, current_user.id, commit=False)
+    db.commit()
+
+    invalidation.publish(cache.DATA_ENTRY, deleted_entry.owner_id, data_entry_id)
+    search.on_entry_deleted(db, deleted_entry.owner_id, data_entry_id)
+    events.hub.publish(deleted_entry.owner_id, "deleted", change_seq, data_entry_id)
 
-    return schemas.ResponseModel(success=True, data=None)
+    return envelopes.EMPTY.ok(None)
 
 # Endpoint untuk membuat log aktivitas (opsional, jika ingin membuat log secara manual)
-@app.post("/logs/", response_model=schemas.ResponseModel)
+@app.post("/logs/", response_model=schemas.ResponseModel[schemas.ActivityLogResponse])
 def create_activity_log(
     log: schemas.ActivityLogCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     created_log = log_activity(db, log, current_user.id)
-    return schemas.ResponseModel(success=True, data=schemas.ActivityLogResponse.from_orm(created_log))
+    return envelopes.ACTIVITY_LOG.ok(schemas.ActivityLogResponse.from_orm(created_log))
 
 # Endpoint untuk membaca log aktivitas pengguna
-@app.get("/logs/", response_model=schemas.ResponseModel)
+@app.get("/logs/", response_model=schemas.ResponseModel[List[schemas.ActivityLogResponse]])
 def read_activity_logs(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[str] = Query(None, description="Daftar field yang dikembalikan, dipisah koma, misalnya id,action"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    logs = db.query(models.ActivityLog)\
-             .filter(models.ActivityLog.user_id == current_user.id)\
-             .order_by(models.ActivityLog.timestamp.desc())\
-             .offset(skip).limit(limit).all()
+    try:
+        selected = logging_service.PROJECTION.parse(fields)
+    except ValueError as e:
+        return envelopes.fail(str(e))
+    logs = logging_service.list_logs(db, current_user.id, skip, limit, selected)
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -252,47 +665,52 @@ def read_activity_logs(
     )
     log_activity(db, activity_log, current_user.id)
 
-    logs_response = [schemas.ActivityLogResponse.from_orm(log) for log in logs]
-    return schemas.ResponseModel(success=True, data=logs_response)
+    return envelopes.ok_rows(logging_service.PROJECTION, selected, logs)
 
 # Endpoint untuk mengedit profil pengguna
-@app.put("/users/me/profile", response_model=schemas.ResponseModel)
+@app.put("/users/me/profile", response_model=schemas.ResponseModel[schemas.UserResponse])
 def update_user_profile(
     profile_update: schemas.UserProfileUpdate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    user = db.query(models.User).filter(models.User.id == current_user.id).first()
-    if not user:
-        return schemas.ResponseModel(success=False, error="Pengguna tidak ditemukan")
-    
-    # Cek apakah email baru sudah digunakan oleh pengguna lain
-    if profile_update.email and profile_update.email != user.email:
-        existing_email_user = db.query(models.User).filter(models.User.email == profile_update.email).first()
-        if existing_email_user:
-            return schemas.ResponseModel(success=False, error="Email sudah digunakan oleh pengguna lain")
-    
     # Perbarui field yang diberikan
     update_data = profile_update.dict(exclude_unset=True)
     if 'password' in update_data:
         hashed_password = auth.pwd_context.hash(update_data['password'])
         update_data['hashed_password'] = hashed_password
         del update_data['password']  # Hapus password plain setelah hashing
-    
-    for key, value in update_data.items():
-        setattr(user, key, value)
-    
+
+    old_groups = {dimension: getattr(current_user, dimension) for dimension in directory.GROUP_DIMENSIONS}
+
+    # Satu UPDATE ... RETURNING; keunikan email dijaga oleh constraint unik
+    users = models.User.__table__
     try:
-        db.commit()
-        db.refresh(user)
+        user = db.execute(
+            update(users)
+            .where(users.c.id == current_user.id)
+            .values(**update_data, version=users.c.version + 1)
+            .returning(*[users.c[name] for name in schemas.UserResponse.model_fields], users.c.version)
+        ).first()
     except IntegrityError as e:
         db.rollback()
-        return schemas.ResponseModel(success=False, error="Terjadi kesalahan saat memperbarui profil")
-    
+        return envelopes.fail("Email sudah digunakan oleh pengguna lain")
+    if user is None:
+        db.rollback()
+        return envelopes.fail("Pengguna tidak ditemukan")
+    if any(dimension in update_data for dimension in directory.GROUP_DIMENSIONS):
+        directory.record_user_updated(db, old_groups, user._mapping)
+
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"User {user.email} telah memperbarui profilnya."
     )
-    log_activity(db, activity_log, user.id)
-    
-    return schemas.ResponseModel(success=True, data=schemas.UserResponse.from_orm(user))
+    log_activity(db, activity_log, user.id, commit=False)
+    db.commit()
+    details = None
+    if 'email' in update_data:
+        identifiers.remember_taken(email=user.email)
+        details = {"email": user.email}
+    invalidation.publish(cache.USER, user.id, user.id, user.version, details)
+
+    return envelopes.USER.ok(schemas.UserResponse.from_orm(user))
@@ -0,0 +1,288 @@
+# app/migrations.py
+
+"""
+Migrasi sederhana untuk database yang sudah ada (create_all tidak menambah
+kolom atau indeks ke tabel yang sudah dibuat). Semua langkah idempoten dan
+boleh dijalankan ulang saat aplikasi melayani permintaan:
+
+- Setiap langkah berjalan dalam transaksinya sendiri, jadi lock baris dan
+  tabel hanya dipegang selama langkah itu.
+- Indeks dibuat/dihapus dengan CONCURRENTLY di luar transaksi (autocommit),
+  tanpa menahan penulisan. Pembuatan yang gagal meninggalkan indeks INVALID
+  yang dibuang lalu dibuat ulang pada percobaan berikutnya.
+- Pengisian user_group_counts mengunci users (SHARE) sebentar, hanya jika
+  tabel penghitung masih kosong.
+
+STEPS hanya untuk PostgreSQL (ALTER ... IF NOT EXISTS, CONCURRENTLY,
+gin_trgm_ops, text_pattern_ops, pg_indexes, DO, LOCK TABLE); database SQLite
+cukup dibuat dengan create_all.
+
+Jalankan dengan: python -m app.migrations
+"""
+
+from typing import List, NamedTuple, Tuple, Union
+
+from sqlalchemy import text
+
+from .database import engine
+from .models import Base, DATA_ENTRY_INT_FIELDS, DATA_ENTRY_STRING_FIELDS, STRING_INDEX_PREFIX
+
+
+class Concurrently(NamedTuple):
+    """
+    Pernyataan CREATE/DROP INDEX CONCURRENTLY: dijalankan dengan autocommit di
+    luar transaksi langkah, dan dilewati jika salah satu query `unless`
+    mengembalikan baris.
+    """
+    sql: str
+    unless: Tuple[str, ...] = ()
+
+
+Statement = Union[str, Concurrently]
+
+
+def _create_index(name: str, definition: str, unique: bool = False, unless: Tuple[str, ...] = ()) -> List[Concurrently]:
+    """
+    CREATE INDEX CONCURRENTLY yang aman diulang. IF NOT EXISTS juga melewati
+    indeks INVALID sisa pembuatan yang gagal (mis. duplikat masuk selama
+    pembuatan indeks unik), jadi indeks seperti itu dibuang lebih dulu.
+    """
+    no_invalid_index = (
+        "SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        f"WHERE c.relname = '{name}' AND NOT i.indisvalid)"
+    )
+    return [
+        Concurrently(f"DROP INDEX CONCURRENTLY IF EXISTS {name}", unless + (no_invalid_index,)),
+        Concurrently(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}", unless
+        ),
+    ]
+
+
+def _merge_duplicate_users(key: str) -> List[str]:
+    """
+    Menggabungkan pengguna yang identifier-nya sama setelah normalisasi ke
+    pengguna dengan id terkecil: data entry, tombstone dan log dipindahkan,
+    ringkasan statistik dihapus (dihitung ulang saat dibaca berikutnya).
+    Hanya dipakai untuk email: email yang sama berarti orang yang sama.
+    """
+    return [
+        "DROP TABLE IF EXISTS user_merge",
+        "CREATE TEMP TABLE user_merge AS "
+        "SELECT id AS duplicate_id, keep_id FROM "
+        f"(SELECT id, min(id) OVER (PARTITION BY {key}) AS keep_id FROM users) ranked "
+        "WHERE id <> keep_id",
+        "DELETE FROM data_entry_field_stats WHERE user_id IN "
+        "(SELECT duplicate_id FROM user_merge UNION SELECT keep_id FROM user_merge)",
+        "DELETE FROM data_entry_histogram_bins WHERE user_id IN "
+        "(SELECT duplicate_id FROM user_merge UNION SELECT keep_id FROM user_merge)",
+        # Entry yang dipindahkan mendapat change_seq baru agar ikut tersinkron ke klien
+        "UPDATE users SET data_version = data_version + 1 WHERE id IN (SELECT keep_id FROM user_merge)",
+        "UPDATE data_entries SET owner_id = m.keep_id, change_seq = u.data_version "
+        "FROM user_merge m JOIN users u ON u.id = m.keep_id WHERE data_entries.owner_id = m.duplicate_id",
+        "UPDATE data_entry_tombstones SET owner_id = m.keep_id, change_seq = u.data_version "
+        "FROM user_merge m JOIN users u ON u.id = m.keep_id WHERE data_entry_tombstones.owner_id = m.duplicate_id",
+        "UPDATE activity_logs SET user_id = m.keep_id "
+        "FROM user_merge m WHERE activity_logs.user_id = m.duplicate_id",
+        "DELETE FROM users WHERE id IN (SELECT duplicate_id FROM user_merge)",
+        "DROP TABLE user_merge",
+    ]
+
+
+def _rename_duplicate_usernames() -> List[str]:
+    """
+    Username yang hanya berbeda huruf besar/kecil (setelah email digabung,
+    emailnya pasti berbeda) kemungkinan milik orang yang berbeda, jadi tidak
+    digabung. Semua kecuali id terkecil diganti menjadi `username-id` (atau
+    `username-id-2`, `-3`, ... jika nama itu sudah dipakai pengguna lain) dan
+    dilaporkan untuk diselesaikan manual; pemiliknya tetap bisa login dengan
+    email.
+    """
+    return [
+        "DROP TABLE IF EXISTS username_conflicts",
+        "CREATE TEMP TABLE username_conflicts AS "
+        "WITH RECURSIVE ranked AS ("
+        "SELECT id, username, min(id) OVER (PARTITION BY lower(trim(username))) AS keep_id FROM users"
+        "), candidates (id, old_username, base, attempt, candidate) AS ("
+        "SELECT id, username, lower(trim(username)) || '-' || id, 1, lower(trim(username)) || '-' || id "
+        "FROM ranked WHERE id <> keep_id "
+        "UNION ALL "
+        "SELECT id, old_username, base, attempt + 1, base || '-' || (attempt + 1) FROM candidates "
+        "WHERE EXISTS (SELECT 1 FROM users u WHERE lower(trim(u.username)) = candidates.candidate)"
+        ") "
+        "SELECT id, old_username, candidate AS new_username FROM candidates "
+        "WHERE NOT EXISTS (SELECT 1 FROM users u WHERE lower(trim(u.username)) = candidates.candidate)",
+        "UPDATE users SET username = c.new_username, version = version + 1 "
+        "FROM username_conflicts c WHERE users.id = c.id",
+        # Baris hasil dicetak oleh run_migrations
+        "SELECT 'Username ganda diganti (perlu penyelesaian manual): pengguna ' || id || ' ' "
+        "|| old_username || ' -> ' || new_username FROM username_conflicts ORDER BY id",
+        "DROP TABLE username_conflicts",
+    ]
+
+
+def _text_pattern_index_exists(name: str) -> str:
+    return f"SELECT 1 FROM pg_indexes WHERE indexname = '{name}' AND indexdef LIKE '%text_pattern_ops%'"
+
+
+STEPS: List[Tuple[str, List[Statement]]] = [
+    (
+        "data_entries_owner_int_field_indexes",
+        [
+            statement
+            for field in DATA_ENTRY_INT_FIELDS
+            for statement in _create_index(f"ix_data_entries_owner_{field}", f"data_entries (owner_id, {field})")
+        ],
+    ),
+    (
+        "users_data_version",
+        ["ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0"],
+    ),
+    (
+        "data_entries_owner_string_field_indexes",
+        [
+            statement
+            for field in DATA_ENTRY_STRING_FIELDS
+            for statement in (
+                # Indeks kolom penuh menolak nilai di atas ~2,7 kB; diganti indeks awalan
+                Concurrently(f"DROP INDEX CONCURRENTLY IF EXISTS ix_data_entries_owner_{field}"),
+                *_create_index(
+                    f"ix_data_entries_owner_{field}_prefix",
+                    f"data_entries (owner_id, substr({field}, 1, {STRING_INDEX_PREFIX}) text_pattern_ops)",
+                ),
+            )
+        ],
+    ),
+    (
+        "data_entries_search_trigram_index",
+        [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE EXTENSION IF NOT EXISTS btree_gin",
+            # Ekspresi harus sama dengan search._document_expression()
+            *_create_index(
+                "ix_data_entries_search_trgm",
+                "data_entries USING gin "
+                "(owner_id, (lower(string_field1 || ' ' || string_field2 || ' ' || string_field3)) gin_trgm_ops)",
+            ),
+        ],
+    ),
+    (
+        "data_entries_change_tracking",
+        [
+            "ALTER TABLE data_entries ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT now()",
+            "ALTER TABLE data_entries ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now()",
+            "ALTER TABLE data_entries ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0",
+            # Baris lama mendapat urutan 1 agar ikut terkirim ke klien dengan kursor 0
+            "UPDATE data_entries SET change_seq = 1 WHERE change_seq = 0",
+            "UPDATE users SET data_version = 1 WHERE data_version = 0",
+            # Kursor sinkronisasi berupa (change_seq, id); indeks lama tanpa id diganti
+            *_create_index("ix_data_entries_owner_change_seq_id", "data_entries (owner_id, change_seq, id)"),
+            *_create_index(
+                "ix_data_entry_tombstones_owner_change_seq_id", "data_entry_tombstones (owner_id, change_seq, id)"
+            ),
+            Concurrently("DROP INDEX CONCURRENTLY IF EXISTS ix_data_entries_owner_change_seq"),
+            Concurrently("DROP INDEX CONCURRENTLY IF EXISTS ix_data_entry_tombstones_owner_change_seq"),
+        ],
+    ),
+    (
+        "row_versions",
+        [
+            "ALTER TABLE data_entries ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+        ],
+    ),
+    (
+        "users_case_insensitive_identifiers",
+        [
+            *_merge_duplicate_users("lower(trim(email))"),
+            *_rename_duplicate_usernames(),
+            "UPDATE users SET email = lower(trim(email)), username = lower(trim(username)) "
+            "WHERE email <> lower(trim(email)) OR username <> lower(trim(username))",
+            # Duplikat yang masuk sebelum indeks unik selesai membuat langkah ini gagal;
+            # menjalankan ulang migrasi menggabungkannya lalu membangun ulang indeksnya
+            *_create_index("ix_users_email_lower", "users (lower(email) text_pattern_ops)", unique=True),
+            *_create_index("ix_users_username_lower", "users (lower(username) text_pattern_ops)", unique=True),
+        ],
+    ),
+    (
+        "users_directory",
+        [
+            # Indeks unik lower() tanpa text_pattern_ops (dari migrasi lama) dibuat ulang
+            # untuk pencarian prefix; indeks baru dibuat sebelum yang lama dihapus
+            statement
+            for column in ("username", "email")
+            for statement in (
+                *_create_index(
+                    f"ix_users_{column}_lower_new", f"users (lower({column}) text_pattern_ops)", unique=True,
+                    unless=(_text_pattern_index_exists(f"ix_users_{column}_lower"),),
+                ),
+                Concurrently(
+                    f"DROP INDEX CONCURRENTLY IF EXISTS ix_users_{column}_lower",
+                    (_text_pattern_index_exists(f"ix_users_{column}_lower"),),
+                ),
+                f"ALTER INDEX IF EXISTS ix_users_{column}_lower_new RENAME TO ix_users_{column}_lower",
+            )
+        ] + [
+            *_create_index("ix_users_name_lower", "users (lower(name) text_pattern_ops)"),
+            # Penghitung per grup diisi sekali dari tabel users; selanjutnya dijaga
+            # upsert inkremental. Lock menahan penulisan users/penghitung selama
+            # pengisian agar tidak ada registrasi yang terlewat atau terhitung dua
+            # kali; setelah terisi, langkah ini tidak mengambil lock lagi
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM user_group_counts) THEN
+                    LOCK TABLE users IN SHARE MODE;
+                    LOCK TABLE user_group_counts IN EXCLUSIVE MODE;
+                    INSERT INTO user_group_counts (dimension, value, count)
+                    SELECT dimension, value, count FROM (
+                        SELECT 'role' AS dimension, coalesce(role, '') AS value, count(*) AS count
+                        FROM users GROUP BY coalesce(role, '')
+                        UNION ALL
+                        SELECT 'disease', coalesce(disease, ''), count(*) FROM users GROUP BY coalesce(disease, '')
+                    ) seed WHERE NOT EXISTS (SELECT 1 FROM user_group_counts);
+                END IF;
+            END $$
+            """,
+        ],
+    ),
+]
+
+
+def _run_transaction(bind, statements: List[str]) -> None:
+    with bind.begin() as conn:
+        for statement in statements:
+            result = conn.execute(text(statement))
+            if result.returns_rows:
+                for (message,) in result:
+                    print(f"  {message}")
+
+
+def _run_concurrently(bind, statement: Concurrently) -> None:
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if any(conn.execute(text(query)).first() is not None for query in statement.unless):
+            return
+        conn.execute(text(statement.sql))
+
+
+def run_migrations(bind=engine) -> None:
+    Base.metadata.create_all(bind=bind)
+    for name, statements in STEPS:
+        print(f"Menjalankan migrasi {name}")
+        # Pernyataan biasa yang berurutan berbagi satu transaksi (tabel TEMP
+        # tetap terlihat); CONCURRENTLY memisahkannya
+        pending: List[str] = []
+        for statement in statements:
+            if isinstance(statement, Concurrently):
+                if pending:
+                    _run_transaction(bind, pending)
+                    pending = []
+                _run_concurrently(bind, statement)
+            else:
+                pending.append(statement)
+        if pending:
+            _run_transaction(bind, pending)
+
+
+if __name__ == "__main__":
+    run_migrations()
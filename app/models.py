@@ -1,10 +1,23 @@
 # app/models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, Date, DateTime, Index, func, literal_column
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
 
+# Kolom-kolom DataEntry yang sering dipakai ulang (ekspor, statistik, filter)
+DATA_ENTRY_INT_FIELDS = tuple(f"int_field{i}" for i in range(1, 9))
+DATA_ENTRY_STRING_FIELDS = ("string_field1", "string_field2", "string_field3")
+
+# Kolom string tidak dibatasi panjangnya, sedangkan baris indeks btree PostgreSQL
+# dibatasi sekitar 2,7 kB; indeks string hanya memuat awalan sepanjang ini
+STRING_INDEX_PREFIX = 256
+
+def string_index_key(column):
+    """Ekspresi terindeks untuk kolom string; filter harus memakai ekspresi yang sama."""
+    # Literal (bukan parameter) agar ekspresi query identik dengan ekspresi indeks
+    return func.substr(column, literal_column("1"), literal_column(str(STRING_INDEX_PREFIX)))
+
 class User(Base):
     __tablename__ = "users"
 
@@ -17,10 +30,29 @@ class User(Base):
     disease = Column(String, nullable=True)
     date_of_birth = Column(Date, nullable=True)
     place_of_birth = Column(String, nullable=True)
+    data_version = Column(BigInteger, nullable=False, default=0, server_default="0")  # Naik setiap data entry berubah
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Naik setiap profil berubah
 
     data_entries = relationship("DataEntry", back_populates="owner")
     activity_logs = relationship("ActivityLog", back_populates="user")
 
+    # Pencarian identifier tidak peka huruf besar/kecil memakai indeks fungsional ini;
+    # text_pattern_ops agar juga melayani pencarian prefix di direktori admin
+    __table_args__ = (
+        Index(
+            "ix_users_username_lower", func.lower(username).label("lower_username"), unique=True,
+            postgresql_ops={"lower_username": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_users_email_lower", func.lower(email).label("lower_email"), unique=True,
+            postgresql_ops={"lower_email": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_users_name_lower", func.lower(name).label("lower_name"),
+            postgresql_ops={"lower_name": "text_pattern_ops"},
+        ),
+    )
+
 class DataEntry(Base):
     __tablename__ = "data_entries"
 
@@ -37,9 +69,79 @@ class DataEntry(Base):
     int_field7 = Column(Integer, nullable=False)
     int_field8 = Column(Integer, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0)  # Nilai users.data_version saat terakhir berubah
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Versi baris untuk ETag
 
     owner = relationship("User", back_populates="data_entries")
 
+    # Indeks komposit (owner_id, int_fieldN) untuk top-K, MIN/MAX dan filter rentang per pengguna
+    # serta (owner_id, awalan string_fieldN) untuk filter kesamaan dan prefix
+    __table_args__ = tuple(
+        Index(f"ix_data_entries_owner_{field}", "owner_id", field)
+        for field in DATA_ENTRY_INT_FIELDS
+    ) + tuple(
+        Index(
+            f"ix_data_entries_owner_{field}_prefix", "owner_id", string_index_key(column).label(field),
+            postgresql_ops={field: "text_pattern_ops"},
+        )
+        for field, column in zip(DATA_ENTRY_STRING_FIELDS, (string_field1, string_field2, string_field3))
+    ) + (
+        Index("ix_data_entries_owner_change_seq_id", "owner_id", "change_seq", "id"),
+    )
+
+class DataEntryTombstone(Base):
+    """
+    Jejak penghapusan data entry agar klien sinkronisasi delta tahu baris
+    mana yang harus dihapus.
+    """
+    __tablename__ = "data_entry_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_data_entry_tombstones_owner_change_seq_id", "owner_id", "change_seq", "id"),
+    )
+
+class DataEntryFieldStat(Base):
+    """
+    Ringkasan per pengguna per int_field, diperbarui secara inkremental
+    setiap kali data entry dibuat, diubah, atau dihapus.
+    """
+    __tablename__ = "data_entry_field_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    field = Column(String, primary_key=True)
+    entry_count = Column(BigInteger, nullable=False, default=0)
+    total = Column(BigInteger, nullable=False, default=0)
+    min_value = Column(BigInteger, nullable=True)
+    max_value = Column(BigInteger, nullable=True)
+    stale = Column(Boolean, nullable=False, default=False)  # min/max perlu dihitung ulang
+
+class DataEntryHistogramBin(Base):
+    __tablename__ = "data_entry_histogram_bins"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    field = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # Bucket log2 bertanda, lihat stats_service.bucket_of
+    count = Column(BigInteger, nullable=False, default=0)
+
+class UserGroupCount(Base):
+    """
+    Jumlah pengguna per nilai role/disease, diperbarui dalam transaksi yang
+    sama dengan penulisan pengguna (lihat app/directory.py).
+    """
+    __tablename__ = "user_group_counts"
+
+    dimension = Column(String, primary_key=True)  # "role" atau "disease"
+    value = Column(String, primary_key=True)  # "" untuk NULL
+    count = Column(BigInteger, nullable=False, default=0)
+
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
 
@@ -0,0 +1,347 @@
+# app/msgpack_codec.py
+
+"""
+Encoder/decoder MessagePack (https://msgpack.org/) untuk klien bervolume
+tinggi. Jika paket `msgpack` (ekstensi C) terpasang, packb/unpackb dan
+MsgpackRowEncoder memakainya; implementasi Python murni di modul ini menjadi
+fallback dan menghasilkan bytes yang sama.
+
+Tipe yang didukung: None, bool, int (hingga 64 bit), float, str, bytes,
+list/tuple, dict. datetime/date di-encode sebagai string ISO 8601 agar isinya
+sama dengan representasi JSON.
+
+MsgpackRowEncoder adalah padanan rowcodec.RowEncoder: baris tuple di-encode
+langsung menjadi map dengan kunci yang sudah di-pack sekali per daftar kolom.
+"""
+
+import struct
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import Column
+
+try:
+    import msgpack
+except ImportError:  # msgpack opsional, fallback ke implementasi Python murni
+    msgpack = None
+
+MEDIA_TYPE = "application/msgpack"
+
+_pack_u8 = struct.Struct(">B").pack
+_pack_u16 = struct.Struct(">H").pack
+_pack_u32 = struct.Struct(">I").pack
+_pack_u64 = struct.Struct(">Q").pack
+_pack_i8 = struct.Struct(">b").pack
+_pack_i16 = struct.Struct(">h").pack
+_pack_i32 = struct.Struct(">i").pack
+_pack_i64 = struct.Struct(">q").pack
+_pack_f64 = struct.Struct(">d").pack
+
+NIL = b"\xc0"
+
+
+def pack_int(value: int) -> bytes:
+    if 0 <= value < 0x80:
+        return bytes((value,))
+    if -32 <= value < 0:
+        return bytes((value & 0xFF,))
+    if value >= 0:
+        if value <= 0xFF:
+            return b"\xcc" + _pack_u8(value)
+        if value <= 0xFFFF:
+            return b"\xcd" + _pack_u16(value)
+        if value <= 0xFFFFFFFF:
+            return b"\xce" + _pack_u32(value)
+        if value <= 0xFFFFFFFFFFFFFFFF:
+            return b"\xcf" + _pack_u64(value)
+    else:
+        if value >= -0x80:
+            return b"\xd0" + _pack_i8(value)
+        if value >= -0x8000:
+            return b"\xd1" + _pack_i16(value)
+        if value >= -0x80000000:
+            return b"\xd2" + _pack_i32(value)
+        if value >= -0x8000000000000000:
+            return b"\xd3" + _pack_i64(value)
+    raise ValueError("Integer di luar rentang 64 bit MessagePack")
+
+
+def pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    length = len(data)
+    if length < 32:
+        return bytes((0xA0 | length,)) + data
+    if length <= 0xFF:
+        return b"\xd9" + _pack_u8(length) + data
+    if length <= 0xFFFF:
+        return b"\xda" + _pack_u16(length) + data
+    return b"\xdb" + _pack_u32(length) + data
+
+
+def pack_bin(value: bytes) -> bytes:
+    length = len(value)
+    if length <= 0xFF:
+        return b"\xc4" + _pack_u8(length) + value
+    if length <= 0xFFFF:
+        return b"\xc5" + _pack_u16(length) + value
+    return b"\xc6" + _pack_u32(length) + value
+
+
+def array_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length <= 0xFFFF:
+        return b"\xdc" + _pack_u16(length)
+    return b"\xdd" + _pack_u32(length)
+
+
+def map_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x80 | length,))
+    if length <= 0xFFFF:
+        return b"\xde" + _pack_u16(length)
+    return b"\xdf" + _pack_u32(length)
+
+
+def _pack_into(value: Any, out: List[bytes]) -> None:
+    if value is None:
+        out.append(NIL)
+    elif value is True:
+        out.append(b"\xc3")
+    elif value is False:
+        out.append(b"\xc2")
+    elif isinstance(value, int):
+        out.append(pack_int(value))
+    elif isinstance(value, str):
+        out.append(pack_str(value))
+    elif isinstance(value, float):
+        out.append(b"\xcb" + _pack_f64(value))
+    elif isinstance(value, dict):
+        out.append(map_header(len(value)))
+        for key, item in value.items():
+            _pack_into(key, out)
+            _pack_into(item, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(array_header(len(value)))
+        for item in value:
+            _pack_into(item, out)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(pack_bin(bytes(value)))
+    elif isinstance(value, (datetime, date)):
+        out.append(pack_str(value.isoformat()))
+    else:
+        raise TypeError(f"Tipe {type(value).__name__} tidak dapat di-encode ke MessagePack")
+
+
+def _packb_python(value: Any) -> bytes:
+    out: List[bytes] = []
+    _pack_into(value, out)
+    return b"".join(out)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, int):
+        # Ekstensi C memanggil default untuk integer di luar 64 bit
+        raise ValueError("Integer di luar rentang 64 bit MessagePack")
+    raise TypeError(f"Tipe {type(value).__name__} tidak dapat di-encode ke MessagePack")
+
+
+def _new_packer():
+    return msgpack.Packer(default=_default, datetime=False)
+
+
+def _packb_c(value: Any) -> bytes:
+    try:
+        return msgpack.packb(value, default=_default, datetime=False)
+    except OverflowError:
+        raise ValueError("Integer di luar rentang 64 bit MessagePack")
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def take(self, size: int) -> memoryview:
+        end = self.pos + size
+        if end > len(self.data):
+            raise ValueError("Data MessagePack terpotong")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def unpack(self, fmt: str, size: int):
+        return struct.unpack(fmt, self.take(size))[0]
+
+
+_FIXED = {
+    0xCC: (">B", 1), 0xCD: (">H", 2), 0xCE: (">I", 4), 0xCF: (">Q", 8),
+    0xD0: (">b", 1), 0xD1: (">h", 2), 0xD2: (">i", 4), 0xD3: (">q", 8),
+    0xCA: (">f", 4), 0xCB: (">d", 8),
+}
+_STR_LENGTH = {0xD9: (">B", 1), 0xDA: (">H", 2), 0xDB: (">I", 4)}
+_BIN_LENGTH = {0xC4: (">B", 1), 0xC5: (">H", 2), 0xC6: (">I", 4)}
+_ARRAY_LENGTH = {0xDC: (">H", 2), 0xDD: (">I", 4)}
+_MAP_LENGTH = {0xDE: (">H", 2), 0xDF: (">I", 4)}
+
+MAX_DEPTH = 64
+
+
+def _unpack(reader: _Reader, depth: int = 0) -> Any:
+    if depth > MAX_DEPTH:
+        raise ValueError("Struktur MessagePack terlalu dalam")
+    tag = reader.take(1)[0]
+    if tag < 0x80:
+        return tag
+    if tag >= 0xE0:
+        return tag - 0x100
+    if 0xA0 <= tag <= 0xBF:
+        return str(reader.take(tag & 0x1F), "utf-8")
+    if 0x90 <= tag <= 0x9F:
+        return [_unpack(reader, depth + 1) for _ in range(tag & 0x0F)]
+    if 0x80 <= tag <= 0x8F:
+        return _unpack_map(reader, tag & 0x0F, depth)
+    if tag == 0xC0:
+        return None
+    if tag == 0xC2:
+        return False
+    if tag == 0xC3:
+        return True
+    if tag in _FIXED:
+        return reader.unpack(*_FIXED[tag])
+    if tag in _STR_LENGTH:
+        return str(reader.take(reader.unpack(*_STR_LENGTH[tag])), "utf-8")
+    if tag in _BIN_LENGTH:
+        return bytes(reader.take(reader.unpack(*_BIN_LENGTH[tag])))
+    if tag in _ARRAY_LENGTH:
+        return [_unpack(reader, depth + 1) for _ in range(reader.unpack(*_ARRAY_LENGTH[tag]))]
+    if tag in _MAP_LENGTH:
+        return _unpack_map(reader, reader.unpack(*_MAP_LENGTH[tag]), depth)
+    raise ValueError(f"Tipe MessagePack 0x{tag:02x} tidak didukung")
+
+
+def _unpack_map(reader: _Reader, length: int, depth: int) -> dict:
+    result = {}
+    for _ in range(length):
+        key = _unpack(reader, depth + 1)
+        if not isinstance(key, (str, int)):
+            raise ValueError("Kunci map MessagePack harus string atau integer")
+        result[key] = _unpack(reader, depth + 1)
+    return result
+
+
+def _unpackb_python(data: bytes) -> Any:
+    """ValueError jika data tidak valid atau tersisa byte setelah satu objek."""
+    reader = _Reader(data)
+    try:
+        value = _unpack(reader)
+    except (struct.error, UnicodeDecodeError) as exc:
+        raise ValueError(f"Data MessagePack tidak valid: {exc}")
+    if reader.pos != len(reader.data):
+        raise ValueError("Data MessagePack berisi byte tambahan")
+    return value
+
+
+def _reject_ext(code: int, data: bytes):
+    raise ValueError(f"Tipe ext MessagePack {code} tidak didukung")
+
+
+def _unpackb_c(data: bytes) -> Any:
+    """Sama dengan _unpackb_python: semua error data dilaporkan sebagai ValueError."""
+    try:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False, ext_hook=_reject_ext)
+    except (ValueError, TypeError) as exc:
+        # TypeError: kunci map berupa array/map
+        raise ValueError(f"Data MessagePack tidak valid: {exc}")
+
+
+if msgpack is not None:
+    packb, unpackb = _packb_c, _unpackb_c
+else:
+    packb, unpackb = _packb_python, _unpackb_python
+
+
+def _pack_nullable_int(value) -> bytes:
+    if value is None:
+        return NIL
+    if 0 <= value < 0x80:
+        return _SMALL_INTS[value]
+    return pack_int(value)
+
+
+def _pack_nullable_str(value) -> bytes:
+    return NIL if value is None else pack_str(value)
+
+
+def _pack_nullable_temporal(value) -> bytes:
+    return NIL if value is None else pack_str(value.isoformat())
+
+
+def _pack_nullable_bool(value) -> bytes:
+    return NIL if value is None else (b"\xc3" if value else b"\xc2")
+
+
+_SMALL_INTS = tuple(bytes((value,)) for value in range(0x80))
+
+_VALUE_PACKERS = {
+    bool: _pack_nullable_bool,
+    int: _pack_nullable_int,
+    str: _pack_nullable_str,
+    datetime: _pack_nullable_temporal,
+    date: _pack_nullable_temporal,
+}
+
+
+class MsgpackRowEncoder:
+    """
+    Padanan rowcodec.RowEncoder yang menghasilkan bytes MessagePack langsung
+    dari baris tuple: header map dan kunci di-pack sekali per daftar kolom,
+    lalu setiap nilai di-pack oleh msgpack.Packer (ekstensi C) atau oleh
+    packer per tipe kolom (fallback Python murni).
+    """
+
+    __slots__ = ("names", "_prefix", "_keys", "_value_packers")
+
+    def __init__(self, columns: Sequence[Column], names: Sequence[str] = None):
+        columns = tuple(columns)
+        self.names = tuple(names or [column.key for column in columns])
+        self._prefix = map_header(len(self.names))
+        self._keys = tuple(pack_str(name) for name in self.names)
+        self._value_packers: Tuple[Callable[[Any], bytes], ...] = tuple(
+            _VALUE_PACKERS[column.type.python_type] for column in columns
+        )
+
+    def encode_row(self, row: Sequence[Any]) -> bytes:
+        if msgpack is not None:
+            return self._encode_row_c(row, _new_packer().pack)
+        return self._encode_row_python(row)
+
+    def encode_rows(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        rows = rows if isinstance(rows, (list, tuple)) else list(rows)
+        if msgpack is not None:
+            # Packer tidak thread-safe: satu instance per pemanggilan
+            pack = _new_packer().pack
+            return array_header(len(rows)) + b"".join([self._encode_row_c(row, pack) for row in rows])
+        return array_header(len(rows)) + b"".join([self._encode_row_python(row) for row in rows])
+
+    def _encode_row_c(self, row: Sequence[Any], pack: Callable[[Any], bytes]) -> bytes:
+        return self._prefix + b"".join([key + pack(value) for key, value in zip(self._keys, row)])
+
+    def _encode_row_python(self, row: Sequence[Any]) -> bytes:
+        return self._prefix + b"".join([
+            key + pack(value) for key, pack, value in zip(self._keys, self._value_packers, row)
+        ])
+
+
+def envelope(success: bool, data_packed: bytes = NIL, error: str = None) -> bytes:
+    """Amplop {success, data, error} dengan data yang sudah di-pack."""
+    return b"".join((
+        map_header(3),
+        pack_str("success"), b"\xc3" if success else b"\xc2",
+        pack_str("data"), data_packed,
+        pack_str("error"), NIL if error is None else pack_str(error),
+    ))
@@ -0,0 +1,117 @@
+# app/negotiation.py
+
+"""
+Negosiasi format JSON/MessagePack lewat Accept dan Content-Type.
+
+NegotiatingRoute dipasang sebagai route_class aplikasi:
+
+- Content-Type application/msgpack pada body permintaan didekode langsung
+  menjadi objek Python lalu divalidasi FastAPI seperti body JSON.
+- Format respons dipilih dari Accept (JSON tetap bawaan) dan disimpan di
+  context variable yang dibaca app/envelopes.py.
+- Respons MessagePack diberi akhiran ETag "-mp" dan Vary: Accept; akhiran itu
+  dibuang dari If-None-Match/If-Match yang masuk.
+"""
+
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+from . import msgpack_codec
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+JSON_MEDIA_TYPES = ("application/json", "application/*", "*/*")
+MSGPACK_MEDIA_TYPES = (msgpack_codec.MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+ETAG_SUFFIX = "-mp"
+
+response_format: ContextVar[str] = ContextVar("response_format", default=JSON)
+
+
+def _media_type(value: Optional[str]) -> str:
+    return (value or "").split(";")[0].strip().lower()
+
+
+def preferred_format(accept: Optional[str]) -> str:
+    """MessagePack hanya jika q-nya lebih tinggi dari JSON (seri -> JSON)."""
+    if not accept:
+        return JSON
+    best = {JSON: 0.0, MSGPACK: 0.0}
+    for item in accept.split(","):
+        media_type, _, params = item.partition(";")
+        media_type = media_type.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in MSGPACK_MEDIA_TYPES:
+            best[MSGPACK] = max(best[MSGPACK], q)
+        elif media_type in JSON_MEDIA_TYPES:
+            best[JSON] = max(best[JSON], q)
+    return MSGPACK if best[MSGPACK] > best[JSON] else JSON
+
+
+def wants_msgpack() -> bool:
+    return response_format.get() == MSGPACK
+
+
+def _rewrite_headers(scope, body_is_msgpack: bool, strip_etag_suffix: bool):
+    headers = []
+    for key, value in scope["headers"]:
+        name = key.lower()
+        if body_is_msgpack and name == b"content-type":
+            # FastAPI hanya memanggil request.json() untuk tipe konten JSON
+            value = b"application/json"
+        elif strip_etag_suffix and name in (b"if-none-match", b"if-match"):
+            value = b", ".join(
+                tag[:-len(ETAG_SUFFIX) - 1] + b'"' if tag.endswith(ETAG_SUFFIX.encode() + b'"') else tag
+                for tag in (part.strip() for part in value.split(b","))
+            )
+        headers.append((key, value))
+    return dict(scope, headers=headers)
+
+
+class NegotiatingRoute(APIRoute):
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def negotiating_handler(request: Request) -> Response:
+            body_is_msgpack = _media_type(request.headers.get("content-type")) in MSGPACK_MEDIA_TYPES
+            fmt = preferred_format(request.headers.get("accept"))
+            if body_is_msgpack or fmt == MSGPACK:
+                request = Request(_rewrite_headers(request.scope, body_is_msgpack, fmt == MSGPACK), request.receive)
+            if body_is_msgpack:
+                body = await request.body()
+                if body:
+                    try:
+                        # Disajikan lewat request.json() yang dipanggil FastAPI
+                        request._json = msgpack_codec.unpackb(body)
+                    except ValueError as exc:
+                        raise RequestValidationError(
+                            [{"type": "msgpack_invalid", "loc": ("body",), "msg": str(exc), "input": None}]
+                        )
+
+            token = response_format.set(fmt)
+            try:
+                response = await handler(request)
+            finally:
+                response_format.reset(token)
+
+            if fmt == MSGPACK:
+                etag = response.headers.get("etag")
+                if etag and etag.endswith('"') and not etag.startswith("W/"):
+                    response.headers["etag"] = etag[:-1] + ETAG_SUFFIX + '"'
+            # Cache bersama harus membedakan varian berdasarkan Accept
+            vary = response.headers.get("vary")
+            response.headers["vary"] = f"{vary}, Accept" if vary else "Accept"
+            return response
+
+        return negotiating_handler
@@ -0,0 +1,243 @@
+# app/provisioning.py
+
+"""
+Provisioning pengguna secara massal (satu klinik sekaligus) untuk admin.
+
+- Hash bcrypt dikerjakan paralel di thread pool sebesar jumlah CPU; bcrypt
+  melepas GIL selama hashing sehingga throughput naik sebanding jumlah core.
+  Hashing berjalan di depan penulisan: selagi satu batch di-INSERT, batch
+  berikutnya sudah di-hash.
+- Identifier yang sudah terpakai (di database atau duplikat di dalam berkas)
+  ditolak sebelum hashing.
+- Setiap batch adalah satu INSERT ... ON CONFLICT DO NOTHING RETURNING, satu
+  log aktivitas, satu pembaruan penghitung role/disease, dan satu commit.
+
+Bisa dipanggil dari endpoint admin atau dari CLI:
+
+    python -m app.provisioning pengguna.csv --admin admin@klinik.id
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from . import directory, identifiers
+from .auth import get_user_by_identifier, pwd_context
+from .database import dialect_insert
+from .logging_service import log_activity
+from .models import User
+from .schemas import (
+    ADMIN_ROLE,
+    ActivityLogCreate,
+    BulkProvisionResponse,
+    ProvisionConflict,
+    UserCreate,
+    UserResponse,
+)
+
+BATCH_SIZE = int(os.getenv("PROVISION_BATCH_SIZE", 500))
+HASH_WORKERS = int(os.getenv("PROVISION_HASH_WORKERS") or os.cpu_count() or 1)
+
+CSV_MEDIA_TYPES = ("text/csv", "application/csv")
+
+_users = User.__table__
+_returned_columns = [_users.c[name] for name in UserResponse.model_fields]
+
+
+def parse_records(content: bytes, content_type: str = "application/json") -> List[Dict[str, Any]]:
+    """
+    Mengurai isi berkas menjadi daftar record mentah. CSV memakai baris
+    pertama sebagai header dengan nama kolom sesuai field UserCreate.
+    """
+    text = content.decode("utf-8-sig")
+    if content_type.split(";")[0].strip().lower() in CSV_MEDIA_TYPES:
+        # Sel kosong pada CSV berarti field opsional tidak diisi
+        return [
+            {key: value for key, value in row.items() if value not in ("", None)}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    records = json.loads(text)
+    if not isinstance(records, list):
+        raise ValueError("Isi JSON harus berupa daftar pengguna")
+    return records
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+
+def _validate(records: Sequence[Dict[str, Any]]) -> Tuple[List[Tuple[int, UserCreate]], List[ProvisionConflict]]:
+    """Validasi per record, lalu tolak identifier yang muncul lebih dari sekali di berkas."""
+    valid, rejected = [], []
+    seen_usernames: Set[str] = set()
+    seen_emails: Set[str] = set()
+    for index, record in enumerate(records):
+        try:
+            user = UserCreate(**record)
+        except (ValidationError, TypeError) as exc:
+            message = _validation_message(exc) if isinstance(exc, ValidationError) else str(exc)
+            rejected.append(ProvisionConflict(
+                index=index,
+                username=record.get("username") if isinstance(record, dict) else None,
+                email=record.get("email") if isinstance(record, dict) else None,
+                reason=f"Data tidak valid: {message}",
+            ))
+            continue
+        if user.username in seen_usernames or user.email in seen_emails:
+            field = "Username" if user.username in seen_usernames else "Email"
+            rejected.append(ProvisionConflict(
+                index=index, username=user.username, email=user.email,
+                reason=f"{field} duplikat di dalam berkas",
+            ))
+            continue
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+        valid.append((index, user))
+    return valid, rejected
+
+
+def _existing_identifiers(db: Session, users: Sequence[UserCreate]) -> Tuple[Set[str], Set[str]]:
+    """Satu query berindeks (lower(username)/lower(email)) untuk seluruh batch."""
+    usernames = [user.username for user in users]
+    emails = [user.email for user in users]
+    rows = db.execute(
+        select(func.lower(User.username), func.lower(User.email))
+        .where(or_(func.lower(User.username).in_(usernames), func.lower(User.email).in_(emails)))
+    ).all()
+    return {row[0] for row in rows}, {row[1] for row in rows}
+
+
+def _conflict(index: int, user: UserCreate, taken_usernames: Set[str], taken_emails: Set[str]) -> Optional[ProvisionConflict]:
+    if user.username in taken_usernames:
+        reason = "Username sudah digunakan"
+    elif user.email in taken_emails:
+        reason = "Email sudah digunakan"
+    else:
+        return None
+    return ProvisionConflict(index=index, username=user.username, email=user.email, reason=reason)
+
+
+def _batches(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def provision_users(
+    db: Session,
+    records: Sequence[Dict[str, Any]],
+    admin: User,
+    batch_size: int = BATCH_SIZE,
+    hash_workers: int = HASH_WORKERS,
+) -> BulkProvisionResponse:
+    admin_id, admin_email = admin.id, admin.email
+    candidates, conflicts = _validate(records)
+
+    # Identifier yang sudah terpakai tidak perlu di-hash sama sekali
+    accepted: List[Tuple[int, UserCreate]] = []
+    for batch in _batches(candidates, batch_size):
+        taken_usernames, taken_emails = _existing_identifiers(db, [user for _, user in batch])
+        for index, user in batch:
+            conflict = _conflict(index, user, taken_usernames, taken_emails)
+            if conflict is None:
+                accepted.append((index, user))
+            else:
+                conflicts.append(conflict)
+
+    created: List[UserResponse] = []
+    batch_count = 0
+    with ThreadPoolExecutor(max_workers=max(1, hash_workers), thread_name_prefix="bcrypt") as pool:
+        # map mengirim semua pekerjaan sekaligus; hasil diambil berurutan per batch
+        hashes = pool.map(pwd_context.hash, [user.password for _, user in accepted])
+        for batch in _batches(accepted, batch_size):
+            rows = [
+                dict(
+                    user.dict(exclude={"password"}),
+                    hashed_password=next(hashes),
+                )
+                for _, user in batch
+            ]
+            inserted = db.execute(
+                dialect_insert(db.get_bind(), _users)
+                .values(rows)
+                .on_conflict_do_nothing()
+                .returning(*_returned_columns)
+            ).all()
+
+            # Baris yang tidak kembali kalah balapan dengan pendaftaran lain
+            inserted_usernames = {row.username for row in inserted}
+            missing = [(index, user) for index, user in batch if user.username not in inserted_usernames]
+            if missing:
+                taken_usernames, taken_emails = _existing_identifiers(db, [user for _, user in missing])
+                for index, user in missing:
+                    conflicts.append(
+                        _conflict(index, user, taken_usernames, taken_emails)
+                        or ProvisionConflict(index=index, username=user.username, email=user.email,
+                                             reason="Username atau email sudah digunakan")
+                    )
+
+            directory.record_users_created(db, [row._mapping for row in inserted])
+
+            batch_count += 1
+            log_activity(db, ActivityLogCreate(
+                action=f"Admin {admin_email} memprovisikan {len(inserted)} pengguna "
+                       f"(batch {batch_count}, {len(batch) - len(inserted)} konflik)."
+            ), admin_id, commit=False)
+            db.commit()
+
+            for row in inserted:
+                identifiers.remember_taken(row.username, row.email)
+            created.extend(UserResponse.from_orm(row) for row in inserted)
+
+    conflicts.sort(key=lambda conflict: conflict.index)
+    return BulkProvisionResponse(
+        created=len(created),
+        rejected=len(conflicts),
+        batches=batch_count,
+        users=created,
+        conflicts=conflicts,
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Provisioning pengguna massal dari berkas CSV/JSON")
+    parser.add_argument("path", help="Berkas .csv atau .json berisi record UserCreate")
+    parser.add_argument("--admin", required=True, help="Username atau email admin pelaksana (untuk log)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS)
+    args = parser.parse_args(argv)
+
+    with open(args.path, "rb") as handle:
+        content = handle.read()
+    content_type = "text/csv" if args.path.lower().endswith(".csv") else "application/json"
+
+    db = SessionLocal()
+    try:
+        admin = get_user_by_identifier(db, args.admin)
+        if admin is None or admin.role != ADMIN_ROLE:
+            print(f"Admin {args.admin} tidak ditemukan", file=sys.stderr)
+            return 1
+        result = provision_users(db, parse_records(content, content_type), admin, args.batch_size, args.workers)
+    finally:
+        db.close()
+
+    print(f"Dibuat: {result.created}, ditolak: {result.rejected}, batch: {result.batches}")
+    for conflict in result.conflicts:
+        print(f"  #{conflict.index} {conflict.username or '-'} / {conflict.email or '-'}: {conflict.reason}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# app/query_filters.py
+
+"""
+Filter dan pengurutan untuk GET /data_entries/.
+
+Setiap filter ditulis sebagai `field:op:nilai`, misalnya
+`int_field1:gte:10` atau `string_field2:prefix:abc`. Pengurutan ditulis
+sebagai nama kolom, dengan awalan `-` untuk urutan menurun.
+
+Semua kolom dan operator dicek terhadap whitelist lalu dikompilasi menjadi
+SQL berparameter. Kombinasi yang tidak bisa dilayani oleh indeks
+(owner_id, kolom) ditolak dengan ValueError. Kolom string diindeks pada
+awalannya (models.string_index_key), jadi filternya ditulis ulang ke
+ekspresi yang sama.
+"""
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_
+
+from .models import DataEntry, DATA_ENTRY_INT_FIELDS, DATA_ENTRY_STRING_FIELDS, STRING_INDEX_PREFIX, string_index_key
+
+INT_OPERATORS = {
+    "eq": lambda column, value: column == value,
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+}
+
+
+def _string_eq(column, value: str):
+    # Kondisi pada awalan memakai indeks, kondisi pada kolom penuh memastikan kesamaan
+    return and_(string_index_key(column) == value[:STRING_INDEX_PREFIX], column == value)
+
+
+def _string_prefix(column, value: str):
+    if len(value) <= STRING_INDEX_PREFIX:
+        # Awalan terindeks diawali `value` jika dan hanya jika kolom penuh diawali `value`
+        return string_index_key(column).startswith(value, autoescape=True)
+    return and_(
+        string_index_key(column) == value[:STRING_INDEX_PREFIX],
+        column.startswith(value, autoescape=True),
+    )
+
+
+STRING_OPERATORS = {
+    "eq": _string_eq,
+    "prefix": _string_prefix,
+}
+FILTERABLE_FIELDS = {
+    **{field: INT_OPERATORS for field in DATA_ENTRY_INT_FIELDS},
+    **{field: STRING_OPERATORS for field in DATA_ENTRY_STRING_FIELDS},
+}
+# Kolom string tidak bisa diurutkan lewat indeks text_pattern_ops
+SORTABLE_FIELDS = ("id",) + DATA_ENTRY_INT_FIELDS
+
+
+def parse_filter(raw: str) -> Tuple[str, str, object]:
+    parts = raw.split(":", 2)
+    if len(parts) != 3:
+        raise ValueError(f"Format filter tidak valid: {raw} (gunakan field:op:nilai)")
+    field, op, value = parts
+    operators = FILTERABLE_FIELDS.get(field)
+    if operators is None:
+        raise ValueError(f"Field {field} tidak dapat difilter")
+    if op not in operators:
+        raise ValueError(f"Operator {op} tidak didukung untuk {field}")
+    if field in DATA_ENTRY_INT_FIELDS:
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError(f"Nilai filter {field} harus berupa integer")
+    return field, op, value
+
+
+def parse_sort(raw: Optional[str]) -> Optional[Tuple[str, bool]]:
+    if not raw:
+        return None
+    descending = raw.startswith("-")
+    field = raw.lstrip("-")
+    if field not in SORTABLE_FIELDS:
+        raise ValueError(f"Tidak dapat mengurutkan berdasarkan {field}")
+    return field, descending
+
+
+def apply_filters(query, filters: List[str], sort: Optional[str]):
+    """
+    Menambahkan WHERE dan ORDER BY ke query DataEntry yang sudah dibatasi
+    owner_id. Penjaga indeks:
+
+    - operator rentang (gt/gte/lt/lte/prefix) hanya boleh pada satu kolom,
+      karena indeks (owner_id, kolom) hanya bisa melayani satu rentang;
+    - jika ada filter rentang, pengurutan harus pada kolom yang sama agar
+      hasil dibaca berurutan dari indeks dan LIMIT bisa berhenti lebih awal.
+    """
+    parsed = [parse_filter(raw) for raw in filters]
+    order = parse_sort(sort)
+
+    range_fields = {field for field, op, _ in parsed if op != "eq"}
+    if len(range_fields) > 1:
+        raise ValueError(
+            "Filter rentang hanya boleh pada satu kolom, diterima: " + ", ".join(sorted(range_fields))
+        )
+    range_field = next(iter(range_fields), None)
+    if range_field is not None:
+        if order is None:
+            order = (range_field, False) if range_field in SORTABLE_FIELDS else None
+        elif order[0] != range_field:
+            raise ValueError(f"Pengurutan harus pada {range_field} jika memfilter rentang {range_field}")
+
+    for field, op, value in parsed:
+        query = query.filter(FILTERABLE_FIELDS[field][op](getattr(DataEntry, field), value))
+
+    if order is None:
+        return query.order_by(DataEntry.id)
+    field, descending = order
+    column = getattr(DataEntry, field)
+    if descending:
+        return query.order_by(column.desc(), DataEntry.id.desc())
+    return query.order_by(column.asc(), DataEntry.id.asc())
@@ -0,0 +1,76 @@
+# app/response_cache.py
+
+"""
+Cache per worker untuk bytes respons yang sudah di-encode pada
+GET /users/me/ dan GET /data_entries/{id} (cache "responses" di app/cache.py).
+
+Entri dikunci per (pengguna, entitas, id) dan varian (format respons,
+fields=) dan diberi versi sumbernya: users.version untuk profil dan
+users.data_version untuk data entry. Keduanya sudah dimuat oleh
+get_current_user, jadi hit tidak memerlukan SELECT maupun serializer, dan
+penulisan yang ditangani worker lain tetap terdeteksi karena versinya
+berubah. Hook invalidasi menghapus semua varian sebuah entitas (tag
+(pengguna, entitas, id)) agar memorinya segera kembali.
+
+Eviction LRU dengan batas memori RESPONSE_CACHE_MAX_BYTES (bawaan 16 MiB,
+0 mematikan cache); respons di atas RESPONSE_CACHE_MAX_ENTRY_BYTES tidak
+disimpan.
+"""
+
+import os
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import Response
+
+from . import cache as caches
+from . import negotiation
+
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", 64 * 1024))
+
+USER = caches.USER
+DATA_ENTRY = caches.DATA_ENTRY
+
+Group = Tuple[int, str, int]  # (user_id, entitas, id entitas)
+Variant = Tuple[str, Optional[Tuple[str, ...]]]  # (format, fields)
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+    media_type: str
+
+
+def variant(fields: Optional[Tuple[str, ...]]) -> Variant:
+    """Varian untuk format respons yang sedang dinegosiasikan."""
+    return negotiation.response_format.get(), fields
+
+
+def as_response(cached: CachedResponse) -> Response:
+    return Response(cached.body, media_type=cached.media_type, headers={"ETag": cached.etag})
+
+
+cache = caches.create(
+    "responses", MAX_BYTES, policy=caches.LRU, max_entry_bytes=MAX_ENTRY_BYTES,
+    sizeof=lambda cached: len(cached.body) + len(cached.etag),
+)
+
+
+def get(group: Group, variant: Variant, version: int) -> Optional[CachedResponse]:
+    return cache.get((group, variant), version=version)
+
+
+def put(group: Group, variant: Variant, cached: CachedResponse) -> None:
+    cache.put((group, variant), cached, version=cached.version, tag=group)
+
+
+@caches.on_invalidate(USER)
+def _invalidate_user(user_id: int, entity_id: Optional[int]) -> None:
+    cache.invalidate_tag((user_id, USER, user_id))
+
+
+@caches.on_invalidate(DATA_ENTRY)
+def _invalidate_entry(user_id: int, entity_id: Optional[int]) -> None:
+    if entity_id is not None:
+        cache.invalidate_tag((user_id, DATA_ENTRY, entity_id))
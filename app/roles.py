@@ -0,0 +1,83 @@
+# app/roles.py
+
+"""
+Pemberian dan pencabutan role admin di luar API. /register dan provisioning
+massal menolak role admin, jadi admin hanya dibuat oleh operator:
+
+    python -m app.roles grant admin@klinik.id
+    python -m app.roles revoke admin@klinik.id
+
+Perubahan role menaikkan users.version, memperbarui penghitung role di
+direktori, dicatat di log aktivitas pengguna, dan diumumkan lewat bus
+invalidasi agar cache pengguna di worker lain dibuang.
+"""
+
+import argparse
+import sys
+from typing import Optional, Sequence
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import cache, directory, invalidation
+from .auth import get_user_by_identifier
+from .logging_service import log_activity
+from .models import User
+from .schemas import ADMIN_ROLE, ActivityLogCreate
+
+DEFAULT_ROLE = "user"
+
+_users = User.__table__
+
+
+def set_role(db: Session, identifier: str, role: str) -> Optional[str]:
+    """Mengubah role pengguna; mengembalikan role lama, atau None jika pengguna tidak ada."""
+    user = get_user_by_identifier(db, identifier)
+    if user is None:
+        return None
+    old_groups = {dimension: getattr(user, dimension) for dimension in directory.GROUP_DIMENSIONS}
+    if user.role == role:
+        return role
+    row = db.execute(
+        update(_users)
+        .where(_users.c.id == user.id)
+        .values(role=role, version=_users.c.version + 1)
+        .returning(_users.c.id, _users.c.version, *[_users.c[dimension] for dimension in directory.GROUP_DIMENSIONS])
+    ).one()
+    directory.record_user_updated(db, old_groups, row._mapping)
+    log_activity(db, ActivityLogCreate(
+        action=f"Role pengguna diubah dari {old_groups['role']} menjadi {role} oleh operator."
+    ), row.id, commit=False)
+    db.commit()
+    invalidation.publish(cache.USER, row.id, row.id, row.version)
+    return old_groups["role"]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Memberikan atau mencabut role admin")
+    parser.add_argument("action", choices=("grant", "revoke"))
+    parser.add_argument("identifier", help="Username atau email pengguna")
+    parser.add_argument("--role", default=DEFAULT_ROLE, help="Role setelah admin dicabut (bawaan: user)")
+    args = parser.parse_args(argv)
+
+    role = ADMIN_ROLE if args.action == "grant" else args.role
+    # Event invalidasi juga dikirim ke worker yang sedang berjalan
+    invalidation.bus.start()
+    db = SessionLocal()
+    try:
+        old_role = set_role(db, args.identifier, role)
+    finally:
+        db.close()
+        invalidation.bus.stop()
+
+    if old_role is None:
+        print(f"Pengguna {args.identifier} tidak ditemukan", file=sys.stderr)
+        return 1
+    print(f"Role {args.identifier}: {old_role} -> {role}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
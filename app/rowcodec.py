@@ -0,0 +1,133 @@
+# app/rowcodec.py
+
+"""
+Encoder JSON langsung dari baris tuple hasil SELECT Core, dan proyeksi
+field (parameter `fields=`) yang mempersempit SELECT dan payload sekaligus.
+
+Endpoint daftar tidak lagi memuat instance ORM (identity map, instrumentasi
+atribut) lalu membangun model pydantic per baris; baris tuple dari SELECT
+kolom yang diperlukan saja di-encode dengan template objek JSON yang
+disusun sekali per daftar kolom. Keluaran setara dengan serializer pydantic
+untuk skema respons yang sama.
+"""
+
+import threading
+from datetime import date, datetime
+from json.encoder import encode_basestring
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column
+
+from .msgpack_codec import MsgpackRowEncoder
+
+ValueEncoder = Callable[[Any], str]
+
+
+def _encode_int(value: int) -> str:
+    return "null" if value is None else int.__repr__(value)
+
+
+def _encode_str(value: str) -> str:
+    return "null" if value is None else encode_basestring(value)
+
+
+def _encode_temporal(value) -> str:
+    return "null" if value is None else f'"{value.isoformat()}"'
+
+
+def _encode_bool(value: bool) -> str:
+    return "null" if value is None else ("true" if value else "false")
+
+
+_ENCODERS = {
+    bool: _encode_bool,
+    int: _encode_int,
+    str: _encode_str,
+    datetime: _encode_temporal,
+    date: _encode_temporal,
+}
+
+
+def encoder_for(column: Column) -> ValueEncoder:
+    return _ENCODERS[column.type.python_type]
+
+
+class RowEncoder:
+    """
+    Meng-encode tuple (urutan sama dengan `columns`) menjadi objek JSON.
+    Dibuat sekali per kombinasi kolom dan dipakai ulang antar permintaan.
+    """
+
+    __slots__ = ("names", "columns", "_template", "_encoders")
+
+    def __init__(self, columns: Sequence[Column], names: Sequence[str] = None):
+        self.columns = tuple(columns)
+        self.names = tuple(names or [column.key for column in self.columns])
+        self._encoders: Tuple[ValueEncoder, ...] = tuple(encoder_for(column) for column in self.columns)
+        # '%' pada nama kolom di-escape agar aman sebagai template format
+        self._template = "{" + ",".join(
+            f"{encode_basestring(name).replace('%', '%%')}:%s" for name in self.names
+        ) + "}"
+
+    def encode_row(self, row: Sequence[Any]) -> str:
+        return self._template % tuple([encode(value) for encode, value in zip(self._encoders, row)])
+
+    def encode_rows(self, rows: Iterable[Sequence[Any]]) -> str:
+        return "[" + ",".join([self.encode_row(row) for row in rows]) + "]"
+
+
+def columns_of(table, names: Iterable[str]) -> List[Column]:
+    return [table.c[name] for name in names]
+
+
+class Projection:
+    """
+    Kolom respons sebuah skema beserta SELECT dan encoder per kombinasi
+    `fields=`. Field dinormalisasi ke urutan skema sehingga `a,b` dan `b,a`
+    berbagi entri cache (dan ETag yang sama).
+    """
+
+    MAX_CACHED = 256
+
+    def __init__(self, table, names: Sequence[str], build_statement: Callable[[List[Column]], Any] = None):
+        self.table = table
+        self.names = tuple(names)
+        self._build_statement = build_statement
+        self._cache: Dict[Tuple[str, ...], Tuple[Any, RowEncoder, MsgpackRowEncoder]] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, raw: Optional[str]) -> Tuple[str, ...]:
+        """`id,int_field1` -> ('id', 'int_field1'); tanpa nilai berarti semua field."""
+        if not raw:
+            return self.names
+        requested = {name.strip() for name in raw.split(",") if name.strip()}
+        unknown = requested.difference(self.names)
+        if unknown:
+            raise ValueError(f"Field tidak dikenal: {', '.join(sorted(unknown))}")
+        if not requested:
+            raise ValueError("Parameter fields tidak boleh kosong")
+        return tuple(name for name in self.names if name in requested)
+
+    def get(self, fields: Tuple[str, ...]) -> Tuple[Any, RowEncoder]:
+        """(statement atau None, encoder JSON) untuk field yang sudah di-parse."""
+        statement, encoder, _ = self._entry(fields)
+        return statement, encoder
+
+    def _entry(self, fields: Tuple[str, ...]):
+        cached = self._cache.get(fields)
+        if cached is not None:
+            return cached
+        columns = columns_of(self.table, fields)
+        statement = self._build_statement(columns) if self._build_statement else None
+        cached = (statement, RowEncoder(columns), MsgpackRowEncoder(columns))
+        with self._lock:
+            if len(self._cache) >= self.MAX_CACHED:
+                self._cache.clear()
+            self._cache[fields] = cached
+        return cached
+
+    def encoder(self, fields: Tuple[str, ...]) -> RowEncoder:
+        return self._entry(fields)[1]
+
+    def msgpack_encoder(self, fields: Tuple[str, ...]) -> MsgpackRowEncoder:
+        return self._entry(fields)[2]
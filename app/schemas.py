@@ -1,13 +1,22 @@
 # app/schemas.py
 
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Generic, List, TypeVar
 from datetime import date, datetime
 
-# Skema Respons Umum
-class ResponseModel(BaseModel):
+def normalize_identifier(value: str) -> str:
+    """Username dan email disimpan dan dicari dalam bentuk huruf kecil tanpa spasi tepi."""
+    return value.strip().lower()
+
+# Role admin tidak bisa didaftarkan lewat API; diberikan operator dengan python -m app.roles
+ADMIN_ROLE = "admin"
+
+T = TypeVar("T")
+
+# Skema Respons Umum; ResponseModel[X] untuk respons bertipe, tanpa parameter = Any
+class ResponseModel(BaseModel, Generic[T]):
     success: bool
-    data: Optional[Any] = None
+    data: Optional[T] = None
     error: Optional[str] = None
 
 # Skema untuk pengguna
@@ -21,6 +30,17 @@ class UserCreate(BaseModel):
     date_of_birth: Optional[date] = None
     place_of_birth: Optional[str] = None
 
+    @validator('username', 'email')
+    def normalize_identifiers(cls, v):
+        return normalize_identifier(v)
+
+    @validator('role')
+    def reject_admin_role(cls, v):
+        # Dipakai /register (hanya dijaga token statis) dan provisioning massal
+        if v.strip().lower() == ADMIN_ROLE:
+            raise ValueError("Role admin tidak dapat didaftarkan, gunakan python -m app.roles")
+        return v
+
     class Config:
         from_attributes = True  # Untuk Pydantic v2
 
@@ -37,6 +57,71 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AvailabilityResponse(BaseModel):
+    username_available: Optional[bool] = None
+    email_available: Optional[bool] = None
+
+# Skema untuk provisioning pengguna massal (admin)
+class ProvisionConflict(BaseModel):
+    index: int  # Posisi record di berkas masukan (mulai dari 0)
+    username: Optional[str] = None
+    email: Optional[str] = None
+    reason: str
+
+class BulkProvisionResponse(BaseModel):
+    created: int
+    rejected: int
+    batches: int
+    users: List[UserResponse]
+    conflicts: List[ProvisionConflict]
+
+# Skema untuk direktori pengguna (admin)
+class UserDirectoryResponse(BaseModel):
+    users: List[UserResponse]
+    next_after_id: Optional[int] = None  # Kirim sebagai after_id untuk halaman berikutnya
+
+class GroupCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+class UserAggregatesResponse(BaseModel):
+    role: List[GroupCount] = []
+    disease: List[GroupCount] = []
+
+# Skema untuk metrik cache (admin)
+class CacheStats(BaseModel):
+    name: str
+    policy: str
+    entries: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    hit_rate: Optional[float] = None
+
+class InvalidationStats(BaseModel):
+    backend: str
+    published: int
+    received: int
+    errors: int
+    delay_p50_ms: Optional[float] = None  # Delay propagasi event dari worker lain
+    delay_p99_ms: Optional[float] = None
+    delay_max_ms: Optional[float] = None
+
+class SingleFlightStats(BaseModel):
+    name: str
+    leaders: int  # Pemanggil yang benar-benar menjalankan query
+    shared: int  # Pemanggil yang menerima hasil pemanggil lain
+    in_flight: int
+
+class MetricsResponse(BaseModel):
+    caches: List[CacheStats]
+    invalidation: Optional[InvalidationStats] = None
+    single_flight: List[SingleFlightStats] = []
+
 # Skema untuk login
 class LoginRequest(BaseModel):
     identifier: str = Field(..., description="Username atau Email pengguna")
@@ -109,10 +194,66 @@ class DataEntryResponse(BaseModel):
     int_field7: int
     int_field8: int
     owner_id: int
+    version: int = 1
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Skema untuk sinkronisasi delta
+class DataEntrySyncResponse(DataEntryResponse):
+    change_seq: int
+
+class DataEntryTombstoneResponse(BaseModel):
+    entry_id: int
+    change_seq: int
+    deleted_at: Optional[datetime]
 
     class Config:
         from_attributes = True
 
+class DataEntryChangesResponse(BaseModel):
+    upserts: List[DataEntrySyncResponse]
+    deletes: List[DataEntryTombstoneResponse]
+    next_cursor: str  # "change_seq:jenis:id", dikirim kembali apa adanya
+    has_more: bool
+
+# Skema untuk statistik data entry
+class HistogramBucket(BaseModel):
+    lower: int
+    upper: int
+    count: int
+
+class FieldStats(BaseModel):
+    sum: int
+    mean: Optional[float]
+    min: Optional[int]
+    max: Optional[int]
+    histogram: List[HistogramBucket]
+
+class DataEntryStatsResponse(BaseModel):
+    count: int
+    fields: Dict[str, FieldStats]
+    top_field: str
+    top: List[DataEntryResponse]
+
+class DataEntryAnalyticsResponse(BaseModel):
+    count: int
+    fields: List[str]  # Urutan baris/kolom pada matriks
+    mean: List[Optional[float]]
+    covariance: Optional[List[List[Optional[float]]]]
+    correlation: Optional[List[List[Optional[float]]]]
+    quantiles: Dict[str, Dict[str, float]]
+
+class SearchHit(BaseModel):
+    score: float
+    entry: DataEntryResponse
+
+class DataEntrySearchResponse(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
 # Skema untuk log aktivitas
 class ActivityLogCreate(BaseModel):
     action: str
@@ -135,6 +276,10 @@ class UserProfileUpdate(BaseModel):
     date_of_birth: Optional[date] = Field(None, description="Tanggal lahir pengguna")
     place_of_birth: Optional[str] = Field(None, description="Tempat lahir pengguna")
     
+    @validator('email')
+    def normalize_email(cls, v):
+        return normalize_identifier(v) if v is not None else v
+
     @validator('password')
     def password_strength(cls, v):
         if v is not None and len(v) < 6:
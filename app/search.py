@@ -0,0 +1,227 @@
+# app/search.py
+
+"""
+Pencarian substring/fuzzy pada string_field1..3 milik satu pengguna.
+
+PostgreSQL memakai indeks GIN pg_trgm pada (owner_id, dokumen) yang dibuat
+oleh app/migrations.py. Dialect lain (SQLite untuk pengujian) memakai indeks
+trigram di dalam proses yang dibangun per pemilik saat pertama kali dicari
+dan diperbarui dari endpoint tulis.
+
+Peringkat berupa integer per mil (0..1000) agar kursor keyset (peringkat, id)
+bisa dibandingkan secara eksak.
+"""
+
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import Integer, cast, func, literal, literal_column, or_, and_, select
+from sqlalchemy.orm import Session
+
+from . import cache as caches
+from .models import DataEntry, DATA_ENTRY_STRING_FIELDS
+
+MIN_QUERY_LENGTH = 3
+# Batas memori indeks trigram di dalam proses (semua pemilik, LRU per pemilik)
+INDEX_CACHE_MAX_BYTES = int(os.getenv("SEARCH_INDEX_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Sama dengan pg_trgm.word_similarity_threshold bawaan
+SIMILARITY_THRESHOLD = 0.6
+
+SearchResult = Tuple[List[Tuple[int, DataEntry]], Optional[str]]
+
+
+def _use_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _document_expression():
+    # Harus identik dengan ekspresi indeks di migrasi (|| bersifat IMMUTABLE, concat_ws tidak)
+    space = literal_column("' '")
+    return func.lower(
+        DataEntry.string_field1.op("||")(space).op("||")(DataEntry.string_field2)
+        .op("||")(space).op("||")(DataEntry.string_field3)
+    )
+
+
+def document_of(string_field1: str, string_field2: str, string_field3: str) -> str:
+    return f"{string_field1} {string_field2} {string_field3}".lower()
+
+
+def encode_cursor(rank: int, entry_id: int) -> str:
+    return f"{rank}:{entry_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        rank, entry_id = cursor.split(":")
+        return int(rank), int(entry_id)
+    except ValueError:
+        raise ValueError("Kursor pencarian tidak valid")
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigram gaya pg_trgm: per kata, dengan dua spasi di depan dan satu di belakang."""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """Indeks terbalik trigram untuk data entry milik satu pengguna."""
+
+    def __init__(self):
+        self.documents: Dict[int, str] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        self.lock = threading.Lock()
+
+    def add(self, entry_id: int, document: str) -> None:
+        with self.lock:
+            self._remove(entry_id)
+            self.documents[entry_id] = document
+            for gram in trigrams(document):
+                self.postings.setdefault(gram, set()).add(entry_id)
+
+    def remove(self, entry_id: int) -> None:
+        with self.lock:
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int) -> None:
+        document = self.documents.pop(entry_id, None)
+        if document is None:
+            return
+        for gram in trigrams(document):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self.postings[gram]
+
+    def estimated_size(self) -> int:
+        """Perkiraan kasar byte: teks dokumen plus overhead slot dict/set per id."""
+        with self.lock:
+            postings = sum(len(ids) for ids in self.postings.values())
+            return sum(len(document) + 100 for document in self.documents.values()) + 40 * postings
+
+    def search(self, query: str) -> List[Tuple[int, int]]:
+        """Mengembalikan (peringkat, id) untuk semua dokumen yang cocok."""
+        query_grams = trigrams(query)
+        with self.lock:
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self.postings.get(gram, ()))
+            hits = []
+            for entry_id, count in shared.items():
+                if query in self.documents[entry_id]:
+                    score = 1.0
+                else:
+                    score = count / len(query_grams)
+                    if score < SIMILARITY_THRESHOLD:
+                        continue
+                hits.append((int(score * 1000), entry_id))
+        return hits
+
+
+_indexes = caches.create(
+    "search_indexes", INDEX_CACHE_MAX_BYTES, policy=caches.LRU,
+    sizeof=lambda index: index.estimated_size(),
+)
+
+
+def _index_for(db: Session, owner_id: int) -> TrigramIndex:
+    index = _indexes.get(owner_id)
+    if index is not None:
+        return index
+    index = TrigramIndex()
+    rows = db.execute(
+        select(DataEntry.id, *[getattr(DataEntry, f) for f in DATA_ENTRY_STRING_FIELDS])
+        .where(DataEntry.owner_id == owner_id)
+    )
+    for entry_id, s1, s2, s3 in rows:
+        index.add(entry_id, document_of(s1, s2, s3))
+    # Ukuran dihitung saat dibangun; pembaruan dari endpoint tulis tidak menghitung ulang
+    _indexes.put(owner_id, index)
+    return index
+
+
+def on_entry_saved(db: Session, entry: DataEntry) -> None:
+    """Dipanggil setelah commit create/update; hanya relevan untuk indeks di dalam proses."""
+    if _use_postgres(db):
+        return
+    index = _indexes.peek(entry.owner_id)
+    if index is not None:
+        index.add(entry.id, document_of(entry.string_field1, entry.string_field2, entry.string_field3))
+
+
+def on_entry_deleted(db: Session, owner_id: int, entry_id: int) -> None:
+    if _use_postgres(db):
+        return
+    index = _indexes.peek(owner_id)
+    if index is not None:
+        index.remove(entry_id)
+
+
+@caches.on_invalidate(caches.DATA_ENTRY, remote_only=True)
+def _invalidate_remote(owner_id: int, entry_id: Optional[int]) -> None:
+    # Penulisan di worker lain tidak memperbarui indeks di proses ini: bangun ulang saat dicari
+    _indexes.pop(owner_id)
+
+
+def _search_postgres(db: Session, owner_id: int, query: str, limit: int, after) -> List[Tuple[int, DataEntry]]:
+    document = _document_expression()
+    rank = cast(func.word_similarity(query, document) * 1000, Integer)
+    stmt = (
+        select(DataEntry, rank.label("rank"))
+        .where(
+            DataEntry.owner_id == owner_id,
+            or_(document.contains(query, autoescape=True), literal(query).op("<%")(document)),
+        )
+        .order_by(rank.desc(), DataEntry.id.asc())
+        .limit(limit)
+    )
+    if after is not None:
+        last_rank, last_id = after
+        stmt = stmt.where(or_(rank < last_rank, and_(rank == last_rank, DataEntry.id > last_id)))
+    return [(row.rank, row.DataEntry) for row in db.execute(stmt)]
+
+
+def _search_in_process(db: Session, owner_id: int, query: str, limit: int, after) -> List[Tuple[int, DataEntry]]:
+    hits = sorted(_index_for(db, owner_id).search(query), key=lambda hit: (-hit[0], hit[1]))
+    if after is not None:
+        hits = [hit for hit in hits if (-hit[0], hit[1]) > (-after[0], after[1])]
+    hits = hits[:limit]
+    if not hits:
+        return []
+    entries = {
+        entry.id: entry
+        for entry in db.query(DataEntry).filter(
+            DataEntry.owner_id == owner_id,
+            DataEntry.id.in_([entry_id for _, entry_id in hits]),
+        )
+    }
+    return [(rank, entries[entry_id]) for rank, entry_id in hits if entry_id in entries]
+
+
+def search_entries(
+    db: Session,
+    owner_id: int,
+    query: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> SearchResult:
+    query = query.strip().lower()
+    if len(query) < MIN_QUERY_LENGTH:
+        raise ValueError(f"Kata kunci minimal {MIN_QUERY_LENGTH} karakter")
+    after = decode_cursor(cursor) if cursor else None
+
+    run = _search_postgres if _use_postgres(db) else _search_in_process
+    hits = run(db, owner_id, query, limit + 1, after)
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        rank, entry = hits[-1]
+        next_cursor = encode_cursor(rank, entry.id)
+    return hits, next_cursor
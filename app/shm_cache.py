@@ -0,0 +1,355 @@
+# app/shm_cache.py
+
+"""
+Cache bersama antar worker dalam satu host: tabel hash berukuran tetap pada
+berkas yang di-mmap (sebaiknya di /dev/shm), aktif jika SHM_CACHE_PATH diset.
+
+Tata letak: header 64 byte, lalu SHM_CACHE_BUCKETS bucket. Setiap bucket
+berisi penghitung urutan (seqlock) 8 byte dan SHM_CACHE_WAYS slot berukuran
+SHM_CACHE_SLOT_SIZE byte. Kunci di-hash dengan blake2b (sama di semua
+proses) ke satu bucket dan boleh menempati slot mana pun di bucket itu;
+bucket penuh membuang slot yang paling dekat kedaluwarsa.
+
+- Pembaca tidak mengambil lock: bucket disalin, lalu diulang jika
+  penghitungnya ganjil (sedang ditulis) atau berubah selama penyalinan.
+- Penulis memegang flock eksklusif pada berkas (dan lock thread di dalam
+  proses), membuat penghitung ganjil, menulis slot, lalu membuatnya genap.
+- Entri berversi: put() tidak menimpa versi yang lebih baru, dan
+  put(token=...) hanya berhasil jika bucket tidak berubah sejak lookup() yang
+  memberi token itu. invalidate() selalu menaikkan penghitung bucket, juga
+  jika kuncinya tidak ada, sehingga pengisian dari data yang dibaca sebelum
+  invalidasi tidak pernah tersimpan.
+- Entri kedaluwarsa setelah SHM_CACHE_TTL detik (bawaan 60), batas atas
+  staleness untuk penulisan yang ditangani host lain.
+
+Di atas tabel ini: pencarian pengguna untuk auth.get_current_user dan bytes
+respons GET /users/me/.
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from . import cache as caches
+from .models import User
+from .response_cache import CachedResponse, Variant
+from .schemas import normalize_identifier
+
+PATH = os.getenv("SHM_CACHE_PATH")
+BUCKETS = int(os.getenv("SHM_CACHE_BUCKETS", 4096))
+WAYS = int(os.getenv("SHM_CACHE_WAYS", 4))
+SLOT_SIZE = int(os.getenv("SHM_CACHE_SLOT_SIZE", 512))
+TTL = float(os.getenv("SHM_CACHE_TTL", 60))
+
+MAGIC = b"SHMCACH1"
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sIII")  # magic, jumlah bucket, slot per bucket, ukuran slot
+_SEQ = struct.Struct("<Q")
+# hash kunci (0 = kosong), kedaluwarsa (time.monotonic, sama untuk semua proses di host), versi, panjang kunci, panjang nilai
+_SLOT = struct.Struct("<QdQHI2x")
+SLOT_HEADER_SIZE = _SLOT.size
+_EMPTY_SLOT = bytes(SLOT_HEADER_SIZE)
+# Penghitung yang tetap ganjil berarti penulis mati di tengah penulisan: anggap miss
+READ_RETRIES = 64
+
+
+class Lookup(NamedTuple):
+    value: Optional[bytes]
+    version: int
+    token: Optional[int]
+
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedCache:
+    def __init__(self, path: str, buckets: int = BUCKETS, ways: int = WAYS, slot_size: int = SLOT_SIZE, ttl: float = TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size and header.startswith(MAGIC):
+                # Geometri mengikuti berkas yang sudah dibuat worker lain
+                _, buckets, ways, slot_size = _HEADER.unpack(header)
+            expected = HEADER_SIZE + buckets * (_SEQ.size + ways * slot_size)
+            if not header.startswith(MAGIC) or os.fstat(self._fd).st_size != expected:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, expected)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, buckets, ways, slot_size), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.buckets = buckets
+        self.ways = ways
+        self.slot_size = slot_size
+        self.bucket_size = _SEQ.size + ways * slot_size
+        self.size = HEADER_SIZE + buckets * self.bucket_size
+        self._map = mmap.mmap(self._fd, self.size)
+        # Statistik per worker
+        self.name = "shm"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _offset(self, key_hash: int) -> int:
+        return HEADER_SIZE + (key_hash % self.buckets) * self.bucket_size
+
+    def _read_bucket(self, offset: int) -> Tuple[Optional[int], Optional[bytes]]:
+        mm = self._map
+        for _ in range(READ_RETRIES):
+            seq = _SEQ.unpack_from(mm, offset)[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            data = mm[offset + _SEQ.size:offset + self.bucket_size]
+            if _SEQ.unpack_from(mm, offset)[0] == seq:
+                return seq, data
+        return None, None
+
+    def _find(self, data: bytes, key_hash: int, key: bytes) -> Optional[Tuple[int, float, int, bytes]]:
+        """(indeks slot, kedaluwarsa, versi, nilai) untuk kunci ini, atau None."""
+        for index in range(self.ways):
+            start = index * self.slot_size
+            slot_hash, expires_at, version, key_length, value_length = _SLOT.unpack_from(data, start)
+            if slot_hash != key_hash:
+                continue
+            key_start = start + SLOT_HEADER_SIZE
+            if data[key_start:key_start + key_length] != key:
+                continue
+            value_start = key_start + key_length
+            return index, expires_at, version, data[value_start:value_start + value_length]
+        return None
+
+    def lookup(self, key: bytes) -> Lookup:
+        key_hash = _hash(key)
+        token, data = self._read_bucket(self._offset(key_hash))
+        found = self._find(data, key_hash, key) if data is not None else None
+        if found is None or found[1] <= time.monotonic():
+            if found is not None:
+                self.expirations += 1
+            self.misses += 1
+            return Lookup(None, 0, token)
+        self.hits += 1
+        return Lookup(found[3], found[2], token)
+
+    def get(self, key: bytes, version: Optional[int] = None) -> Optional[bytes]:
+        found = self.lookup(key)
+        if found.value is None or (version is not None and found.version != version):
+            return None
+        return found.value
+
+    def put(self, key: bytes, value: bytes, version: int = 0, token: Optional[int] = None) -> bool:
+        """False jika tidak disimpan: terlalu besar, versi lebih baru sudah ada, atau token basi."""
+        if SLOT_HEADER_SIZE + len(key) + len(value) > self.slot_size:
+            return False
+        key_hash = _hash(key)
+        now = time.monotonic()
+        slot = _SLOT.pack(key_hash, now + self.ttl, version, len(key), len(value)) + key + value
+
+        def choose(data: bytes) -> Optional[Tuple[int, bytes]]:
+            found = self._find(data, key_hash, key)
+            if found is not None:
+                return None if found[2] > version and found[1] > now else (found[0], slot)
+            victim, victim_expires = 0, None
+            for index in range(self.ways):
+                slot_hash, expires_at = _SLOT.unpack_from(data, index * self.slot_size)[:2]
+                if slot_hash == 0 or expires_at <= now:
+                    return index, slot
+                if victim_expires is None or expires_at < victim_expires:
+                    victim, victim_expires = index, expires_at
+            self.evictions += 1
+            return victim, slot
+
+        return self._write(self._offset(key_hash), choose, token)
+
+    def invalidate(self, key: bytes) -> None:
+        key_hash = _hash(key)
+
+        def clear(data: bytes) -> Optional[Tuple[int, bytes]]:
+            found = self._find(data, key_hash, key)
+            if found is None:
+                return None
+            self.invalidations += 1
+            return found[0], _EMPTY_SLOT
+
+        self._write(self._offset(key_hash), clear)
+
+    def _write(self, offset: int, change: Callable[[bytes], Optional[Tuple[int, bytes]]], token: Optional[int] = None) -> bool:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                mm = self._map
+                seq = _SEQ.unpack_from(mm, offset)[0]
+                if token is not None and seq != token:
+                    return False
+                update = change(mm[offset + _SEQ.size:offset + self.bucket_size])
+                # Penghitung ganjil sisa penulis yang mati: lanjutkan dari nilai itu
+                start = seq if seq & 1 else seq + 1
+                _SEQ.pack_into(mm, offset, start)
+                if update is not None:
+                    index, slot = update
+                    slot_offset = offset + _SEQ.size + index * self.slot_size
+                    mm[slot_offset:slot_offset + len(slot)] = slot
+                _SEQ.pack_into(mm, offset, start + 1)
+                return update is not None
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def clear(self) -> None:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for bucket in range(self.buckets):
+                    offset = HEADER_SIZE + bucket * self.bucket_size
+                    seq = _SEQ.unpack_from(self._map, offset)[0]
+                    start = seq if seq & 1 else seq + 1
+                    _SEQ.pack_into(self._map, offset, start)
+                    self._map[offset + _SEQ.size:offset + self.bucket_size] = bytes(self.bucket_size - _SEQ.size)
+                    _SEQ.pack_into(self._map, offset, start + 1)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        """Jumlah entri dan byte dihitung dari seluruh tabel (bersama); hit/miss per worker."""
+        entries = used = 0
+        now = time.monotonic()
+        for bucket in range(self.buckets):
+            _, data = self._read_bucket(HEADER_SIZE + bucket * self.bucket_size)
+            if data is None:
+                continue
+            for index in range(self.ways):
+                slot_hash, expires_at, _, key_length, value_length = _SLOT.unpack_from(data, index * self.slot_size)
+                if slot_hash and expires_at > now:
+                    entries += 1
+                    used += SLOT_HEADER_SIZE + key_length + value_length
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "policy": "shm",
+            "entries": entries,
+            "bytes": used,
+            "max_bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+shared: Optional[SharedCache] = SharedCache(PATH) if PATH else None
+if shared is not None:
+    caches.register(shared)
+
+_USER_FIELDS = ("id", "name", "username", "email", "role", "disease", "date_of_birth", "place_of_birth",
+                "data_version", "version")
+
+
+def _identifier_key(identifier: str) -> bytes:
+    return b"i:" + identifier.encode("utf-8")
+
+
+def _user_key(user_id: int) -> bytes:
+    return b"u:%d" % user_id
+
+
+def _user_version(user: User) -> int:
+    # Keduanya hanya naik, jadi jumlahnya naik pada setiap perubahan
+    return user.version + user.data_version
+
+
+def _encode_user(user: User) -> bytes:
+    record = {name: getattr(user, name) for name in _USER_FIELDS}
+    if record["date_of_birth"] is not None:
+        record["date_of_birth"] = record["date_of_birth"].isoformat()
+    return json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_user(data: bytes) -> User:
+    record = json.loads(data)
+    if record["date_of_birth"] is not None:
+        record["date_of_birth"] = date.fromisoformat(record["date_of_birth"])
+    # Objek transient tanpa hashed_password; hanya untuk dibaca
+    return User(**record)
+
+
+def get_user(identifier: str, load: Callable[[], Optional[User]]) -> Optional[User]:
+    """
+    Pengguna untuk identifier (username/email) dari cache bersama, atau dari
+    load(). Pemetaan identifier -> id diisi pada permintaan pertama; rekaman
+    pengguna diisi pada permintaan berikutnya dengan token dari lookup-nya
+    sendiri, sehingga invalidasi yang terjadi selama load() tidak terlewat.
+    """
+    if shared is None:
+        return load()
+    identifier = normalize_identifier(identifier)
+    identifier_key = _identifier_key(identifier)
+    mapped = shared.get(identifier_key)
+    if mapped is None:
+        user = load()
+        if user is not None:
+            shared.put(identifier_key, b"%d" % user.id)
+        return user
+
+    user_id = int(mapped)
+    found = shared.lookup(_user_key(user_id))
+    if found.value is not None:
+        user = _decode_user(found.value)
+        # Email bisa berubah: rekaman lama tidak boleh melayani identifier lama
+        if identifier in (user.username.lower(), user.email.lower()):
+            return user
+    user = load()
+    if user is None:
+        return None
+    if user.id == user_id:
+        shared.put(_user_key(user_id), _encode_user(user), _user_version(user), token=found.token)
+    else:
+        shared.put(identifier_key, b"%d" % user.id)
+    return user
+
+
+def _response_key(user_id: int, variant: Variant) -> bytes:
+    digest = hashlib.blake2b(repr(variant).encode(), digest_size=8).hexdigest()
+    return b"me:%d:%s" % (user_id, digest.encode())
+
+
+def get_response(user_id: int, variant: Variant, version: int) -> Optional[CachedResponse]:
+    """Bytes respons /users/me/ untuk versi profil ini yang disimpan worker mana pun."""
+    if shared is None:
+        return None
+    data = shared.get(_response_key(user_id, variant), version)
+    if data is None:
+        return None
+    media_length, etag_length = struct.unpack_from("<HH", data)
+    media_type = data[4:4 + media_length].decode()
+    etag = data[4 + media_length:4 + media_length + etag_length].decode()
+    return CachedResponse(version, etag, data[4 + media_length + etag_length:], media_type)
+
+
+def put_response(user_id: int, variant: Variant, cached: CachedResponse) -> None:
+    if shared is None:
+        return
+    media_type, etag = cached.media_type.encode(), cached.etag.encode()
+    data = struct.pack("<HH", len(media_type), len(etag)) + media_type + etag + cached.body
+    shared.put(_response_key(user_id, variant), data, cached.version)
+
+
+@caches.on_invalidate(caches.USER)
+@caches.on_invalidate(caches.DATA_ENTRY)
+def _invalidate_user(user_id: int, entity_id: Optional[int]) -> None:
+    # Penulisan data entry menaikkan users.data_version
+    if shared is not None:
+        shared.invalidate(_user_key(user_id))
@@ -0,0 +1,156 @@
+# app/singleflight.py
+
+"""
+Penggabungan bacaan identik yang berjalan bersamaan (single-flight).
+
+Pemanggil pertama untuk sebuah kunci menjalankan fungsinya; pemanggil lain
+dengan kunci yang sama yang datang sebelum fungsi itu selesai menunggu dan
+menerima hasil (atau exception) yang sama. Ini bukan cache: kunci dilepas
+begitu pemanggil pertama selesai.
+
+SingleFlight dipakai handler dan dependency sinkron yang berjalan di
+threadpool; AsyncSingleFlight untuk handler async di event loop (penunggu
+tidak memblokir loop). Kunci sebaiknya memuat versi data (mis.
+users.data_version) agar permintaan yang datang setelah sebuah penulisan
+tidak menerima hasil lama. Instance dibuat lewat create()/create_async() agar
+penghitungnya muncul di all_stats() (endpoint /admin/metrics).
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple, Union
+
+
+def make_key(user_id: int, route: str, **params) -> Tuple:
+    """
+    Kunci (pengguna, route, parameter ternormalisasi). Parameter diurutkan per
+    nama; nilai list menjadi tuple terurut karena urutannya tidak mengubah
+    hasil (mis. filter yang digabung dengan AND).
+    """
+    normalized = tuple(
+        (name, tuple(sorted(value)) if isinstance(value, list) else value)
+        for name, value in sorted(params.items())
+    )
+    return user_id, route, normalized
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(hasil, shared); shared True jika hasilnya dari pemanggil lain."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """Padanan SingleFlight untuk coroutine; hanya dipakai dari satu event loop."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(hasil, shared); pembatalan pemanggil pertama tidak menelantarkan penunggu."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            try:
+                # shield: pembatalan satu penunggu tidak membatalkan future bersama
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # Pemanggil pertama dibatalkan: penunggu pertama yang bangun menjadi pemanggil pertama baru
+            return await self.do(key, fn)
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Tandai sudah diambil agar tidak ada peringatan jika tidak ada penunggu
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result, False
+
+    def stats(self) -> dict:
+        return {"name": self.name, "leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+_flights: Dict[str, Union[SingleFlight, AsyncSingleFlight]] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(flight):
+    with _registry_lock:
+        if flight.name in _flights:
+            raise ValueError(f"SingleFlight {flight.name} sudah terdaftar")
+        _flights[flight.name] = flight
+    return flight
+
+
+def create(name: str) -> SingleFlight:
+    """Membuat dan mendaftarkan SingleFlight; nama harus unik per proses."""
+    return _register(SingleFlight(name))
+
+
+def create_async(name: str) -> AsyncSingleFlight:
+    return _register(AsyncSingleFlight(name))
+
+
+def all_stats() -> List[dict]:
+    with _registry_lock:
+        flights = list(_flights.values())
+    return [flight.stats() for flight in flights]
@@ -0,0 +1,244 @@
+# app/stats_service.py
+
+from collections import Counter
+from typing import Dict, List, Mapping, Optional
+
+from sqlalchemy import case, delete, exists, false, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import columnar
+from .database import dialect_insert
+from .models import DataEntry, DataEntryFieldStat, DataEntryHistogramBin, DATA_ENTRY_INT_FIELDS
+from .schemas import DataEntryStatsResponse, DataEntryResponse, FieldStats, HistogramBucket
+
+_stats = DataEntryFieldStat.__table__
+_bins = DataEntryHistogramBin.__table__
+
+
+def bucket_of(value: int) -> int:
+    """
+    Bucket log2 bertanda: 0 untuk nilai 0, k untuk 2^(k-1) <= v < 2^k,
+    dan -k untuk nilai negatif yang simetris.
+    """
+    if value >= 0:
+        return value.bit_length()
+    return -(-value).bit_length()
+
+
+def bucket_bounds(bucket: int):
+    if bucket == 0:
+        return 0, 0
+    magnitude = abs(bucket)
+    lower, upper = 1 << (magnitude - 1), (1 << magnitude) - 1
+    if bucket > 0:
+        return lower, upper
+    return -upper, -lower
+
+
+def _apply(
+    db: Session,
+    owner_id: int,
+    count_delta: int,
+    removed: Optional[Mapping[str, int]],
+    added: Optional[Mapping[str, int]],
+) -> None:
+    """
+    Menerapkan delta satu baris ke ringkasan dalam dua upsert (statistik dan
+    histogram). Nilai yang dihapus dan sama dengan min/max saat ini menandai
+    field tersebut `stale`; min/max dihitung ulang lewat indeks saat dibaca.
+    """
+    stat_rows = []
+    bin_deltas: Counter = Counter()
+    for field in DATA_ENTRY_INT_FIELDS:
+        new = added[field] if added else None
+        old = removed[field] if removed else None
+        stat_rows.append({
+            "user_id": owner_id,
+            "field": field,
+            "entry_count": count_delta,
+            "total": (new or 0) - (old or 0),
+            "min_value": new,
+            "max_value": new,
+            "stale": False,
+        })
+        if new is not None:
+            bin_deltas[(field, bucket_of(new))] += 1
+        if old is not None:
+            bin_deltas[(field, bucket_of(old))] -= 1
+
+    stmt = dialect_insert(db.get_bind(), _stats).values(stat_rows)
+    excluded = stmt.excluded
+    stale = _stats.c.stale
+    if removed:
+        # Hanya field yang nilainya benar-benar berubah yang bisa membuat min/max usang
+        conditions = [
+            (_stats.c.field == field,
+             or_(_stats.c.min_value == removed[field], _stats.c.max_value == removed[field]))
+            for field in DATA_ENTRY_INT_FIELDS
+            if not added or added[field] != removed[field]
+        ]
+        if conditions:
+            stale = or_(stale, case(*conditions, else_=false()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_stats.c.user_id, _stats.c.field],
+        set_={
+            "entry_count": _stats.c.entry_count + excluded.entry_count,
+            "total": _stats.c.total + excluded.total,
+            "min_value": case(
+                (excluded.min_value.is_(None), _stats.c.min_value),
+                (or_(_stats.c.min_value.is_(None), excluded.min_value < _stats.c.min_value), excluded.min_value),
+                else_=_stats.c.min_value,
+            ),
+            "max_value": case(
+                (excluded.max_value.is_(None), _stats.c.max_value),
+                (or_(_stats.c.max_value.is_(None), excluded.max_value > _stats.c.max_value), excluded.max_value),
+                else_=_stats.c.max_value,
+            ),
+            "stale": stale,
+        },
+    )
+    db.execute(stmt)
+
+    bin_rows = [
+        {"user_id": owner_id, "field": field, "bucket": bucket, "count": delta}
+        for (field, bucket), delta in bin_deltas.items()
+        if delta
+    ]
+    if bin_rows:
+        stmt = dialect_insert(db.get_bind(), _bins).values(bin_rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_bins.c.user_id, _bins.c.field, _bins.c.bucket],
+            set_={"count": _bins.c.count + stmt.excluded.count},
+        )
+        db.execute(stmt)
+
+
+def record_insert(db: Session, owner_id: int, values: Mapping[str, int]) -> None:
+    _apply(db, owner_id, 1, None, values)
+
+
+def record_update(db: Session, owner_id: int, old: Mapping[str, int], new: Mapping[str, int]) -> None:
+    if any(old[field] != new[field] for field in DATA_ENTRY_INT_FIELDS):
+        _apply(db, owner_id, 0, old, new)
+
+
+def record_delete(db: Session, owner_id: int, values: Mapping[str, int]) -> None:
+    _apply(db, owner_id, -1, values, None)
+
+
+def recompute(db: Session, owner_id: int) -> None:
+    """
+    Menghitung ulang ringkasan dari tabel data_entries (mahal, O(jumlah entry)).
+    Hanya dipanggil atas permintaan atau saat terdeteksi drift.
+    """
+    n, ints, _ = columnar.load_columns(db, owner_id, int_fields=DATA_ENTRY_INT_FIELDS)
+    db.execute(delete(_stats).where(_stats.c.user_id == owner_id))
+    db.execute(delete(_bins).where(_bins.c.user_id == owner_id))
+    stat_rows, bin_rows = [], []
+    for field in DATA_ENTRY_INT_FIELDS:
+        values = ints[field]
+        stat_rows.append({
+            "user_id": owner_id,
+            "field": field,
+            "entry_count": n,
+            "total": sum(values),
+            "min_value": min(values) if n else None,
+            "max_value": max(values) if n else None,
+            "stale": False,
+        })
+        for bucket, count in Counter(map(bucket_of, values)).items():
+            bin_rows.append({"user_id": owner_id, "field": field, "bucket": bucket, "count": count})
+    db.execute(_stats.insert(), stat_rows)
+    if bin_rows:
+        db.execute(_bins.insert(), bin_rows)
+    db.commit()
+
+
+def _refresh_stale_bounds(db: Session, owner_id: int, rows: List[DataEntryFieldStat]) -> None:
+    stale_rows = [row for row in rows if row.stale]
+    if not stale_rows:
+        return
+    for row in stale_rows:
+        # MIN/MAX dijawab oleh indeks (owner_id, int_fieldN); subquery di dalam
+        # UPDATE agar tidak ada penulisan lain yang tertimpa di antaranya
+        column = getattr(DataEntry, row.field)
+        scope = select(DataEntry.id).where(DataEntry.owner_id == owner_id)
+        db.execute(
+            update(_stats)
+            .where(_stats.c.user_id == owner_id, _stats.c.field == row.field)
+            .values(
+                min_value=scope.with_only_columns(func.min(column)).scalar_subquery(),
+                max_value=scope.with_only_columns(func.max(column)).scalar_subquery(),
+                stale=False,
+            )
+        )
+    db.commit()
+    for row in stale_rows:
+        db.refresh(row)
+
+
+def _has_drift(db: Session, owner_id: int, rows: List[DataEntryFieldStat], bins: List[DataEntryHistogramBin]) -> bool:
+    if not rows:
+        # Belum ada ringkasan: hanya drift jika pengguna sudah punya entry
+        return db.execute(select(exists().where(DataEntry.owner_id == owner_id))).scalar()
+    counts = {row.entry_count for row in rows}
+    return (
+        len(rows) != len(DATA_ENTRY_INT_FIELDS)
+        or len(counts) != 1
+        or min(counts) < 0
+        or any(b.count < 0 for b in bins)
+    )
+
+
+def get_stats(
+    db: Session,
+    owner_id: int,
+    top_field: str = "int_field1",
+    top_k: int = 10,
+    descending: bool = True,
+    force_recompute: bool = False,
+) -> DataEntryStatsResponse:
+    def load():
+        rows = db.query(DataEntryFieldStat).filter(DataEntryFieldStat.user_id == owner_id).all()
+        bins = db.query(DataEntryHistogramBin).filter(
+            DataEntryHistogramBin.user_id == owner_id,
+            DataEntryHistogramBin.count != 0,
+        ).all()
+        return rows, bins
+
+    rows, bins = load()
+    if force_recompute or _has_drift(db, owner_id, rows, bins):
+        recompute(db, owner_id)
+        rows, bins = load()
+    _refresh_stale_bounds(db, owner_id, rows)
+
+    histograms: Dict[str, List[HistogramBucket]] = {field: [] for field in DATA_ENTRY_INT_FIELDS}
+    for b in sorted(bins, key=lambda b: b.bucket):
+        lower, upper = bucket_bounds(b.bucket)
+        histograms[b.field].append(HistogramBucket(lower=lower, upper=upper, count=b.count))
+
+    count = rows[0].entry_count if rows else 0
+    by_field = {row.field: row for row in rows}
+    fields = {}
+    for field in DATA_ENTRY_INT_FIELDS:
+        row = by_field.get(field)
+        total = row.total if row else 0
+        fields[field] = FieldStats(
+            sum=total,
+            mean=total / count if count else None,
+            min=row.min_value if row else None,
+            max=row.max_value if row else None,
+            histogram=histograms[field],
+        )
+
+    # Top-K memakai indeks (owner_id, top_field) sehingga tidak bergantung jumlah entry
+    column = getattr(DataEntry, top_field)
+    order = [column.desc(), DataEntry.id.desc()] if descending else [column.asc(), DataEntry.id.asc()]
+    top = db.query(DataEntry).filter(DataEntry.owner_id == owner_id).order_by(*order).limit(top_k).all()
+
+    return DataEntryStatsResponse(
+        count=count,
+        fields=fields,
+        top_field=top_field,
+        top=[DataEntryResponse.from_orm(entry) for entry in top],
+    )
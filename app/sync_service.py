@@ -0,0 +1,87 @@
+# app/sync_service.py
+
+import heapq
+from typing import Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from .models import DataEntry, DataEntryTombstone
+from .schemas import DataEntryChangesResponse, DataEntrySyncResponse, DataEntryTombstoneResponse
+
+# Perubahan diurutkan berdasarkan (change_seq, jenis, id): banyak baris bisa
+# berbagi change_seq (backfill migrasi, penggabungan pengguna), jadi kursor
+# harus menyimpan posisi di dalam satu change_seq juga
+KIND_ENTRY = 0
+KIND_TOMBSTONE = 1
+
+Cursor = Tuple[int, int, Optional[int]]  # (change_seq, jenis, id)
+
+
+def encode_cursor(change_seq: int, kind: int, row_id: int) -> str:
+    return f"{change_seq}:{kind}:{row_id}"
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    Kursor lama berupa change_seq saja (mis. "0") berarti setelah semua baris
+    dengan change_seq tersebut.
+    """
+    try:
+        parts = [int(part) for part in cursor.split(":")]
+    except ValueError:
+        raise ValueError("Kursor sinkronisasi tidak valid")
+    if len(parts) == 1 and parts[0] >= 0:
+        return parts[0], KIND_TOMBSTONE, None
+    if len(parts) == 3 and parts[1] in (KIND_ENTRY, KIND_TOMBSTONE):
+        return parts[0], parts[1], parts[2]
+    raise ValueError("Kursor sinkronisasi tidak valid")
+
+
+def _after(model, kind: int, cursor: Cursor):
+    change_seq, cursor_kind, row_id = cursor
+    if kind < cursor_kind:
+        return model.change_seq > change_seq
+    if kind > cursor_kind:
+        return model.change_seq >= change_seq
+    if row_id is None:
+        return model.change_seq > change_seq
+    return tuple_(model.change_seq, model.id) > tuple_(change_seq, row_id)
+
+
+def _position(change) -> Tuple[int, int, int]:
+    kind = KIND_ENTRY if isinstance(change, DataEntry) else KIND_TOMBSTONE
+    return change.change_seq, kind, change.id
+
+
+def get_changes(db: Session, owner_id: int, cursor: str, limit: int) -> DataEntryChangesResponse:
+    """
+    Mengembalikan data entry yang berubah dan tombstone setelah kursor,
+    diurutkan berdasarkan (change_seq, jenis, id). Kedua query memakai indeks
+    (owner_id, change_seq, id) sehingga biayanya sebanding dengan jumlah perubahan.
+
+    Penulisan per pengguna diserialkan oleh UPDATE pada users.data_version,
+    sehingga change_seq yang terlihat tidak pernah "berlubang" di belakang kursor.
+    """
+    position = decode_cursor(cursor)
+    entries = db.query(DataEntry).filter(
+        DataEntry.owner_id == owner_id,
+        _after(DataEntry, KIND_ENTRY, position)
+    ).order_by(DataEntry.change_seq, DataEntry.id).limit(limit + 1).all()
+    tombstones = db.query(DataEntryTombstone).filter(
+        DataEntryTombstone.owner_id == owner_id,
+        _after(DataEntryTombstone, KIND_TOMBSTONE, position)
+    ).order_by(DataEntryTombstone.change_seq, DataEntryTombstone.id).limit(limit + 1).all()
+
+    merged = list(heapq.merge(entries, tombstones, key=_position))
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+
+    upserts = [DataEntrySyncResponse.from_orm(c) for c in merged if isinstance(c, DataEntry)]
+    deletes = [DataEntryTombstoneResponse.from_orm(c) for c in merged if isinstance(c, DataEntryTombstone)]
+    return DataEntryChangesResponse(
+        upserts=upserts,
+        deletes=deletes,
+        next_cursor=encode_cursor(*_position(merged[-1])) if merged else cursor,
+        has_more=has_more,
+    )
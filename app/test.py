@@ -4,10 +4,17 @@ import pytest
 from httpx import AsyncClient
 from app.main import app
 from app.database import Base, engine, SessionLocal
+from sqlalchemy import event, create_engine, text
 from sqlalchemy.orm import Session
-from app import models, auth
+from app import models, schemas, auth, columnar, analytics, events, identifiers, invalidation, cache, migrations, roles, msgpack_codec, singleflight, shm_cache
+from contextlib import contextmanager
+from array import array
+from datetime import datetime
 
 import asyncio
+import json
+import threading
+import time
 
 @pytest.fixture(scope="module")
 def anyio_backend():
@@ -74,3 +81,1016 @@ async def test_user_login(client: AsyncClient, test_db: Session):
     assert data["token_type"] == "bearer"
 
 # ... Ubah endpoint lainnya sesuai penamaan baru
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+@pytest.mark.anyio
+async def test_write_statement_counts(client: AsyncClient, test_db: Session):
+    await client.post("/register", headers={"Authorization": f"Bearer {auth.STATIC_BEARER_TOKEN}"}, json={
+        "name": "Query Counter",
+        "username": "querycounter",
+        "email": "querycounter@example.com",
+        "role": "user",
+        "password": "securepassword"
+    })
+    headers = {"Authorization": f"Bearer {get_token(test_db, 'querycounter', 'securepassword')}"}
+    entry = {f"int_field{i}": i for i in range(1, 9)}
+    entry.update(string_field1="a", string_field2="b", string_field3="c")
+    # SQLite tidak mendukung kolom tabel FROM di RETURNING, update membaca nilai lama terlebih dahulu
+    update_statements = 6 if engine.dialect.name == "postgresql" else 7
+
+    # auth SELECT, versi data, INSERT entry, statistik, histogram, log
+    with count_statements() as statements:
+        response = await client.post("/data_entries/", headers=headers, json=entry)
+    entry_id = response.json()["data"]["id"]
+    assert len(statements) == 6
+
+    # GET kedua dilayani cache respons: auth SELECT, log (tanpa SELECT entry)
+    await client.get(f"/data_entries/{entry_id}", headers=headers)
+    with count_statements() as statements:
+        response = await client.get(f"/data_entries/{entry_id}", headers=headers)
+    assert response.json()["data"]["id"] == entry_id
+    assert len(statements) == 2
+
+    # auth SELECT, versi data, UPDATE entry, statistik, histogram, log
+    with count_statements() as statements:
+        response = await client.put(f"/data_entries/{entry_id}", headers=headers, json={"int_field1": 10})
+    assert response.json()["data"]["int_field1"] == 10
+    assert len(statements) == update_statements
+
+    # auth SELECT, versi data, DELETE entry, tombstone, statistik, histogram, log
+    with count_statements() as statements:
+        response = await client.delete(f"/data_entries/{entry_id}", headers=headers)
+    assert response.json()["success"]
+    assert len(statements) == 7
+
+    # auth SELECT, UPDATE users, log
+    with count_statements() as statements:
+        response = await client.put("/users/me/profile", headers=headers, json={"name": "Renamed"})
+    assert response.json()["data"]["name"] == "Renamed"
+    assert len(statements) == 3
+
+STATIC_HEADERS = {"Authorization": f"Bearer {auth.STATIC_BEARER_TOKEN}"}
+
+async def register_and_login(client: AsyncClient, test_db: Session, username: str, **fields) -> dict:
+    payload = {
+        "name": username.title(),
+        "username": username,
+        "email": f"{username}@example.com",
+        "role": "user",
+        "password": "securepassword",
+    }
+    payload.update(fields)
+    await client.post("/register", headers=STATIC_HEADERS, json=payload)
+    return {"Authorization": f"Bearer {get_token(test_db, username, 'securepassword')}"}
+
+def make_entry(i: int, text: str = "abc") -> dict:
+    entry = {f"int_field{k}": i * k for k in range(1, 9)}
+    entry.update(string_field1=f"{text}{i}", string_field2="hello world", string_field3="x")
+    return entry
+
+def test_columnar_round_trip():
+    ints = {"id": array("q", [1, 2, 3]), "int_field1": array("q", [0, 2 ** 40, -5])}
+    strings = {"string_field1": ["a", "b", "a"], "string_field2": ["", "é", ""]}
+    decoded = columnar.decode_columnar(columnar.encode_columnar(3, ints, strings))
+    assert decoded == {
+        "id": [1, 2, 3],
+        "int_field1": [0, 2 ** 40, -5],
+        "string_field1": ["a", "b", "a"],
+        "string_field2": ["", "é", ""],
+    }
+    with pytest.raises(ValueError):
+        columnar.decode_columnar(b"XXXX" + bytes(12))
+
+@pytest.mark.anyio
+async def test_columnar_export(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "columnaruser")
+    for i in range(3):
+        await client.post("/data_entries/", headers=headers, json=make_entry(i))
+
+    response = await client.get("/data_entries/export/columnar", headers=headers)
+    assert response.headers["content-type"] == columnar.MEDIA_TYPE
+    decoded = columnar.decode_columnar(response.content)
+    assert decoded["int_field2"] == [0, 2, 4]
+    assert decoded["string_field1"] == ["abc0", "abc1", "abc2"]
+
+@pytest.mark.anyio
+async def test_data_entry_stats(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "statsuser")
+    ids = []
+    for i in (1, 2, 3):
+        response = await client.post("/data_entries/", headers=headers, json=make_entry(i))
+        ids.append(response.json()["data"]["id"])
+
+    stats = (await client.get("/data_entries/stats?top_k=2", headers=headers)).json()["data"]
+    field = stats["fields"]["int_field1"]
+    assert stats["count"] == 3
+    assert (field["sum"], field["min"], field["max"]) == (6, 1, 3)
+    # Bucket log2: 1 -> [1, 1], 2 dan 3 -> [2, 3]
+    assert [(b["lower"], b["upper"], b["count"]) for b in field["histogram"]] == [(1, 1, 1), (2, 3, 2)]
+    assert [entry["int_field1"] for entry in stats["top"]] == [3, 2]
+
+    # Menghapus nilai maksimum menandai min/max usang; dihitung ulang saat dibaca
+    await client.delete(f"/data_entries/{ids[2]}", headers=headers)
+    field = (await client.get("/data_entries/stats", headers=headers)).json()["data"]["fields"]["int_field1"]
+    assert (field["sum"], field["min"], field["max"]) == (3, 1, 2)
+
+    # Ringkasan yang rusak terdeteksi sebagai drift dan dihitung ulang penuh
+    user_id = test_db.query(models.User.id).filter(models.User.username == "statsuser").scalar()
+    test_db.query(models.DataEntryFieldStat).filter(
+        models.DataEntryFieldStat.user_id == user_id,
+        models.DataEntryFieldStat.field == "int_field2",
+    ).update({"entry_count": -1, "total": 999})
+    test_db.commit()
+    stats = (await client.get("/data_entries/stats", headers=headers)).json()["data"]
+    assert stats["count"] == 2
+    assert stats["fields"]["int_field2"]["sum"] == 6
+
+def test_analytics_numpy_and_array_agree():
+    columns = {field: array("q", [k * i + (i % 2) for i in range(1, 6)]) for k, field in enumerate(models.DATA_ENTRY_INT_FIELDS, 1)}
+    reference = analytics._compute_array(5, columns, (0.5,))
+    assert reference[0][0] == pytest.approx(3.6)
+    assert reference[3]["int_field1"]["0.5"] == 4.0
+    if analytics.np is not None:
+        result = analytics._compute_numpy(5, columns, (0.5,))
+        assert result[0] == pytest.approx(reference[0])
+        for got, expected in zip(result[1] + result[2], reference[1] + reference[2]):
+            assert got == pytest.approx(expected)
+        assert result[3] == reference[3]
+
+@pytest.mark.anyio
+async def test_data_entry_analytics(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "analyticsuser")
+    for i in (1, 2, 3):
+        await client.post("/data_entries/", headers=headers, json=make_entry(i))
+    data = (await client.get("/data_entries/analytics", headers=headers)).json()["data"]
+    assert data["count"] == 3 and data["mean"][0] == 2.0
+    # int_fieldk = i * k: semua field berkorelasi sempurna
+    assert data["correlation"][0][7] == pytest.approx(1.0)
+    assert data["quantiles"]["int_field2"]["0.5"] == 4.0
+
+    response = await client.get("/data_entries/analytics?quantiles=1.5", headers=headers)
+    assert response.json()["success"] is False
+
+@pytest.mark.anyio
+async def test_data_entry_filters(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "filteruser")
+    for i in range(1, 6):
+        await client.post("/data_entries/", headers=headers, json=make_entry(i, "item"))
+    # Nilai string jauh di atas batas baris indeks btree tetap bisa disimpan dan difilter
+    long_value = "z" * 5000
+    response = await client.post("/data_entries/", headers=headers, json=dict(make_entry(9), string_field1=long_value))
+    assert response.json()["success"]
+
+    response = await client.get(
+        "/data_entries/",
+        params={"filter": ["int_field1:gte:2", "string_field2:eq:hello world"], "sort": "-int_field1"},
+        headers=headers,
+    )
+    assert [entry["int_field1"] for entry in response.json()["data"]] == [9, 5, 4, 3, 2]
+    response = await client.get("/data_entries/", params={"filter": "string_field1:prefix:item1"}, headers=headers)
+    assert [entry["string_field1"] for entry in response.json()["data"]] == ["item1"]
+    for value in (long_value, long_value[:300]):
+        response = await client.get("/data_entries/", params={"filter": f"string_field1:prefix:{value}"}, headers=headers)
+        assert [entry["int_field1"] for entry in response.json()["data"]] == [9]
+    response = await client.get("/data_entries/", params={"filter": f"string_field1:eq:{long_value[:300]}"}, headers=headers)
+    assert response.json()["data"] == []
+
+    for params in (
+        {"filter": "int_field1:gte:1", "sort": "int_field2"},  # urutan berbeda dari kolom rentang
+        {"filter": ["int_field1:gte:1", "int_field2:lt:5"]},  # rentang pada dua kolom
+        {"filter": "hashed_password:eq:x"},  # kolom di luar whitelist
+        {"filter": "string_field1:gt:a"},  # operator tidak didukung
+        {"filter": "int_field1:eq:abc"},  # nilai bukan integer
+        {"sort": "string_field1"},
+    ):
+        response = await client.get("/data_entries/", params=params, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["success"] is False
+
+@pytest.mark.anyio
+async def test_search_pagination(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "searchuser")
+    for i in range(5):
+        await client.post("/data_entries/", headers=headers, json=make_entry(i, "kucing"))
+    await client.post("/data_entries/", headers=headers, json=make_entry(9, "anjing"))
+
+    seen, cursor, scores = [], None, []
+    while True:
+        params = {"q": "kucing", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        data = (await client.get("/data_entries/search", params=params, headers=headers)).json()["data"]
+        assert len(data["items"]) <= 2
+        seen += [item["entry"]["id"] for item in data["items"]]
+        scores += [item["score"] for item in data["items"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    # Setiap hasil tepat sekali, skor tidak naik antarhalaman
+    assert len(seen) == len(set(seen)) == 5
+    assert scores == sorted(scores, reverse=True)
+
+    response = await client.get("/data_entries/search", params={"q": "kucing", "cursor": "rusak"}, headers=headers)
+    assert response.json()["success"] is False
+
+@pytest.mark.anyio
+async def test_sync_changes_pagination(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "syncuser")
+    ids = []
+    for i in range(6):
+        response = await client.post("/data_entries/", headers=headers, json=make_entry(i))
+        ids.append(response.json()["data"]["id"])
+    await client.delete(f"/data_entries/{ids[5]}", headers=headers)
+
+    # Seperti backfill migrasi: banyak baris berbagi change_seq yang sama
+    user_id = test_db.query(models.User.id).filter(models.User.username == "syncuser").scalar()
+    test_db.query(models.DataEntry).filter(models.DataEntry.owner_id == user_id).update({"change_seq": 1})
+    test_db.query(models.DataEntryTombstone).filter(models.DataEntryTombstone.owner_id == user_id).update({"change_seq": 1})
+    test_db.commit()
+
+    upserts, deletes, cursor = [], [], "0"
+    while True:
+        response = await client.get("/data_entries/changes", params={"cursor": cursor, "limit": 2}, headers=headers)
+        data = response.json()["data"]
+        assert len(data["upserts"]) + len(data["deletes"]) <= 2
+        upserts += [entry["id"] for entry in data["upserts"]]
+        deletes += [tombstone["entry_id"] for tombstone in data["deletes"]]
+        cursor = data["next_cursor"]
+        if not data["has_more"]:
+            break
+    assert upserts == ids[:5]
+    assert deletes == [ids[5]]
+
+    # Tidak ada perubahan baru: kursor tetap, tidak ada baris
+    data = (await client.get("/data_entries/changes", params={"cursor": cursor}, headers=headers)).json()["data"]
+    assert (data["upserts"], data["deletes"], data["next_cursor"]) == ([], [], cursor)
+    # Kursor lama berupa change_seq saja tetap diterima
+    data = (await client.get("/data_entries/changes", params={"cursor": "1"}, headers=headers)).json()["data"]
+    assert data["upserts"] == [] and not data["has_more"]
+    response = await client.get("/data_entries/changes", params={"cursor": "1:x"}, headers=headers)
+    assert response.json()["success"] is False
+
+class FailingBackend(events.InMemoryBackend):
+    def publish(self, channel: str, payload: str) -> None:
+        raise RuntimeError("NOTIFY gagal")
+
+@pytest.mark.anyio
+async def test_event_hub_payload_and_failures():
+    hub = events.EventHub(events.InMemoryBackend())
+    hub.start(asyncio.get_running_loop())
+    queue = hub.subscribe(7)
+    hub.publish(7, "updated", 12, 34)
+    hub._on_reconnect()
+    assert json.loads(await asyncio.wait_for(queue.get(), 1)) == {"type": "updated", "id": 34, "change_seq": 12}
+    assert json.loads(await asyncio.wait_for(queue.get(), 1)) == {"type": "resync"}
+    hub.stop()
+
+    # Penulisan sudah di-commit: kegagalan backend tidak boleh menjadi error respons
+    failing = events.EventHub(FailingBackend())
+    failing.start(asyncio.get_running_loop())
+    failing.publish(7, "created", 1, 1)
+    failing.stop()
+
+@pytest.mark.anyio
+async def test_conditional_get(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "etaguser")
+    entry_id = (await client.post("/data_entries/", headers=headers, json=make_entry(1))).json()["data"]["id"]
+
+    for url in (f"/data_entries/{entry_id}", "/data_entries/", "/users/me/"):
+        response = await client.get(url, headers=headers)
+        etag = response.headers["etag"]
+        response = await client.get(url, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag and response.content == b""
+        response = await client.get(url, headers={**headers, "If-None-Match": '"lain"'})
+        assert response.status_code == 200
+
+    # Representasi parsial mempunyai ETag sendiri
+    old_etag = (await client.get(f"/data_entries/{entry_id}", headers=headers)).headers["etag"]
+    partial = await client.get(f"/data_entries/{entry_id}?fields=id,int_field1", headers=headers)
+    assert partial.headers["etag"] != old_etag
+    assert set(partial.json()["data"]) == {"id", "int_field1"}
+
+    # Perubahan data membuat ETag lama tidak cocok lagi
+    await client.put(f"/data_entries/{entry_id}", headers=headers, json={"int_field1": 5})
+    response = await client.get(f"/data_entries/{entry_id}", headers={**headers, "If-None-Match": old_etag})
+    assert response.status_code == 200 and response.json()["data"]["int_field1"] == 5
+
+@pytest.mark.anyio
+async def test_optimistic_concurrency(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "ifmatchuser")
+    entry_id = (await client.post("/data_entries/", headers=headers, json=make_entry(1))).json()["data"]["id"]
+    etag = (await client.get(f"/data_entries/{entry_id}", headers=headers)).headers["etag"]
+
+    response = await client.put(f"/data_entries/{entry_id}", headers={**headers, "If-Match": etag}, json={"int_field1": 2})
+    assert response.status_code == 200
+    new_etag = response.headers["etag"]
+    assert new_etag != etag
+
+    # ETag usang: 412 dengan ETag terbaru, data tidak berubah
+    response = await client.put(f"/data_entries/{entry_id}", headers={**headers, "If-Match": etag}, json={"int_field1": 3})
+    assert response.status_code == 412
+    assert response.headers["etag"] == new_etag
+    assert (await client.get(f"/data_entries/{entry_id}", headers=headers)).json()["data"]["int_field1"] == 2
+
+    response = await client.put(f"/data_entries/{entry_id}", headers={**headers, "If-Match": "*"}, json={"int_field1": 4})
+    assert response.status_code == 200
+    response = await client.put("/data_entries/999999", headers={**headers, "If-Match": etag}, json={"int_field1": 4})
+    assert response.json()["success"] is False
+
+@pytest.mark.anyio
+async def test_register_conflicts(client: AsyncClient, test_db: Session):
+    async def register(username: str, email: str):
+        response = await client.post("/register", headers=STATIC_HEADERS, json={
+            "name": "Dup", "username": username, "email": email, "role": "user", "password": "securepassword",
+        })
+        return response.json()
+
+    assert (await register("dupuser", "dupuser@example.com"))["success"]
+    assert (await register("DupUser", "other@example.com"))["error"] == "Username sudah digunakan"
+    assert (await register("otheruser", "DUPUSER@example.com"))["error"] == "Email sudah digunakan"
+
+    # Identifier yang belum dikenal filter worker ini: konflik terdeteksi oleh ON CONFLICT
+    identifiers.load(test_db)
+    test_db.add(models.User(name="Ghost", username="ghostuser", email="ghost@example.com", hashed_password="x", role="user"))
+    test_db.commit()
+    assert (await register("ghostuser", "ghost2@example.com"))["error"] == "Username sudah digunakan"
+    assert (await register("ghost2", "ghost@example.com"))["error"] == "Email sudah digunakan"
+    assert test_db.query(models.User).filter(models.User.name.in_(["Dup", "Ghost"])).count() == 2
+
+def test_bloom_filter():
+    bloom = identifiers.BloomFilter(1000)
+    for i in range(1000):
+        bloom.add(f"u:user{i}")
+    assert all(f"u:user{i}" in bloom for i in range(1000))
+    false_positives = sum(f"u:other{i}" in bloom for i in range(10000))
+    assert false_positives < 300  # target 1%
+
+    # Filter yang belum dimuat tidak pernah menjawab "pasti tersedia"
+    assert "u:siapa-saja" in identifiers.IdentifierFilter()
+
+@pytest.mark.anyio
+async def test_identifier_availability(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "availuser")
+    identifiers.load(test_db)
+
+    async def availability(**params):
+        response = await client.get("/users/availability", params=params, headers=STATIC_HEADERS)
+        return response.json()["data"]
+
+    assert await availability(username="AvailUser", email="availuser@example.com") == {
+        "username_available": False, "email_available": False,
+    }
+    assert (await availability(username="belumdipakai"))["username_available"] is True
+
+    # Email baru dari perubahan profil di worker ini langsung tercatat
+    await client.put("/users/me/profile", headers=headers, json={"email": "avail2@example.com"})
+    assert identifiers.email_maybe_taken("avail2@example.com")
+    assert (await availability(email="avail2@example.com"))["email_available"] is False
+
+    # Perubahan email dari worker lain datang lewat bus invalidasi
+    assert not identifiers.email_maybe_taken("dariworkerlain@example.com")
+    invalidation.bus._on_message(invalidation.CHANNEL, json.dumps({
+        "entity": cache.USER, "user_id": 1, "id": 1, "version": 2,
+        "details": {"email": "dariworkerlain@example.com"}, "sent_at": time.time(), "origin": "worker-lain",
+    }))
+    assert identifiers.email_maybe_taken("dariworkerlain@example.com")
+
+def test_migration_steps_commit_separately(tmp_path, monkeypatch, capsys):
+    scratch = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    monkeypatch.setattr(migrations, "STEPS", [
+        ("first", ["CREATE TABLE progress (step TEXT)", "INSERT INTO progress VALUES ('first')"]),
+        ("second", [
+            "INSERT INTO progress VALUES ('second')",
+            migrations.Concurrently("CREATE INDEX ix_progress_step ON progress (step)"),
+            # Dilewati: query unless mengembalikan baris
+            migrations.Concurrently("INSERT INTO progress VALUES ('skipped')", ("SELECT 1",)),
+            "INSERT INTO progress VALUES ('third')",
+            "SELECT 'pesan ' || count(*) FROM progress",
+            "INSERT INTO tabel_tidak_ada VALUES (1)",
+        ]),
+    ])
+    with pytest.raises(Exception):
+        migrations.run_migrations(scratch)
+    # Langkah dan pernyataan sebelum CONCURRENTLY sudah di-commit; kelompok terakhir dibatalkan
+    with scratch.connect() as conn:
+        assert [row[0] for row in conn.execute(text("SELECT step FROM progress ORDER BY rowid"))] == ["first", "second"]
+        assert conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'ix_progress_step'")).first()
+    assert "pesan 3" in capsys.readouterr().out
+
+def test_migration_index_ddl_runs_concurrently():
+    for name, statements in migrations.STEPS:
+        for statement in statements:
+            if isinstance(statement, migrations.Concurrently):
+                assert "INDEX CONCURRENTLY" in statement.sql, name
+            else:
+                assert "CREATE INDEX" not in statement and "CREATE UNIQUE INDEX" not in statement, name
+                assert "DROP INDEX" not in statement, name
+                # LOCK TABLE hanya di dalam blok DO yang bersyarat
+                assert "LOCK TABLE" not in statement or "IF NOT EXISTS" in statement, name
+
+def test_identifier_normalisation_migration():
+    # Pernyataan penggabungan/penggantian nama cukup portabel untuk diuji di SQLite
+    scratch = create_engine("sqlite://")
+    Base.metadata.create_all(bind=scratch)
+    with scratch.begin() as conn:
+        # Database lama belum mempunyai indeks unik lower()
+        conn.execute(text("DROP INDEX ix_users_username_lower"))
+        conn.execute(text("DROP INDEX ix_users_email_lower"))
+        for user_id, username, email in (
+            (1, "Bob", "bob@example.com"),
+            (2, "bob", "robert@example.com"),  # orang lain: username bentrok, email berbeda
+            (3, "bobby", " BOB@example.com"),  # orang yang sama: email sama
+            # Nama pengganti bob-2 dan bob-2-2 sudah dipakai pengguna lain
+            (4, "bob-2", "bob2@example.com"),
+            (5, "BOB-2-2", "bob22@example.com"),
+        ):
+            conn.execute(text(
+                "INSERT INTO users (id, name, username, email, hashed_password, role) "
+                "VALUES (:id, :username, :username, :email, 'x', 'user')"
+            ), {"id": user_id, "username": username, "email": email})
+        conn.execute(text(
+            "INSERT INTO data_entries (owner_id, change_seq, string_field1, string_field2, string_field3, "
+            + ", ".join(models.DATA_ENTRY_INT_FIELDS) + ") VALUES (3, 1, 'a', 'b', 'c', 1, 2, 3, 4, 5, 6, 7, 8)"
+        ))
+        for statement in migrations._merge_duplicate_users("lower(trim(email))") + migrations._rename_duplicate_usernames():
+            conn.execute(text(statement))
+        users = conn.execute(text("SELECT id, username FROM users ORDER BY id")).all()
+        owners = conn.execute(text("SELECT owner_id FROM data_entries")).scalars().all()
+    assert [tuple(row) for row in users] == [(1, "Bob"), (2, "bob-2-3"), (4, "bob-2"), (5, "BOB-2-2")]
+    assert owners == [1]
+
+async def login_as_admin(client: AsyncClient, test_db: Session, username: str) -> dict:
+    headers = await register_and_login(client, test_db, username)
+    roles.set_role(test_db, username, schemas.ADMIN_ROLE)
+    return headers
+
+@pytest.mark.anyio
+async def test_self_registration_cannot_create_admin(client: AsyncClient, test_db: Session):
+    response = await client.post("/register", headers=STATIC_HEADERS, json={
+        "name": "Mallory", "username": "mallory", "email": "mallory@example.com",
+        "role": " Admin", "password": "securepassword",
+    })
+    assert response.status_code == 422
+    assert test_db.query(models.User).filter(models.User.username == "mallory").first() is None
+
+    headers = await register_and_login(client, test_db, "notadmin")
+    for url in ("/admin/users", "/admin/users/aggregates", "/admin/metrics"):
+        assert (await client.get(url, headers=headers)).status_code == 403
+
+    # Admin hanya diberikan operator (python -m app.roles)
+    assert roles.set_role(test_db, "notadmin", schemas.ADMIN_ROLE) == "user"
+    assert (await client.get("/admin/metrics", headers=headers)).status_code == 200
+    assert roles.set_role(test_db, "notadmin", "user") == schemas.ADMIN_ROLE
+    assert (await client.get("/admin/metrics", headers=headers)).status_code == 403
+    assert roles.set_role(test_db, "tidakada", schemas.ADMIN_ROLE) is None
+
+@pytest.mark.anyio
+async def test_bulk_provisioning(client: AsyncClient, test_db: Session):
+    admin_headers = await login_as_admin(client, test_db, "bulkadmin")
+    await register_and_login(client, test_db, "bulkexisting")
+
+    def record(username: str, **fields) -> dict:
+        return dict({"name": username, "username": username, "email": f"{username}@example.com",
+                     "role": "user", "password": "securepassword"}, **fields)
+
+    records = [
+        record("bulk1"),
+        record("BulkExisting"),  # sudah terdaftar
+        record("bulk1", email="lain@example.com"),  # duplikat di dalam berkas
+        record("bulk2", email="bukan-email"),  # tidak valid
+        record("bulk3", role="admin"),  # role admin tidak bisa diprovisikan
+        record("bulk4", disease="flu"),
+    ]
+    response = await client.post("/admin/users/bulk", headers=admin_headers, json=records)
+    data = response.json()["data"]
+    assert (data["created"], data["rejected"]) == (2, 4)
+    assert [user["username"] for user in data["users"]] == ["bulk1", "bulk4"]
+    assert [conflict["index"] for conflict in data["conflicts"]] == [1, 2, 3, 4]
+    assert data["conflicts"][0]["reason"] == "Username sudah digunakan"
+    assert data["conflicts"][1]["reason"] == "Username duplikat di dalam berkas"
+    assert data["conflicts"][3]["reason"].startswith("Data tidak valid")
+
+    csv_body = "name,username,email,role,password\nBulk Lima,bulk5,bulk5@example.com,user,securepassword\n"
+    response = await client.post("/admin/users/bulk", headers={**admin_headers, "Content-Type": "text/csv"}, content=csv_body)
+    assert response.json()["data"]["created"] == 1
+    user_headers = await register_and_login(client, test_db, "bulkuser")
+    assert (await client.post("/admin/users/bulk", headers=user_headers, json=records)).status_code == 403
+
+@pytest.mark.anyio
+async def test_user_directory_and_group_counts(client: AsyncClient, test_db: Session):
+    admin_headers = await login_as_admin(client, test_db, "diradmin")
+
+    async def counts():
+        data = (await client.get("/admin/users/aggregates", headers=admin_headers)).json()["data"]
+        return {dimension: {group["value"]: group["count"] for group in data[dimension]} for dimension in ("role", "disease")}
+
+    before = await counts()
+    headers = await register_and_login(client, test_db, "dirsearch1", disease="langka")
+    await register_and_login(client, test_db, "dirsearch2", disease="langka")
+    result = await counts()
+    assert result["role"]["user"] == before["role"]["user"] + 2
+    assert result["disease"]["langka"] == 2
+
+    await client.put("/users/me/profile", headers=headers, json={"disease": "pulih"})
+    result = await counts()
+    assert result["disease"]["langka"] == 1 and result["disease"]["pulih"] == 1
+
+    # Pencarian prefix tidak peka huruf besar/kecil dengan keyset per id
+    page = (await client.get("/admin/users", params={"q": "DirSearch", "limit": 1}, headers=admin_headers)).json()["data"]
+    assert [user["username"] for user in page["users"]] == ["dirsearch1"]
+    page = (await client.get("/admin/users", params={"q": "dirsearch", "after_id": page["next_after_id"]}, headers=admin_headers)).json()["data"]
+    assert [user["username"] for user in page["users"]] == ["dirsearch2"]
+
+@pytest.mark.anyio
+async def test_gzip_etags(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "gzipuser")
+    for i in range(20):
+        entry_id = (await client.post("/data_entries/", headers=headers, json=make_entry(i))).json()["data"]["id"]
+    gzip_headers = {**headers, "Accept-Encoding": "gzip"}
+
+    response = await client.get("/data_entries/", headers=gzip_headers)
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.endswith('-gzip"')
+    response = await client.get("/data_entries/", headers={**gzip_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    identity = await client.get("/data_entries/", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] == etag.replace('-gzip"', '"')
+    assert len(response.content) == 0 and len(identity.json()["data"]) == 20
+
+    # Respons kecil dikirim tanpa gzip: 304-nya tetap memakai ETag asli
+    small = await client.get(f"/data_entries/{entry_id}", headers=gzip_headers)
+    assert "content-encoding" not in small.headers
+    response = await client.get(f"/data_entries/{entry_id}", headers={**gzip_headers, "If-None-Match": small.headers["etag"]})
+    assert response.status_code == 304 and response.headers["etag"] == small.headers["etag"]
+
+def msgpack_backends():
+    backends = [(msgpack_codec._packb_python, msgpack_codec._unpackb_python)]
+    if msgpack_codec.msgpack is not None:
+        backends.append((msgpack_codec._packb_c, msgpack_codec._unpackb_c))
+    return backends
+
+def test_msgpack_codec_round_trip():
+    ints = [0, 127, 128, 255, 256, 65535, 65536, 2**32 - 1, 2**32, 2**63 - 1, 2**64 - 1,
+            -1, -32, -33, -128, -129, -32768, -32769, -2**31, -2**31 - 1, -2**63]
+    # Panjang str pada batas fixstr/str8/str16/str32 -> byte tipe yang diharapkan
+    strings = [(31, 0xBF), (32, 0xD9), (255, 0xD9), (256, 0xDA), (65535, 0xDA), (65536, 0xDB)]
+    nested = {"a": {"b": [1, {"c": None}], "d": b"\x00\xff"}, 7: [True, False, 1.5, "é" * 40], "e": {}}
+    for packb, unpackb in msgpack_backends():
+        for value in ints:
+            assert unpackb(packb(value)) == value
+        for value in (2**64, -2**63 - 1):
+            with pytest.raises(ValueError):
+                packb(value)
+        for length, tag in strings:
+            packed = packb("x" * length)
+            assert packed[0] == tag
+            assert unpackb(packed) == "x" * length
+        assert unpackb(packb(nested)) == nested
+        assert unpackb(packb((1, 2))) == [1, 2]
+        assert unpackb(packb({"at": datetime(2024, 1, 2, 3, 4, 5)})) == {"at": "2024-01-02T03:04:05"}
+        with pytest.raises(TypeError):
+            packb(object())
+    # Fallback Python murni menghasilkan bytes yang sama dengan ekstensi C
+    assert len({packb(nested) for packb, _ in msgpack_backends()}) == 1
+
+def test_msgpack_codec_rejects_malformed_input():
+    malformed = [
+        b"",                              # kosong
+        b"\x92\x01",                      # array terpotong
+        b"\xdb\x00\x00\x00\x05ab",        # str32 terpotong
+        b"\x01\x02",                      # byte tambahan
+        b"\xc1",                          # tipe tidak dipakai
+        b"\xd4\x01\x00",                  # ext tidak didukung
+        b"\xa2\xff\xfe",                  # UTF-8 tidak valid
+        b"\x81\x91\x01\x02",              # kunci map berupa array
+        b"\x91" * 2000 + b"\x01",         # terlalu dalam
+    ]
+    for _, unpackb in msgpack_backends():
+        for data in malformed:
+            with pytest.raises(ValueError):
+                unpackb(data)
+
+def test_msgpack_row_encoder_matches_packb():
+    columns = [models.DataEntry.id, models.DataEntry.string_field1, models.DataEntry.created_at]
+    encoder = msgpack_codec.MsgpackRowEncoder(columns)
+    rows = [(1, "a", datetime(2024, 1, 2)), (2, None, None)]
+    expected = [dict(zip(encoder.names, (row[0], row[1], row[2] and row[2].isoformat()))) for row in rows]
+    assert msgpack_codec.unpackb(encoder.encode_rows(rows)) == expected
+    assert encoder.encode_rows(rows) == msgpack_codec._packb_python(expected)
+    assert encoder._encode_row_python(rows[0]) == encoder.encode_row(rows[0])
+
+@pytest.mark.anyio
+async def test_msgpack_requests(client: AsyncClient, test_db: Session):
+    headers = await register_and_login(client, test_db, "msgpackuser")
+    msgpack_headers = {**headers, "Content-Type": msgpack_codec.MEDIA_TYPE, "Accept": msgpack_codec.MEDIA_TYPE}
+    response = await client.post("/data_entries/", headers=msgpack_headers, content=msgpack_codec.packb(make_entry(1)))
+    assert response.headers["content-type"] == msgpack_codec.MEDIA_TYPE
+    body = msgpack_codec.unpackb(response.content)
+    assert body["success"] and body["data"]["int_field1"] == make_entry(1)["int_field1"]
+
+    listed = msgpack_codec.unpackb((await client.get("/data_entries/", headers=msgpack_headers)).content)
+    assert [entry["id"] for entry in listed["data"]] == [body["data"]["id"]]
+
+    response = await client.post("/data_entries/", headers=msgpack_headers, content=b"\x92\x01")
+    assert response.status_code == 422
+
+def test_single_flight_shares_one_call():
+    flight = singleflight.SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def run_concurrently(load, n=5):
+        results = []
+
+        def worker():
+            try:
+                results.append(flight.do("kunci", load))
+            except ValueError as exc:
+                results.append(exc)
+
+        shared_before = flight.stats()["shared"]
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        # Pemanggil pertama tertahan sampai semua penunggu bergabung
+        while flight.stats()["shared"] - shared_before < n - 1:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        release.clear()
+        return results
+
+    def failing_load():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("gagal")
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "hasil"
+
+    errors = run_concurrently(failing_load)
+    assert len(calls) == 1 and len({id(error) for error in errors}) == 1
+    results = run_concurrently(load)
+    assert len(calls) == 2
+    assert sorted(results) == [("hasil", False)] + [("hasil", True)] * 4
+    assert flight.stats() == {"name": "test", "leaders": 2, "shared": 8, "in_flight": 0}
+
+@pytest.mark.anyio
+async def test_current_user_lookup_coalesced(client: AsyncClient, test_db: Session, monkeypatch):
+    headers = await register_and_login(client, test_db, "flightuser")
+    admin_headers = await login_as_admin(client, test_db, "flightadmin")
+    original, calls = auth.get_user_by_identifier, []
+
+    def slow_lookup(db, identifier):
+        calls.append(identifier)
+        time.sleep(0.3)
+        return original(db, identifier)
+
+    monkeypatch.setattr(auth, "get_user_by_identifier", slow_lookup)
+    before = auth.USER_FLIGHT.stats()
+    responses = await asyncio.gather(*[client.get("/users/me/", headers=headers) for _ in range(8)])
+    assert [response.json()["data"]["username"] for response in responses] == ["flightuser"] * 8
+    assert calls == ["flightuser"]
+    assert auth.USER_FLIGHT.stats()["shared"] - before["shared"] == 7
+    monkeypatch.undo()
+
+    metrics = (await client.get("/admin/metrics", headers=admin_headers)).json()["data"]["single_flight"]
+    flights = {flight["name"]: flight for flight in metrics}
+    assert set(flights) >= {"current_user", "read_data_entries"}
+    assert flights["current_user"]["shared"] >= 7
+
+@pytest.mark.anyio
+async def test_async_single_flight_gather_and_cancellation():
+    flight = singleflight.AsyncSingleFlight("test_async")
+    calls = []
+
+    async def load(release, result="hasil"):
+        calls.append(1)
+        await release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    release = asyncio.Event()
+    pending = asyncio.gather(*[flight.do("kunci", lambda: load(release)) for _ in range(5)])
+    await asyncio.sleep(0)
+    release.set()
+    assert sorted(await pending) == [("hasil", False)] + [("hasil", True)] * 4
+    assert len(calls) == 1
+
+    # Exception pemanggil pertama diterima semua penunggu
+    release = asyncio.Event()
+    pending = asyncio.gather(*[flight.do("kunci", lambda: load(release, ValueError("gagal"))) for _ in range(3)],
+                             return_exceptions=True)
+    await asyncio.sleep(0)
+    release.set()
+    errors = await pending
+    assert len(calls) == 2 and len({id(error) for error in errors}) == 1
+
+    # Pemanggil pertama dibatalkan: satu penunggu menjadi pemanggil pertama baru
+    release = asyncio.Event()
+    leader = asyncio.ensure_future(flight.do("kunci", lambda: load(release)))
+    await asyncio.sleep(0)
+    followers = [asyncio.ensure_future(flight.do("kunci", lambda: load(release))) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    for _ in range(100):
+        if len(calls) == 4:
+            break
+        await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*followers)
+    assert leader.cancelled() and len(calls) == 4
+    assert sorted(results) == [("hasil", False)] + [("hasil", True)] * 2
+
+    # Penunggu yang dibatalkan tidak membatalkan yang lain
+    release = asyncio.Event()
+    tasks = [asyncio.ensure_future(flight.do("kunci", lambda: load(release))) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks[1].cancel()
+    release.set()
+    assert (await tasks[0], await tasks[2]) == (("hasil", False), ("hasil", True))
+    assert flight.stats()["in_flight"] == 0
+
+@pytest.mark.anyio
+async def test_analytics_requests_coalesced(client: AsyncClient, test_db: Session, monkeypatch):
+    headers = await register_and_login(client, test_db, "asyncflightuser")
+    await client.post("/data_entries/", headers=headers, json=make_entry(1))
+    original, calls = analytics.get_analytics, []
+
+    def slow_analytics(*args):
+        calls.append(1)
+        time.sleep(0.3)
+        return original(*args)
+
+    monkeypatch.setattr(analytics, "get_analytics", slow_analytics)
+    from app.main import ANALYTICS_FLIGHT
+    before = ANALYTICS_FLIGHT.stats()
+    responses = await asyncio.gather(*[client.get("/data_entries/analytics", headers=headers) for _ in range(6)])
+    assert len({response.content for response in responses}) == 1 and responses[0].json()["success"]
+    assert len(calls) == 1
+    assert ANALYTICS_FLIGHT.stats()["shared"] - before["shared"] == 5
+
+ENTRY_SIZE = 100 + cache.ENTRY_OVERHEAD
+
+def test_cache_lru_and_lfu_eviction():
+    lru = cache.Cache("test_lru", 3 * ENTRY_SIZE, policy=cache.LRU)
+    for key in "abc":
+        lru.put(key, key.upper(), size=100)
+    assert lru.get("a") == "A"
+    lru.put("d", "D", size=100)
+    # b paling lama tidak dipakai
+    assert [key for key in "abcd" if lru.peek(key)] == ["a", "c", "d"]
+
+    lfu = cache.Cache("test_lfu", 3 * ENTRY_SIZE, policy=cache.LFU)
+    for key in "abc":
+        lfu.put(key, key.upper(), size=100)
+    lfu.get("a"), lfu.get("a"), lfu.get("c")
+    # b paling jarang dipakai
+    lfu.put("d", "D", size=100)
+    assert [key for key in "abcd" if lfu.peek(key)] == ["a", "c", "d"]
+    # Seri frekuensi (d dan e 1x): yang lebih lama keluar
+    lfu.put("e", "E", size=100)
+    assert [key for key in "abcde" if lfu.peek(key)] == ["a", "c", "e"]
+    assert lfu.stats()["evictions"] == 2 and lfu.bytes == lfu.max_bytes
+
+def test_cache_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl = cache.Cache("test_ttl", 2 * ENTRY_SIZE, policy=cache.TTL, ttl=10)
+    ttl.put("a", "A", size=100)
+    now[0] += 5
+    ttl.put("b", "B", size=100)
+    assert ttl.get("a") == "A"
+    # Penuh: yang paling lama disimpan keluar walau baru dibaca
+    now[0] += 3
+    ttl.put("c", "C", size=100)
+    assert ttl.peek("a") is None and ttl.get("b") == "B"
+    now[0] += 8
+    assert ttl.get("b") is None and ttl.get("c") == "C"
+    now[0] += 20
+    ttl.put("d", "D", size=100)
+    ttl.put("e", "E", size=100)
+    stats = ttl.stats()
+    assert (stats["evictions"], stats["expirations"], stats["entries"]) == (1, 2, 2)
+    with pytest.raises(ValueError):
+        cache.Cache("test_ttl_missing", 1024, policy=cache.TTL)
+
+def test_cache_byte_budget_versions_and_tags():
+    budget = cache.Cache("test_budget", 4 * ENTRY_SIZE, max_entry_bytes=2 * ENTRY_SIZE)
+    assert not budget.put("huge", "x", size=4 * 100)
+    assert budget.put("sized", "x" * 50, size=None) and budget.bytes == cache.ENTRY_OVERHEAD
+    budget.clear()
+
+    sized = cache.Cache("test_sizeof", 2 * ENTRY_SIZE, sizeof=len)
+    sized.put("a", "x" * 100)
+    sized.put("a", "y" * 100)
+    assert sized.bytes == ENTRY_SIZE and sized.get("a") == "y" * 100
+
+    budget.put("v", "new", size=100, version=2)
+    assert not budget.put("v", "old", size=100, version=1)
+    assert budget.get("v", version=2) == "new"
+    assert budget.get("v", version=3) is None and budget.peek("v") is None
+
+    for key in range(3):
+        budget.put(("user", key), key, size=100, tag=7)
+    budget.put("other", "o", size=100, tag=8)
+    budget.invalidate_tag(7)
+    assert len(budget) == 1 and budget.bytes == ENTRY_SIZE
+    budget.pop("other")
+    stats = budget.stats()
+    assert (stats["bytes"], stats["invalidations"], stats["hits"], stats["misses"]) == (0, 4, 1, 1)
+
+def test_shm_cache_versions_tokens_and_eviction(tmp_path, monkeypatch):
+    path = str(tmp_path / "shm")
+    worker_a = shm_cache.SharedCache(path, buckets=1, ways=2, slot_size=128, ttl=60)
+    worker_b = shm_cache.SharedCache(path, buckets=8, ways=8, slot_size=64)
+    # Geometri mengikuti berkas yang sudah ada
+    assert (worker_b.buckets, worker_b.ways, worker_b.slot_size) == (1, 2, 128)
+
+    assert worker_a.put(b"k1", b"v1", version=2)
+    assert worker_b.get(b"k1") == b"v1" and worker_b.get(b"k1", version=3) is None
+    assert not worker_b.put(b"k1", b"old", version=1)
+    assert not worker_a.put(b"big", b"x" * 128)
+
+    # Token dari lookup basi setelah invalidasi, juga jika kuncinya tidak ada
+    miss = worker_a.lookup(b"k2")
+    assert miss.value is None and miss.token is not None
+    worker_b.invalidate(b"absent")
+    assert not worker_a.put(b"k2", b"v2", token=miss.token)
+    assert worker_a.put(b"k2", b"v2", token=worker_a.lookup(b"k2").token)
+    worker_b.invalidate(b"k1")
+    assert worker_a.get(b"k1") is None and worker_a.get(b"k2") == b"v2"
+
+    # Bucket penuh: slot yang paling dekat kedaluwarsa dibuang
+    now = [time.monotonic()]
+    monkeypatch.setattr(shm_cache.time, "monotonic", lambda: now[0])
+    worker_a.put(b"k3", b"v3")
+    now[0] += 1
+    worker_a.put(b"k4", b"v4")
+    assert worker_b.get(b"k2") is None and worker_b.get(b"k3") == b"v3" and worker_a.evictions == 1
+    now[0] += 59.5
+    assert worker_b.get(b"k3") is None and worker_b.get(b"k4") == b"v4"
+    stats = worker_b.stats()
+    assert (stats["entries"], stats["expirations"]) == (1, 1)
+
+def test_shm_cache_seqlock_recovers_from_dead_writer(tmp_path):
+    shared = shm_cache.SharedCache(str(tmp_path / "shm"), buckets=1, ways=2, slot_size=128)
+    shared.put(b"k", b"v")
+    offset = shared._offset(shm_cache._hash(b"k"))
+    seq = shm_cache._SEQ.unpack_from(shared._map, offset)[0]
+    assert seq % 2 == 0
+    # Penghitung ganjil: penulis mati di tengah penulisan -> pembaca menganggap miss
+    shm_cache._SEQ.pack_into(shared._map, offset, seq + 1)
+    assert shared.lookup(b"k") == shm_cache.Lookup(None, 0, None)
+    assert shared.put(b"k", b"v2")
+    assert shm_cache._SEQ.unpack_from(shared._map, offset)[0] == seq + 2
+    assert shared.get(b"k") == b"v2"
+
+def test_shm_cache_user_lookup_and_invalidate(tmp_path, monkeypatch):
+    monkeypatch.setattr(shm_cache, "shared", shm_cache.SharedCache(str(tmp_path / "shm"), buckets=16))
+    user = models.User(id=987654, name="Shm", username="shmuser", email="shm@example.com", role="user",
+                       disease="None", date_of_birth=datetime(1990, 1, 2).date(), place_of_birth="Town",
+                       data_version=1, version=1)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return user
+
+    # Permintaan pertama memetakan identifier, kedua mengisi rekaman, ketiga hit
+    for _ in range(3):
+        found = shm_cache.get_user("ShmUser", load)
+    assert len(loads) == 2 and found is not user
+    assert (found.id, found.email, found.date_of_birth) == (user.id, user.email, user.date_of_birth)
+
+    assert shm_cache.get_user("shm@example.com", load).id == user.id and len(loads) == 3
+
+    # Email berubah: invalidasi membuang rekaman, lalu rekaman baru tidak
+    # melayani pemetaan email lama
+    user.email, user.version = "shm2@example.com", 2
+    cache.invalidate(cache.USER, user.id, user.id)
+    assert shm_cache.get_user("shmuser", load).email == "shm2@example.com" and len(loads) == 4
+    assert shm_cache.get_user("shm@example.com", lambda: None) is None
+
+TEST_ENTITY = "test_entity"
+invalidation_calls = []
+
+@cache.on_invalidate(TEST_ENTITY)
+def _record_invalidation(user_id, entity_id):
+    invalidation_calls.append(("all", user_id, entity_id))
+
+@cache.on_invalidate(TEST_ENTITY, remote_only=True, with_details=True)
+def _record_remote_invalidation(user_id, entity_id, details):
+    invalidation_calls.append(("remote", user_id, entity_id, details))
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "kondisi tidak terpenuhi"
+        time.sleep(0.01)
+
+def run_two_workers(worker_a, worker_b):
+    invalidation_calls.clear()
+    worker_a.publish(TEST_ENTITY, 1, 2, version=3, details={"email": "a@example.com"})
+    # Hook lokal langsung berjalan; hook remote_only hanya di worker penerima
+    assert invalidation_calls == [("all", 1, 2)]
+    wait_until(lambda: worker_b.stats()["received"] == 1)
+    assert invalidation_calls == [("all", 1, 2), ("all", 1, 2), ("remote", 1, 2, {"email": "a@example.com"})]
+    # Event milik sendiri diabaikan
+    assert worker_a.stats()["received"] == 0
+    assert worker_a.stats()["published"] == 1 and worker_b.stats()["delay_p50_ms"] is not None
+
+def test_invalidation_bus_delivery_and_hooks():
+    backend = events.InMemoryBackend()
+    worker_a, worker_b = invalidation.InvalidationBus(backend), invalidation.InvalidationBus(backend)
+    worker_a.start()
+    worker_b.start()
+    try:
+        run_two_workers(worker_a, worker_b)
+        # Payload rusak dan kanal lain diabaikan
+        backend.publish(invalidation.CHANNEL, "bukan json")
+        worker_b._on_message("kanal_lain", "{}")
+        assert worker_b.stats()["received"] == 1
+    finally:
+        worker_a.stop()
+        worker_b.stop()
+
+    # Sebelum start() (mis. CLI) hanya hook lokal yang berjalan
+    invalidation_calls.clear()
+    invalidation.InvalidationBus(events.InMemoryBackend()).publish(TEST_ENTITY, 5)
+    assert invalidation_calls == [("all", 5, None)]
+
+    # Transport gagal: dihitung, thread pengirim tetap hidup
+    failing = invalidation.InvalidationBus(FailingBackend())
+    failing.start()
+    try:
+        failing.publish(TEST_ENTITY, 1)
+        failing.publish(TEST_ENTITY, 1)
+        wait_until(lambda: failing.stats()["errors"] == 2)
+    finally:
+        failing.stop()
+
+def test_invalidation_bus_over_unix_sockets(tmp_path):
+    directory = str(tmp_path / "bus")
+    worker_a = invalidation.InvalidationBus(events.UnixSocketBackend(directory))
+    worker_b = invalidation.InvalidationBus(events.UnixSocketBackend(directory))
+    worker_a.start()
+    worker_b.start()
+    try:
+        run_two_workers(worker_a, worker_b)
+    finally:
+        worker_a.stop()
+        worker_b.stop()
+
+def assert_listener_owns_connection(backend, bind):
+    listener = backend._connect()
+    listener_driver = listener.connection.driver_connection
+    try:
+        # SQLite: isolation_level None berarti autocommit
+        assert listener_driver.isolation_level is None
+        assert bind.pool.checkedout() == 1
+        with Session(bind) as session:
+            session.execute(text("SELECT 1"))
+            pooled = session.connection().connection.driver_connection
+            assert pooled is not listener_driver and pooled.isolation_level is not None
+        assert bind.pool.checkedout() == 1
+    finally:
+        backend._close(listener)
+    assert bind.pool.checkedout() == 0
+    # Koneksi LISTEN dibuang, bukan dikembalikan ke pool
+    with bind.connect() as conn:
+        assert conn.connection.driver_connection is not listener_driver
+
+def test_event_listener_holds_its_own_connection(tmp_path):
+    scratch = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    assert_listener_owns_connection(events.PostgresNotifyBackend(scratch), scratch)
+
+def test_invalidation_postgres_backend_holds_its_own_connection(tmp_path, monkeypatch):
+    scratch = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    monkeypatch.setenv("INVALIDATION_BACKEND", "postgres")
+    monkeypatch.setattr(invalidation, "engine", scratch)
+    bus = invalidation.InvalidationBus(invalidation._default_backend())
+    assert isinstance(bus.backend, events.PostgresNotifyBackend)
+    assert_listener_owns_connection(bus.backend, scratch)
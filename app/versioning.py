@@ -0,0 +1,21 @@
+# app/versioning.py
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .models import User
+
+_users = User.__table__
+
+
+def bump_data_version(db: Session, user_id: int) -> int:
+    """
+    Menaikkan versi data pengguna (dipanggil di setiap penulisan data entry,
+    dalam transaksi yang sama) dan mengembalikan versi barunya.
+    """
+    return db.execute(
+        update(_users)
+        .where(_users.c.id == user_id)
+        .values(data_version=_users.c.data_version + 1)
+        .returning(_users.c.data_version)
+    ).scalar_one()